@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Task,Habit
+from .models import Task,Habit,DailyCompletion
 
 class HabitAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'type', 'created_at')  # Show in list view
@@ -7,3 +7,4 @@ class HabitAdmin(admin.ModelAdmin):
 
 admin.site.register(Task)
 admin.site.register(Habit, HabitAdmin)
+admin.site.register(DailyCompletion)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AnalyzeResponsesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analyze_responses'
+
+    def ready(self):
+        import analyze_responses.signals
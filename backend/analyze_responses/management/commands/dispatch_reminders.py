@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analyze_responses import reminders
+
+REBUCKET_EVERY_MINUTES = 15
+
+
+class Command(BaseCommand):
+    help = "Send habit reminders as they come due (run as a single long-lived process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Dispatch the current minute and exit")
+        parser.add_argument('--sender', help="Dotted path of the sender class (default: REMINDER_SENDER)")
+
+    def handle(self, *args, **options):
+        sender = reminders.get_sender(options['sender'])
+        now = timezone.now()
+        reminders.rebucket(now)
+        if options['once']:
+            self.dispatch(now, sender)
+            return
+
+        # Minutes missed while the process was down (or a slow tick) are caught up, within limits
+        last = now - timedelta(minutes=1)
+        while True:
+            now = timezone.now()
+            oldest = now - timedelta(minutes=settings.REMINDER_CATCH_UP_MINUTES)
+            for moment in reminders.minutes_between(max(last, oldest), now):
+                # Zones change offset on the hour or half hour; catch the move before that bucket
+                if moment.minute % REBUCKET_EVERY_MINUTES == 0:
+                    reminders.rebucket(moment)
+                self.dispatch(moment, sender)
+                last = moment
+            time.sleep(60 - timezone.now().second + 0.5)
+
+    def dispatch(self, moment, sender):
+        sent = reminders.dispatch_minute(moment, sender)
+        if sent:
+            self.stdout.write(f"{moment:%Y-%m-%d %H:%M} UTC sent {sent} reminders")
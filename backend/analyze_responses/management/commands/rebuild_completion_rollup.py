@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from analyze_responses import rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily completion rollup from the task table (e.g. after a bulk import)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help="Only rebuild the rows of one user id (default: everyone)",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user'] is not None:
+            try:
+                user = get_user_model().objects.get(pk=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with id {options['user']}")
+        rollup.rebuild(user)
+        self.stdout.write(self.style.SUCCESS("Rebuilt daily completion rollup"))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze_responses', '0006_userdataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['habit_id', 'date', 'isCompleted'], name='task_habit_date_done_idx'),
+        ),
+    ]
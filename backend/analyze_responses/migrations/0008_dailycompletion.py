@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 15:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill(apps, schema_editor):
+    Task = apps.get_model('analyze_responses', 'Task')
+    Habit = apps.get_model('analyze_responses', 'Habit')
+    DailyCompletion = apps.get_model('analyze_responses', 'DailyCompletion')
+
+    owners = dict(Habit.objects.values_list('pk', 'user_id'))
+    counts = Task.objects.values('habit_id', 'date').annotate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(isCompleted=True)),
+    ).order_by()
+
+    batch = []
+    for row in counts.iterator():
+        batch.append(DailyCompletion(
+            user_id=owners.get(row['habit_id']),
+            habit_id=row['habit_id'],
+            date=row['date'],
+            completed=row['completed'],
+            total=row['total'],
+        ))
+        if len(batch) >= 1000:
+            DailyCompletion.objects.bulk_create(batch)
+            batch = []
+    DailyCompletion.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze_responses', '0007_task_habit_date_done_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_completions', to='analyze_responses.habit')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_completions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date', 'completed', 'total'], name='completion_user_date_idx')],
+                'unique_together': {('habit', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
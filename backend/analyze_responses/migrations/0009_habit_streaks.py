@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 15:11
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    DailyCompletion = apps.get_model('analyze_responses', 'DailyCompletion')
+    Habit = apps.get_model('analyze_responses', 'Habit')
+    HabitStreakRun = apps.get_model('analyze_responses', 'HabitStreakRun')
+
+    full_days = DailyCompletion.objects.filter(
+        total__gt=0, completed=models.F('total')
+    ).order_by('habit_id', 'date').values_list('habit_id', 'date')
+
+    runs = {}  # habit id -> [[start, end], ...]
+    for habit_id, day in full_days.iterator():
+        habit_runs = runs.setdefault(habit_id, [])
+        if habit_runs and habit_runs[-1][1] == day - timedelta(days=1):
+            habit_runs[-1][1] = day
+        else:
+            habit_runs.append([day, day])
+
+    batch = []
+    for habit_id, habit_runs in runs.items():
+        for start, end in habit_runs:
+            batch.append(HabitStreakRun(habit_id=habit_id, start=start, end=end, length=(end - start).days + 1))
+        start, end = habit_runs[-1]
+        Habit.objects.filter(pk=habit_id).update(
+            streak_start=start,
+            streak_end=end,
+            longest_streak=max((e - s).days + 1 for s, e in habit_runs),
+        )
+        if len(batch) >= 1000:
+            HabitStreakRun.objects.bulk_create(batch)
+            batch = []
+    HabitStreakRun.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze_responses', '0008_dailycompletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='streak_end',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='streak_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='HabitStreakRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('length', models.PositiveIntegerField()),
+                ('habit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='streak_runs', to='analyze_responses.habit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['habit', 'start'], name='streak_run_start_idx'), models.Index(fields=['habit', 'end'], name='streak_run_end_idx'), models.Index(fields=['habit', 'length'], name='streak_run_length_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
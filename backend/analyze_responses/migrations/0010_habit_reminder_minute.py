@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 15:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+
+def fill_reminder_minute(apps, schema_editor):
+    Habit = apps.get_model('analyze_responses', 'Habit')
+    Habit.objects.filter(reminder_time__isnull=False).update(
+        reminder_minute=ExtractHour('reminder_time') * 60 + ExtractMinute('reminder_time')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze_responses', '0009_habit_streaks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='last_reminded_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='reminder_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='habit',
+            index=models.Index(fields=['reminder_minute', 'notification_status'], name='habit_reminder_due_idx'),
+        ),
+        migrations.RunPython(fill_reminder_minute, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyze_responses', '0010_habit_reminder_minute'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='reminder_timezone',
+            field=models.CharField(default='UTC', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='habit',
+            name='reminder_utc_offset',
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+    ]
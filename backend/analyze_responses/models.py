@@ -1,5 +1,7 @@
 import uuid
+from zoneinfo import ZoneInfo
 from django.db import models
+from django.utils import timezone
 from datetime import date,datetime, timedelta
 from django.contrib.auth import get_user_model
 
@@ -12,6 +14,27 @@ class Task(models.Model):
     isCompleted = models.BooleanField(default=False)
     date = models.DateField(default=date.today) # New field to track the day for this task
     created_at = models.DateTimeField(auto_now_add=True)  
+
+    class Meta:
+        indexes = [
+            # Day ranges of a habit (habits-today, plan writes); isCompleted makes the
+            # completion counts of stats and leaderboard index-only
+            models.Index(fields=['habit_id', 'date', 'isCompleted'], name='task_habit_date_done_idx'),
+        ]
+
+    ROLLUP_FIELDS = ('habit_id_id', 'date', 'isCompleted')  # rollup_state() order
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        task = super().from_db(db, field_names, values)
+        # What the row holds, so a save reaches the rollup as a change (see signals.py)
+        if set(cls.ROLLUP_FIELDS) <= set(field_names):
+            task.stored_state = task.rollup_state()
+        return task
+
+    def rollup_state(self):
+        """(habit_id, date, done): what this task adds to the daily completion rollup."""
+        return (self.habit_id_id, self.date, bool(self.isCompleted))
     
    ## habit_id = models.CharField(max_length=100)  # Unique identifier for the habit
    ## task_id = models.PositiveIntegerField()      # Sequential ID for each task
@@ -39,15 +62,96 @@ class Habit(models.Model):
     start_date = models.DateField(default=date.today)
     end_date = models.DateField(null=True, blank=True)
     notification_status = models.BooleanField(default=False)
-    reminder_time = models.TimeField(null=True, blank=True)
+    reminder_time = models.TimeField(null=True, blank=True)  # In the user's reminder_timezone
+    reminder_timezone = models.CharField(max_length=64, default='UTC')  # IANA name
+    # reminder_time as a UTC minute after midnight (the dispatcher's bucket key, see reminders.py)
+    # and the zone's UTC offset in minutes it was computed with; reminders.rebucket follows DST
+    reminder_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    reminder_utc_offset = models.SmallIntegerField(default=0, editable=False)
+    last_reminded_on = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by streaks.py: the most recent run of fully completed days and the longest one
+    streak_start = models.DateField(null=True, blank=True)
+    streak_end = models.DateField(null=True, blank=True)
+    longest_streak = models.PositiveIntegerField(default=0)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['reminder_minute', 'notification_status'], name='habit_reminder_due_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.end_date and self.duration_days:
             self.end_date = self.start_date + timedelta(days=self.duration_days)
+        self.reminder_minute, self.reminder_utc_offset = self.reminder_bucket()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'reminder_time', 'reminder_timezone'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'reminder_minute', 'reminder_utc_offset'}
         super().save(*args, **kwargs)
+
+    def reminder_bucket(self, at=None):
+        """(UTC minute of the day, UTC offset in minutes) for reminder_time at the instant `at`."""
+        offset = timezone.localtime(at or timezone.now(), ZoneInfo(self.reminder_timezone)).utcoffset()
+        offset = int(offset.total_seconds() // 60)
+        if self.reminder_time is None:
+            return None, offset
+        local_minute = self.reminder_time.hour * 60 + self.reminder_time.minute
+        return (local_minute - offset) % 1440, offset
+
+    def current_streak(self, today=None):
+        """Fully completed days up to today; an unfinished today doesn't break it yet."""
+        today = today or date.today()
+        if self.streak_end is None or self.streak_end < today - timedelta(days=1) or self.streak_start > today:
+            return 0
+        return (min(self.streak_end, today) - self.streak_start).days + 1
         
     def __str__(self):
         return f"{self.name}"
     
 
+
+class UserDataVersion(models.Model):
+    """Counter bumped whenever any of a user's habits or tasks change; the ETag of their habit views."""
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='data_version'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class DailyCompletion(models.Model):
+    """Completed/total task counts of one habit on one day, kept in step with Task (see rollup.py)."""
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='daily_completions',
+        null=True
+    )
+    habit = models.ForeignKey('Habit', on_delete=models.CASCADE, related_name='daily_completions')
+    date = models.DateField()
+    completed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('habit', 'date')
+        indexes = [
+            models.Index(fields=['user', 'date', 'completed', 'total'], name='completion_user_date_idx'),
+        ]
+
+
+class HabitStreakRun(models.Model):
+    """A maximal run of consecutive fully completed days of a habit (see streaks.py)."""
+    habit = models.ForeignKey('Habit', on_delete=models.CASCADE, related_name='streak_runs')
+    start = models.DateField()
+    end = models.DateField()
+    length = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['habit', 'start'], name='streak_run_start_idx'),
+            models.Index(fields=['habit', 'end'], name='streak_run_end_idx'),
+            models.Index(fields=['habit', 'length'], name='streak_run_length_idx'),
+        ]
@@ -0,0 +1,213 @@
+"""
+Parsing of the model's "Day N:" task plans, with a report of missing,
+repeated and near-duplicate days so callers can regenerate just those.
+"""
+import re
+import unicodedata
+import zlib
+from collections import namedtuple
+
+# "Day N:" blocks of the model's plan and the numbered tasks inside each block
+DAY_PATTERN = re.compile(r"Day\s*(\d+):(.+?)(?=\nDay\s*\d+:|\Z)", re.DOTALL)
+DAY_HEADER_PATTERN = re.compile(r"Day\s*(\d+):")
+NEXT_DAY_PATTERN = re.compile(r"\nDay\s*\d+:")
+TASK_PATTERN = re.compile(r"\d+\.\s*(.*?)(?=\n\d+\.|\Z)", re.DOTALL)
+
+MARKDOWN_PATTERN = re.compile(r"[*_~`#]+")
+BOLD_DAY_PATTERN = re.compile(r"\*\*Day\s*\d+\:\*\*")
+# Emoji and other 4-byte characters (a utf8mb3 MySQL column rejects them)
+ASTRAL_CHARS_PATTERN = re.compile(r"[\U00010000-\U0010FFFF]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+SHINGLE_SIZE = 3  # Characters per shingle
+NEAR_DUPLICATE_THRESHOLD = 0.7  # Jaccard similarity of the shingle sets
+SKETCH_BINS = 18
+BAND_ROWS = 3  # SKETCH_BINS / BAND_ROWS bands; tasks sharing any band are compared exactly
+EMPTY_BIN = 1 << 32
+
+
+def clean_task(task):
+    """Strip markdown and control/format characters; letters of any script are kept."""
+    task = BOLD_DAY_PATTERN.sub("", unicodedata.normalize("NFKC", task).strip()).strip()
+    task = MARKDOWN_PATTERN.sub("", task)
+    task = ASTRAL_CHARS_PATTERN.sub("", task)
+    task = "".join(ch for ch in task if unicodedata.category(ch)[0] != "C" or ch in "\t\n")
+    return WHITESPACE_PATTERN.sub(" ", task).strip()
+
+
+def parse_day_tasks(content):
+    """Cleaned task strings of one day block."""
+    tasks = []
+    for task in TASK_PATTERN.findall(content):
+        task = clean_task(task)
+        if task and "repeat last task" not in task.lower():
+            tasks.append(task)
+    return tasks
+
+
+def pad_plan(task_list, expected_days, tasks_per_day=3):
+    """Trim or pad (repeating the last task) the flat task list to expected_days full days."""
+    task_list = list(task_list)
+    last_task = task_list[-1] if task_list else {"task": "Generic fallback task", "isCompleted": False}
+    while len(task_list) < expected_days * tasks_per_day:
+        task_list.append(last_task)
+    return task_list[:expected_days * tasks_per_day]
+
+
+def shingles(task):
+    """Character shingles of the task, ignoring case and punctuation."""
+    text = f" {NON_WORD_PATTERN.sub(' ', task.casefold()).strip()} "
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def sketch(shingle_set):
+    """
+    One-permutation MinHash: each shingle hash falls into one of SKETCH_BINS
+    bins and each bin keeps its minimum, so a sketch costs one hash per shingle.
+    """
+    bins = [EMPTY_BIN] * SKETCH_BINS
+    for shingle in shingle_set:
+        value = zlib.crc32(shingle.encode())
+        slot = value % SKETCH_BINS
+        if value < bins[slot]:
+            bins[slot] = value
+    return bins
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def near_duplicates(tasks, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    {index: (index of the earlier task it repeats, similarity)} for every task
+    whose shingle Jaccard similarity to an earlier one is at least threshold.
+    Candidates come from banded sketches (LSH); only those pairs are compared
+    exactly, so a plan costs about linear time instead of all pairs.
+    """
+    sets = [shingles(task) for task in tasks]
+    buckets = {}
+    found = {}
+    for index, shingle_set in enumerate(sets):
+        bins = sketch(shingle_set)
+        candidates = set()
+        for band in range(0, SKETCH_BINS, BAND_ROWS):
+            key = (band, *bins[band:band + BAND_ROWS])
+            candidates.update(buckets.get(key, ()))
+            buckets.setdefault(key, []).append(index)
+
+        best = None
+        for earlier in sorted(candidates):
+            similarity = jaccard(shingle_set, sets[earlier])
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (earlier, round(similarity, 3))
+        if best is not None:
+            found[index] = best
+    return found
+
+
+PlanReport = namedtuple("PlanReport", "days missing_days duplicate_days near_duplicates")
+
+
+def parse_plan(text, expected_days, tasks_per_day=3, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Parse a full plan and report on it:
+      days            {day number: tasks} (first block of each number, at most tasks_per_day tasks)
+      missing_days    day numbers in 1..expected_days absent or with too few tasks
+      duplicate_days  day numbers written twice, or whose every task repeats an earlier day
+      near_duplicates [{"day", "index", "duplicate_of_day", "duplicate_of_index", "similarity"}]
+    """
+    days = {}
+    repeated = set()
+    for number, content in DAY_PATTERN.findall(text):
+        number = int(number)
+        if number in days:
+            repeated.add(number)
+            continue
+        days[number] = parse_day_tasks(content)[:tasks_per_day]
+    return report_days(days, expected_days, tasks_per_day, threshold, repeated)
+
+
+def report_days(days, expected_days, tasks_per_day=3, threshold=NEAR_DUPLICATE_THRESHOLD, repeated=()):
+    """PlanReport for already parsed {day number: tasks} (e.g. from IncrementalPlanParser)."""
+    positions = [(day, index) for day in sorted(days) for index in range(len(days[day]))]
+    matches = near_duplicates([days[day][index] for day, index in positions], threshold)
+
+    report = []
+    copied = {}  # day -> tasks repeating another day
+    for position, (earlier, similarity) in sorted(matches.items()):
+        (day, index), (other_day, other_index) = positions[position], positions[earlier]
+        report.append({
+            "day": day,
+            "index": index,
+            "duplicate_of_day": other_day,
+            "duplicate_of_index": other_index,
+            "similarity": similarity,
+        })
+        if other_day != day:
+            copied[day] = copied.get(day, 0) + 1
+
+    return PlanReport(
+        days=days,
+        missing_days=[day for day in range(1, expected_days + 1) if len(days.get(day, ())) < tasks_per_day],
+        duplicate_days=sorted(set(repeated) | {day for day, count in copied.items() if count == len(days[day])}),
+        near_duplicates=report,
+    )
+
+
+def plan_tasks(report, expected_days, tasks_per_day=3):
+    """Flat task list in day order; gaps of missing days are padded in place so days keep their slots."""
+    task_list = []
+    for day in range(1, expected_days + 1):
+        day_tasks = [{"task": task, "isCompleted": False} for task in report.days.get(day, ())]
+        task_list.extend(day_tasks)
+        if len(day_tasks) < tasks_per_day:
+            task_list = pad_plan(task_list, day, tasks_per_day)
+    return task_list
+
+
+def extract_tasks(text, expected_days):
+    return plan_tasks(parse_plan(text, expected_days), expected_days)
+
+
+class IncrementalPlanParser:
+    """
+    Parse a plan while it streams in. A day is complete once the next
+    "Day N:" header arrives; finish() flushes the last day.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self.days_parsed = 0
+
+    def _day(self, number, content):
+        self.days_parsed += 1
+        return {"day": self.days_parsed, "label": int(number), "tasks": parse_day_tasks(content)}
+
+    def feed(self, text):
+        """Add streamed text; returns the days completed by it."""
+        self._buffer += text
+        days = []
+        while True:
+            header = DAY_HEADER_PATTERN.search(self._buffer)
+            if header is None:
+                break
+            following = NEXT_DAY_PATTERN.search(self._buffer, header.end())
+            if following is None:
+                # Drop any preamble so the buffer only holds the open day
+                self._buffer = self._buffer[header.start():]
+                break
+            days.append(self._day(header.group(1), self._buffer[header.end():following.start()]))
+            self._buffer = self._buffer[following.start() + 1:]
+        return days
+
+    def finish(self):
+        """Days still buffered when the stream ends."""
+        buffer, self._buffer = self._buffer, ""
+        header = DAY_HEADER_PATTERN.search(buffer)
+        if header is None:
+            return []
+        return [self._day(header.group(1), buffer[header.end():])]
@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+from django.db import transaction
+from .models import Task
+from .signals import tasks_updated
+
+TASKS_PER_DAY = 3
+BULK_CHUNK_SIZE = 500  # Rows per INSERT statement, keeps packets small for very long plans
+
+
+def build_plan_tasks(habit, tasks, start_date, tasks_per_day=TASKS_PER_DAY):
+    """Unsaved Task rows for every complete day of the plan, starting at start_date."""
+    total_days = len(tasks) // tasks_per_day
+    rows = []
+    for day in range(total_days):
+        task_date = start_date + timedelta(days=day)
+        for item in tasks[day * tasks_per_day:(day + 1) * tasks_per_day]:
+            rows.append(Task(
+                habit_id=habit,
+                task=item['task'],
+                isCompleted=item.get('isCompleted', False),
+                date=task_date
+            ))
+    return rows
+
+
+def write_plan(habit, tasks, start_date=None, tasks_per_day=TASKS_PER_DAY, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Persist a day-by-day task plan for a habit in one transaction with chunked
+    bulk INSERTs and return the created task ids in plan order.
+
+    The dates covered by the plan must not already hold tasks of this habit.
+    """
+    start_date = start_date or date.today()
+    rows = build_plan_tasks(habit, tasks, start_date, tasks_per_day)
+    if not rows:
+        return []
+
+    with transaction.atomic():
+        for offset in range(0, len(rows), chunk_size):
+            Task.objects.bulk_create(rows[offset:offset + chunk_size])
+
+        if all(row.pk for row in rows):
+            task_ids = [row.pk for row in rows]
+        else:
+            # MySQL can't return ids from a bulk INSERT; read them back in insertion order
+            task_ids = list(
+                habit.tasks.filter(date__gte=rows[0].date, date__lte=rows[-1].date)
+                .order_by('id')
+                .values_list('id', flat=True)
+            )
+
+    tasks_updated.send(
+        sender=Task,
+        user=habit.user,
+        habit_ids=[habit.pk],
+        task_ids=task_ids,
+        dates=sorted({row.date for row in rows}),
+    )
+    return task_ids
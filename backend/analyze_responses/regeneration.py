@@ -0,0 +1,190 @@
+"""
+Regenerate chosen days of a saved plan: the model is asked for those days
+only, with the neighbouring days' tasks as context, and the answer replaces
+the day's Task rows in place.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max, Min
+from .models import Task
+from .plan_parser import parse_plan, report_days
+from .plans import TASKS_PER_DAY
+from .signals import tasks_updated
+
+MAX_DAYS = 30  # Days per request
+CONTEXT_DAYS = 2  # Neighbouring days shown to the model on each side
+TOKENS_PER_DAY = 120  # Output budget per requested day
+
+
+class InvalidSelection(ValueError):
+    pass
+
+
+def plan_span(habit):
+    """(date of day 1, number of days) of the habit's saved plan, or (None, 0)."""
+    span = habit.tasks.aggregate(first=Min('date'), last=Max('date'))
+    if span['first'] is None:
+        return None, 0
+    return span['first'], (span['last'] - span['first']).days + 1
+
+
+def select_days(data, total_days):
+    """Sorted day numbers from {"days": [..]} or {"from_day": a, "to_day": b}."""
+    if 'days' in data:
+        days = data['days']
+        if not isinstance(days, list) or not all(isinstance(day, int) and not isinstance(day, bool) for day in days):
+            raise InvalidSelection("'days' must be a list of day numbers")
+    else:
+        try:
+            first, last = int(data['from_day']), int(data.get('to_day', data['from_day']))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidSelection("Pass 'days' or 'from_day'/'to_day'")
+        days = range(first, last + 1)
+
+    days = sorted(set(days))
+    if not days:
+        raise InvalidSelection("No days selected")
+    if len(days) > MAX_DAYS:
+        raise InvalidSelection(f"At most {MAX_DAYS} days per request")
+    if days[0] < 1 or days[-1] > total_days:
+        raise InvalidSelection(f"Days must be between 1 and {total_days}")
+    return days
+
+
+def context_days(days, total_days):
+    """Unselected day numbers within CONTEXT_DAYS of a selected one."""
+    selected = set(days)
+    return sorted({
+        near for day in days for near in range(day - CONTEXT_DAYS, day + CONTEXT_DAYS + 1)
+        if 1 <= near <= total_days and near not in selected
+    })
+
+
+def build_prompt(habit, days, context, note=None):
+    """Chat messages asking for the selected days only. context: {day number: [task text]}."""
+    day_list = ", ".join(str(day) for day in days)
+    system_prompt = (
+        "You are an AI habit transformation coach revising part of an existing task plan "
+        f"for the habit: {habit.name} ({habit.type}).\n"
+        f"Write new tasks for these days only: {day_list}.\n"
+        f"Each day should have exactly {TASKS_PER_DAY} short, actionable tasks.\n"
+        "IMPORTANT RULES:\n"
+        "1. Fit the progression of the surrounding days shown below (gradually harder for good habits, "
+        "gradually less of a bad habit)\n"
+        "2. Never repeat or closely paraphrase a task from the surrounding days or from another new day\n"
+        "3. Never include 'repeat previous task' or similar instructions\n"
+        "\n"
+        "Return only the requested days in this format:\n"
+        f"Day {days[0]}:\n1. Unique task one\n2. Unique task two\n3. Unique task three\nDay ...:"
+    )
+
+    user_prompt = f"Habit: {habit.name}\n"
+    if context:
+        user_prompt += "\nSurrounding days (keep as they are):\n"
+        for day in sorted(context):
+            user_prompt += f"Day {day}:\n" + "".join(
+                f"{index}. {task}\n" for index, task in enumerate(context[day], 1)
+            )
+    if note:
+        user_prompt += f"\nThe user wants these days changed because: {note}\n"
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def day_tasks(habit, first_date, day_numbers):
+    """{day number: [Task]} for these days, tasks in id order, in one query."""
+    by_day = {day: [] for day in day_numbers}
+    dates = [first_date + timedelta(days=day - 1) for day in day_numbers]
+    for task in habit.tasks.filter(date__in=dates).order_by('date', 'id'):
+        by_day[(task.date - first_date).days + 1].append(task)
+    return by_day
+
+
+def repeated_days(new_days, context):
+    """
+    Regenerated day numbers with a task that near-duplicates a task of the
+    context days or another regenerated task (see plan_parser.near_duplicates).
+    """
+    matches = report_days({**context, **new_days}, 0).near_duplicates
+    return sorted({
+        match['day'] if match['day'] in new_days else match['duplicate_of_day']
+        for match in matches
+        if match['day'] in new_days or match['duplicate_of_day'] in new_days
+    })
+
+
+def replace_days(habit, first_date, new_days):
+    """
+    Overwrite the tasks of each regenerated day in place (new text, not
+    completed) with one bulk UPDATE. Rows are added when the model wrote more
+    tasks than the day has and deleted when it wrote fewer, so each day ends up
+    with exactly the new tasks. Returns {day number: [Task]} of the day's tasks.
+    """
+    current = day_tasks(habit, first_date, list(new_days))
+    changed, created, surplus = [], [], []
+    result = {}
+    for day, texts in new_days.items():
+        rows = current[day]
+        for row, text in zip(rows, texts):
+            row.task = text
+            row.isCompleted = False
+            changed.append(row)
+        created.extend(
+            Task(habit_id=habit, task=text, date=first_date + timedelta(days=day - 1))
+            for text in texts[len(rows):]
+        )
+        surplus.extend(task.pk for task in rows[len(texts):])
+        result[day] = rows[:len(texts)]
+
+    with transaction.atomic():
+        Task.objects.bulk_update(changed, ['task', 'isCompleted'])
+        if created:
+            Task.objects.bulk_create(created)
+        if surplus:
+            Task.objects.filter(pk__in=surplus).delete()
+
+    if created:
+        # bulk_create only returns ids on some backends; read the days back
+        result = {
+            day: tasks[:len(new_days[day])]
+            for day, tasks in day_tasks(habit, first_date, list(new_days)).items()
+        }
+
+    tasks_updated.send(
+        sender=Task,
+        user=habit.user,
+        habit_ids=[habit.pk],
+        task_ids=[task.pk for tasks in result.values() for task in tasks],
+        dates=sorted(first_date + timedelta(days=day - 1) for day in new_days),
+        deleted_task_ids=surplus,
+    )
+    return result
+
+
+def regenerate(habit, days, complete, note=None):
+    """
+    Regenerate `days` of the habit's plan. `complete(messages, **params)` calls
+    the model. Returns ({day number: [Task]}, day numbers the model left out,
+    day numbers left unchanged because a new task repeated another day's).
+    """
+    first_date, total_days = plan_span(habit)
+    near = context_days(days, total_days)
+    context = {
+        day: [task.task for task in tasks]
+        for day, tasks in day_tasks(habit, first_date, near).items() if tasks
+    }
+
+    text = complete(build_prompt(habit, days, context, note), temperature=0.7,
+                    max_tokens=TOKENS_PER_DAY * len(days) + 100)
+    report = parse_plan(text, days[-1])
+    new_days = {day: report.days[day] for day in days if report.days.get(day)}
+    missing = [day for day in days if day not in new_days]
+    repeated = repeated_days(new_days, context)
+    for day in repeated:
+        del new_days[day]
+    if not new_days:
+        return {}, missing, repeated
+    return replace_days(habit, first_date, new_days), missing, repeated
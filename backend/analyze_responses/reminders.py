@@ -0,0 +1,122 @@
+"""
+Server-side habit reminders. Habits are bucketed by `reminder_minute`
+(the reminder's minute after midnight in UTC, from the user's
+reminder_timezone), so each minute the dispatcher reads one bucket through
+habit_reminder_due_idx instead of scanning every habit. "Today" is the
+habit's own local date. Habits with nothing left to do that day are skipped
+and the rest go out in batches through the REMINDER_SENDER class.
+"""
+import json
+import logging
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Case, DateField, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import ExtractHour, ExtractMinute, Mod
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import DailyCompletion, Habit
+
+logger = logging.getLogger(__name__)
+
+
+class LogSender:
+    """Writes reminders to the log; the default until a push provider is configured."""
+
+    def send(self, reminders):
+        for reminder in reminders:
+            logger.info("Reminder for user %s: %s (%s tasks left)",
+                        reminder['user_id'], reminder['habit_name'], reminder['remaining_tasks'])
+
+
+class FileSender:
+    """Appends reminders as JSON lines to REMINDER_OUTBOX_PATH (local testing)."""
+
+    def __init__(self, path=None):
+        self.path = path or settings.REMINDER_OUTBOX_PATH
+
+    def send(self, reminders):
+        with open(self.path, 'a', encoding='utf-8') as outbox:
+            for reminder in reminders:
+                outbox.write(json.dumps(reminder) + '\n')
+
+
+def get_sender(dotted_path=None):
+    return import_string(dotted_path or settings.REMINDER_SENDER)()
+
+
+def local_date(moment):
+    """Each habit's calendar date at `moment`, from its stored UTC offset."""
+    moment = moment.astimezone(dt_timezone.utc)
+    minute = moment.hour * 60 + moment.minute
+    today = moment.date()
+    return Case(
+        When(reminder_utc_offset__lt=-minute, then=Value(today - timedelta(days=1))),
+        When(reminder_utc_offset__gte=1440 - minute, then=Value(today + timedelta(days=1))),
+        default=Value(today),
+        output_field=DateField(),
+    )
+
+
+def due_habits(moment):
+    """Habits to remind at this UTC minute: reminders on, not yet sent on their local day, tasks still open."""
+    moment = moment.astimezone(dt_timezone.utc)
+    remaining = DailyCompletion.objects.filter(habit=OuterRef('pk'), date=OuterRef('local_date')).values(
+        remaining=F('total') - F('completed')
+    )[:1]
+    return Habit.objects.filter(
+        reminder_minute=moment.hour * 60 + moment.minute,
+        notification_status=True,
+        user__isnull=False,
+    ).annotate(local_date=local_date(moment)).filter(
+        Q(last_reminded_on__isnull=True) | Q(last_reminded_on__lt=F('local_date'))
+    ).annotate(remaining_tasks=Subquery(remaining)).filter(remaining_tasks__gt=0)
+
+
+def dispatch_minute(moment, sender, batch_size=None):
+    """Send every reminder due at `moment`'s minute; returns how many went out."""
+    batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+    due = due_habits(moment).order_by('pk').values('pk', 'user_id', 'name', 'remaining_tasks', 'local_date')
+
+    sent = 0
+    last_pk = None
+    while True:
+        batch = list((due.filter(pk__gt=last_pk) if last_pk else due)[:batch_size])
+        if not batch:
+            return sent
+        sender.send([
+            {
+                'user_id': row['user_id'],
+                'habit_id': str(row['pk']),
+                'habit_name': row['name'],
+                'remaining_tasks': row['remaining_tasks'],
+                'date': row['local_date'].isoformat(),
+            }
+            for row in batch
+        ])
+        # Marked after a successful send: a crash mid-batch resends rather than drops
+        Habit.objects.filter(pk__in=[row['pk'] for row in batch]).update(last_reminded_on=local_date(moment))
+        sent += len(batch)
+        last_pk = batch[-1]['pk']
+
+
+def rebucket(at=None):
+    """Move reminders whose zone changed UTC offset (DST) to their new bucket; returns how many moved."""
+    at = at or timezone.now()
+    scheduled = Habit.objects.filter(reminder_time__isnull=False)
+    moved = 0
+    for zone in scheduled.order_by().values_list('reminder_timezone', flat=True).distinct():
+        offset = Habit(reminder_timezone=zone).reminder_bucket(at)[1]
+        local_minute = ExtractHour('reminder_time') * 60 + ExtractMinute('reminder_time')
+        moved += scheduled.filter(reminder_timezone=zone).exclude(reminder_utc_offset=offset).update(
+            reminder_minute=Mod(local_minute - offset + 1440, 1440),
+            reminder_utc_offset=offset,
+        )
+    return moved
+
+
+def minutes_between(since, now):
+    """Each whole minute after `since` up to and including `now`'s minute."""
+    moment = since.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while moment <= now:
+        yield moment
+        moment += timedelta(minutes=1)
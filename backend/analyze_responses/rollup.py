@@ -0,0 +1,192 @@
+"""
+Daily completion rollup: one DailyCompletion row per (habit, day) with the
+completed/total task counts. Reports and rankings read these rows instead of
+counting tasks. Bulk writes to Task refresh just the days they touch; single
+task saves and deletes add their change to the day's row. Days that become
+(or stop being) fully completed are passed on to streaks.py.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from .models import DailyCompletion, Habit, Task
+from . import signals, streaks
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def _day_counts(tasks):
+    return tasks.values('habit_id', 'date').annotate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(isCompleted=True)),
+    ).order_by()
+
+
+def _upsert(rows):
+    options = {}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['habit', 'date']
+    DailyCompletion.objects.bulk_create(
+        rows,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        update_fields=['user', 'completed', 'total'],
+        **options
+    )
+
+
+def refresh(habit_ids, first_day, last_day, user=None):
+    """Recompute the rows of these habits for every day in [first_day, last_day]."""
+    habit_ids = list(habit_ids)
+    days = Q(date__gte=first_day, date__lte=last_day)
+
+    with transaction.atomic():
+        # Locking the habits serializes refreshes of the same habit, so streak flips apply in order
+        owners = dict(
+            Habit.objects.select_for_update().filter(pk__in=habit_ids).order_by('pk').values_list('pk', 'user_id')
+        )
+        counts = list(_day_counts(Task.objects.filter(days, habit_id__in=owners)))
+        before = {
+            (habit_id, day): (pk, streaks.is_full(completed, total))
+            for pk, habit_id, day, completed, total in
+            DailyCompletion.objects.filter(days, habit_id__in=habit_ids).values_list(
+                'pk', 'habit_id', 'date', 'completed', 'total'
+            )
+        }
+        after = {
+            (row['habit_id'], row['date']): streaks.is_full(row['completed'], row['total'])
+            for row in counts
+        }
+
+        # Days whose tasks are all gone
+        stale = [pk for key, (pk, _) in before.items() if key not in after]
+        if stale:
+            DailyCompletion.objects.filter(pk__in=stale).delete()
+        _upsert([
+            DailyCompletion(
+                user_id=owners[row['habit_id']],
+                habit_id=row['habit_id'],
+                date=row['date'],
+                completed=row['completed'],
+                total=row['total'],
+            )
+            for row in counts
+        ])
+
+        flips = {}
+        for habit_id, day in before.keys() | after.keys():
+            full = after.get((habit_id, day), False)
+            if full != before.get((habit_id, day), (None, False))[1]:
+                flips.setdefault(habit_id, {})[day] = full
+        streaks.apply_flips(flips)
+
+    signals.completions_updated.send(
+        sender=DailyCompletion,
+        user_id=user.pk if user is not None else None,
+        user=user,
+        first_day=first_day,
+        last_day=last_day,
+    )
+
+
+def rebuild(user=None):
+    """Recompute the whole rollup (or one user's part of it) from the task table."""
+    tasks = Task.objects.all()
+    rows = DailyCompletion.objects.all()
+    if user is not None:
+        tasks = tasks.filter(habit_id__user=user)
+        rows = rows.filter(user=user)
+
+    habits = Habit.objects.all() if user is None else Habit.objects.filter(user=user)
+    owners = dict(habits.values_list('pk', 'user_id'))
+
+    with transaction.atomic():
+        rows.delete()
+        batch = []
+        for row in _day_counts(tasks).iterator():
+            batch.append(DailyCompletion(
+                user_id=owners.get(row['habit_id']),
+                habit_id=row['habit_id'],
+                date=row['date'],
+                completed=row['completed'],
+                total=row['total'],
+            ))
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                DailyCompletion.objects.bulk_create(batch)
+                batch = []
+        DailyCompletion.objects.bulk_create(batch)
+        # Streak runs are derived from the rollup, so they are rebuilt with it
+        streaks.rebuild(habits.iterator())
+
+
+def task_deltas(before, after):
+    """
+    Rollup change of one task going from `before` to `after`, each a
+    Task.rollup_state() or None: {(habit_id, day): (completed, total)}.
+    """
+    deltas = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            habit_id, day, done = state
+            completed, total = deltas.get((habit_id, day), (0, 0))
+            deltas[(habit_id, day)] = (completed + sign * done, total + sign)
+    return {key: change for key, change in deltas.items() if change != (0, 0)}
+
+
+def apply_deltas(deltas):
+    """
+    Add task count changes, {(habit_id, day): (completed, total)}, to the rows
+    instead of recounting the days' tasks. A row the change doesn't fit (it
+    would go negative) is recounted instead.
+    """
+    if not deltas:
+        return
+    habit_ids = sorted({habit_id for habit_id, _ in deltas})
+    changed = {}  # {user_id: {day: [completed, total]}}
+    recounted = set()  # Users with a recounted day, whose change isn't known
+
+    with transaction.atomic():
+        # Same lock as refresh(), so changes and recounts of a habit apply in order
+        owners = dict(
+            Habit.objects.select_for_update().filter(pk__in=habit_ids).order_by('pk').values_list('pk', 'user_id')
+        )
+        rows = {
+            (row.habit_id, row.date): row
+            for row in DailyCompletion.objects.filter(habit_id__in=owners, date__in={day for _, day in deltas})
+        }
+        flips = {}
+        for (habit_id, day), (completed, total) in sorted(deltas.items()):
+            if habit_id not in owners:
+                continue  # Habit deleted; the cascade removed its rows
+            user_id = owners[habit_id]
+            day_change = changed.setdefault(user_id, {}).setdefault(day, [0, 0])
+            day_change[0] += completed
+            day_change[1] += total
+
+            row = rows.get((habit_id, day)) or DailyCompletion(
+                user_id=user_id, habit_id=habit_id, date=day, completed=0, total=0
+            )
+            was_full = streaks.is_full(row.completed, row.total)
+            row.completed += completed
+            row.total += total
+            if not 0 <= row.completed <= row.total:
+                refresh([habit_id], day, day)
+                recounted.add(user_id)
+                continue
+            if not row.total:
+                if row.pk:
+                    row.delete()
+            elif row.pk:
+                row.save(update_fields=['completed', 'total'])
+            else:
+                row.save()
+            if streaks.is_full(row.completed, row.total) != was_full:
+                flips.setdefault(habit_id, {})[day] = not was_full
+        streaks.apply_flips(flips)
+
+    for user_id, days in changed.items():
+        signals.completions_updated.send(
+            sender=DailyCompletion,
+            user_id=user_id,
+            first_day=min(days),
+            last_day=max(days),
+            deltas=None if user_id in recounted else {day: tuple(change) for day, change in days.items()},
+        )
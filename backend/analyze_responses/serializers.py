@@ -14,14 +14,22 @@ class TaskSerializer(serializers.ModelSerializer):
 
 class HabitSerializer(serializers.ModelSerializer):
     tasks = serializers.SerializerMethodField()
+    current_streak = serializers.SerializerMethodField()
 
     class Meta:
         model = Habit
-        fields = ['id', 'name', 'type', 'tasks', 'notification_status', 'reminder_time']
+        fields = ['id', 'name', 'type', 'tasks', 'notification_status', 'reminder_time',
+                  'current_streak', 'longest_streak']
+        read_only_fields = ['longest_streak']
+
+    def get_current_streak(self, habit):
+        return habit.current_streak()
 
     def get_tasks(self, habit):
-        today = date.today()
-        tasks = habit.tasks.filter(date=today)
+        # Views prefetch today's tasks into `today_tasks`; otherwise query them per habit
+        tasks = getattr(habit, 'today_tasks', None)
+        if tasks is None:
+            tasks = habit.tasks.filter(date=date.today())
         return TaskSerializer(tasks, many=True).data
     
     def create(self, validated_data):
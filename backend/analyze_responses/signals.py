@@ -0,0 +1,67 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import Habit, Task
+from . import rollup, versioning
+
+# Sent after tasks are written, updated or deleted in bulk (bulk_create/update and queryset
+# deletes skip the per-row signals). Arguments: user, habit_ids, task_ids, dates and, when
+# rows were removed, deleted_task_ids
+tasks_updated = Signal()
+
+# Sent after DailyCompletion rows of a user changed. Arguments: user_id, first_day, last_day,
+# user (the instance, when the sender has it) and deltas ({day: (completed, total)} added to the
+# rows, when they were adjusted rather than recounted)
+completions_updated = Signal()
+
+
+@receiver(post_save, sender=Habit)
+def bump_version_on_habit_save(sender, instance, **kwargs):
+    versioning.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=Habit)
+def bump_version_on_habit_delete(sender, instance, **kwargs):
+    # Deletes cascading from the user take the version row with them
+    if isinstance(kwargs.get('origin'), Habit):
+        versioning.bump(instance.user_id)
+
+
+@receiver(post_save, sender=Task)
+def bump_version_on_task_save(sender, instance, **kwargs):
+    versioning.bump(instance.habit_id.user_id)
+
+
+@receiver(tasks_updated, sender=Task)
+def bump_version_on_bulk_update(sender, user, **kwargs):
+    if user is not None:
+        versioning.bump(user.pk)
+
+
+@receiver(post_save, sender=Task)
+def update_rollup_on_task_save(sender, instance, created, update_fields, **kwargs):
+    before = getattr(instance, 'stored_state', None)
+    after = instance.rollup_state()
+    if before is not None and update_fields is not None:
+        # Fields left out of the save keep their stored values
+        saved = {Task._meta.get_field(name).attname for name in update_fields}
+        after = tuple(new if attname in saved else old for attname, old, new in zip(Task.ROLLUP_FIELDS, before, after))
+    if created or before is not None:
+        rollup.apply_deltas(rollup.task_deltas(None if created else before, after))
+    else:
+        # Saved without being loaded first, so its previous day is unknown: recount this one
+        rollup.refresh([instance.habit_id_id], instance.date, instance.date, user=instance.habit_id.user)
+    instance.stored_state = after
+
+
+@receiver(post_delete, sender=Task)
+def update_rollup_on_task_delete(sender, instance, **kwargs):
+    # Habit and user deletes cascade to the rollup rows themselves
+    if isinstance(kwargs.get('origin'), Task):
+        before = getattr(instance, 'stored_state', None) or instance.rollup_state()
+        rollup.apply_deltas(rollup.task_deltas(before, None))
+
+
+@receiver(tasks_updated, sender=Task)
+def refresh_rollup_on_bulk_update(sender, user, habit_ids, dates, **kwargs):
+    if habit_ids and dates:
+        rollup.refresh(habit_ids, min(dates), max(dates), user=user)
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncYear
+from django.utils import timezone
+
+
+def _counts():
+    # Summed over DailyCompletion rows: one row per habit and day, not per task
+    return {
+        'total': Coalesce(Sum('total'), 0),
+        'completed': Coalesce(Sum('completed'), 0),
+    }
+
+
+def _percentage(completed, total):
+    return (completed / total) * 100 if total > 0 else 0
+
+
+def completion_totals(days):
+    """(completed, total) for a DailyCompletion queryset in one query."""
+    totals = days.aggregate(**_counts())
+    return totals['completed'], totals['total']
+
+
+def _bucket_windows(time_range, today):
+    """Bucket start dates (oldest first), the grouping function and the label format for a range."""
+    if time_range == 'monthly':
+        starts = []
+        year, month = today.year, today.month
+        for _ in range(12):
+            starts.append(date(year, month, 1))
+            month -= 1
+            if month < 1:
+                month += 12
+                year -= 1
+        starts.reverse()
+        end = date(today.year + (today.month == 12), today.month % 12 + 1, 1) - timedelta(days=1)
+        return starts, end, TruncMonth('date'), '%b'
+
+    if time_range == 'yearly':
+        starts = [date(today.year - 4 + i, 1, 1) for i in range(5)]
+        return starts, date(today.year, 12, 31), TruncYear('date'), None
+
+    # daily
+    starts = [today - timedelta(days=6 - i) for i in range(7)]
+    return starts, today, None, '%a'
+
+
+def completion_buckets(days, time_range='daily', now=None):
+    """
+    Completion percentage and completed count per bucket for the last 7 days,
+    12 months or 5 years, computed with a single grouped query.
+    """
+    if time_range not in ('daily', 'monthly', 'yearly'):
+        return {'stats': [], 'labels': [], 'taskCounts': []}
+
+    today = (now or timezone.now()).date()
+    starts, end, trunc, label_format = _bucket_windows(time_range, today)
+
+    window = days.filter(date__gte=starts[0], date__lte=end)
+    if trunc is None:
+        rows = window.values('date').annotate(**_counts())
+    else:
+        rows = window.annotate(bucket=trunc).values('bucket').annotate(**_counts())
+
+    by_bucket = {}
+    for row in rows:
+        bucket = row['bucket'] if 'bucket' in row else row['date']
+        if isinstance(bucket, datetime):
+            bucket = bucket.date()
+        by_bucket[bucket] = (row['completed'], row['total'])
+
+    stats = []
+    labels = []
+    task_counts = []
+    for start in starts:
+        completed, total = by_bucket.get(start, (0, 0))
+        stats.append(_percentage(completed, total))
+        task_counts.append(completed)
+        labels.append(start.strftime(label_format) if label_format else str(start.year))
+
+    return {
+        'stats': stats,
+        'labels': labels,
+        'taskCounts': task_counts
+    }
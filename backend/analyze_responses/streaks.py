@@ -0,0 +1,119 @@
+"""
+Per-habit streaks of fully completed days (every task of the day done).
+
+The rollup reports the days whose full/not-full state flipped; each flip
+merges, trims or splits the stored HabitStreakRun rows around that day, so an
+update costs a few indexed lookups however long the habit's history is.
+Habit.streak_start/streak_end (most recent run) and longest_streak are
+refreshed afterwards for the habits endpoints.
+"""
+from datetime import timedelta
+from django.db.models import Max
+from .models import DailyCompletion, Habit, HabitStreakRun
+
+ONE_DAY = timedelta(days=1)
+
+
+def is_full(completed, total):
+    return total > 0 and completed == total
+
+
+def _save(run):
+    run.length = (run.end - run.start).days + 1
+    run.save(update_fields=['start', 'end', 'length'])
+
+
+def _containing(habit_id, day):
+    run = HabitStreakRun.objects.filter(habit_id=habit_id, end__gte=day).order_by('end').first()
+    return run if run is not None and run.start <= day else None
+
+
+def _mark_full(habit_id, day):
+    runs = HabitStreakRun.objects.filter(habit_id=habit_id)
+    left = runs.filter(end=day - ONE_DAY).first()
+    right = runs.filter(start=day + ONE_DAY).first()
+
+    if left and right:
+        left.end = right.end
+        right.delete()
+        _save(left)
+    elif left:
+        left.end = day
+        _save(left)
+    elif right:
+        right.start = day
+        _save(right)
+    elif _containing(habit_id, day) is None:
+        HabitStreakRun.objects.create(habit_id=habit_id, start=day, end=day, length=1)
+
+
+def _mark_broken(habit_id, day):
+    run = _containing(habit_id, day)
+    if run is None:
+        return
+    if run.start == run.end:
+        run.delete()
+        return
+
+    if day == run.start:
+        run.start = day + ONE_DAY
+    elif day == run.end:
+        run.end = day - ONE_DAY
+    else:
+        # Split around the day
+        HabitStreakRun.objects.create(
+            habit_id=habit_id, start=day + ONE_DAY, end=run.end, length=(run.end - day).days
+        )
+        run.end = day - ONE_DAY
+    _save(run)
+
+
+def _summarize(habit_id):
+    runs = HabitStreakRun.objects.filter(habit_id=habit_id)
+    latest = runs.order_by('-end').values('start', 'end').first() or {'start': None, 'end': None}
+    Habit.objects.filter(pk=habit_id).update(
+        streak_start=latest['start'],
+        streak_end=latest['end'],
+        longest_streak=runs.aggregate(longest=Max('length'))['longest'] or 0,
+    )
+
+
+def apply_flips(flips):
+    """
+    flips: {habit_id: {day: is now fully completed}}. Call inside the rollup's
+    transaction, with the habit rows locked, so flips of one habit apply in order.
+    """
+    for habit_id, days in flips.items():
+        for day, full in sorted(days.items()):
+            if full:
+                _mark_full(habit_id, day)
+            else:
+                _mark_broken(habit_id, day)
+        _summarize(habit_id)
+
+
+def runs_from_days(days):
+    """(start, end) runs from an ascending sequence of fully completed dates."""
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] == day - ONE_DAY:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def rebuild(habits):
+    """Recompute runs and summaries of these habits from the daily rollup."""
+    for habit in habits:
+        habit.streak_runs.all().delete()
+        full_days = [
+            day for day, completed, total in
+            DailyCompletion.objects.filter(habit=habit).order_by('date').values_list('date', 'completed', 'total')
+            if is_full(completed, total)
+        ]
+        HabitStreakRun.objects.bulk_create([
+            HabitStreakRun(habit=habit, start=start, end=end, length=(end - start).days + 1)
+            for start, end in runs_from_days(full_days)
+        ])
+        _summarize(habit.pk)
@@ -0,0 +1,80 @@
+"""
+Batch check-offs: many {task_id, isCompleted} pairs from one user applied
+with one ownership query and one UPDATE.
+"""
+from django.db import transaction
+from django.db.models import Case, Value, When, BooleanField
+from .models import DailyCompletion, Task
+from .signals import tasks_updated
+
+MAX_BATCH_SIZE = 500
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def parse_updates(items):
+    """{task_id: isCompleted} from the request payload; the last entry for a task wins."""
+    if not isinstance(items, list) or not items:
+        raise InvalidBatch("'tasks' must be a non-empty list")
+    if len(items) > MAX_BATCH_SIZE:
+        raise InvalidBatch(f"At most {MAX_BATCH_SIZE} tasks per request")
+
+    updates = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise InvalidBatch("Each entry needs 'task_id' and 'isCompleted'")
+        task_id, done = item.get('task_id'), item.get('isCompleted')
+        if isinstance(task_id, bool) or not isinstance(task_id, int) or not isinstance(done, bool):
+            raise InvalidBatch("Each entry needs an integer 'task_id' and a boolean 'isCompleted'")
+        updates[task_id] = done
+    return updates
+
+
+def apply_updates(user, updates):
+    """
+    Set isCompleted on the user's tasks. Ids the user doesn't own (or that no
+    longer exist) are skipped and reported. Returns a response payload with the
+    refreshed completion counts of each (habit, date) the request's tasks are on.
+    """
+    owned = {
+        task_id: (habit_id, day, done)
+        for task_id, habit_id, day, done in Task.objects.filter(
+            id__in=updates, habit_id__user=user
+        ).values_list('id', 'habit_id', 'date', 'isCompleted')
+    }
+    changed = [task_id for task_id, (_, _, done) in owned.items() if updates[task_id] != done]
+
+    if changed:
+        with transaction.atomic():
+            Task.objects.filter(id__in=changed).update(isCompleted=Case(
+                When(id__in=[task_id for task_id in changed if updates[task_id]], then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ))
+        # Refreshes the rollup, the habits-today version and the leaderboard
+        tasks_updated.send(
+            sender=Task,
+            user=user,
+            habit_ids=sorted({owned[task_id][0] for task_id in changed}),
+            task_ids=changed,
+            dates=sorted({owned[task_id][1] for task_id in changed}),
+        )
+
+    # One query over habits x dates, narrowed to the (habit, date) pairs of the request's tasks
+    pairs = {(habit_id, day) for habit_id, day, _ in owned.values()}
+    days = [
+        {'habit_id': habit_id, 'date': day, 'completed': day_completed, 'total': day_total}
+        for habit_id, day, day_completed, day_total in DailyCompletion.objects.filter(
+            habit_id__in={habit_id for habit_id, _ in pairs}, date__in={day for _, day in pairs}
+        ).order_by('date', 'habit_id').values_list('habit_id', 'date', 'completed', 'total')
+        if (habit_id, day) in pairs
+    ]
+    return {
+        'updated': len(changed),
+        'not_found': sorted(set(updates) - set(owned)),
+        'days': days,
+        'completed': sum(day['completed'] for day in days),
+        'total': sum(day['total'] for day in days),
+    }
@@ -1,3 +1,702 @@
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import time
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APIClient
+from django.test.utils import CaptureQueriesContext
+from app_frontend.models import CustomUser
+from .models import DailyCompletion, Habit, HabitStreakRun, Task
+from . import regeneration, reminders, rollup, task_status
+from .streaks import runs_from_days
+from .plans import BULK_CHUNK_SIZE, TASKS_PER_DAY, write_plan
+from .plan_parser import extract_tasks, jaccard, parse_plan, shingles, NEAR_DUPLICATE_THRESHOLD
+from .stats import completion_buckets
 
-# Create your tests here.
+
+def make_plan(days):
+    return [
+        {'task': f'Day {day + 1} task {slot + 1}', 'isCompleted': False}
+        for day in range(days)
+        for slot in range(TASKS_PER_DAY)
+    ]
+
+
+class InsertCounter:
+    """execute_wrapper counting INSERTs into a table as they run (the query log is capped)."""
+
+    def __init__(self, table=Task._meta.db_table):
+        self.prefix = f'INSERT INTO {connection.ops.quote_name(table)}'
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().startswith(self.prefix):
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class WritePlanTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='plan@example.com', full_name='Plan User', password='pw')
+
+    def new_habit(self):
+        return Habit.objects.create(name='Reading', type='Good', user=self.user)
+
+    def test_returns_ids_in_plan_order(self):
+        habit = self.new_habit()
+        start = date(2025, 1, 1)
+        task_ids = write_plan(habit, make_plan(4), start_date=start)
+
+        tasks = Task.objects.in_bulk(task_ids)
+        self.assertEqual(len(task_ids), 4 * TASKS_PER_DAY)
+        self.assertEqual([tasks[task_id].task for task_id in task_ids], [t['task'] for t in make_plan(4)])
+        self.assertEqual(tasks[task_ids[-1]].date, start + timedelta(days=3))
+
+    def test_incomplete_last_day_is_dropped(self):
+        habit = self.new_habit()
+        task_ids = write_plan(habit, make_plan(2)[:-1])
+        self.assertEqual(len(task_ids), TASKS_PER_DAY)
+
+    def test_insert_count_and_latency_versus_plan_length(self):
+        """Benchmark: per-row create loop (old save_tasks) against write_plan."""
+        print(f"\n{'days':>6} {'tasks':>6} {'loop INSERTs':>13} {'loop ms':>9} {'bulk INSERTs':>13} {'bulk ms':>9}")
+        for days in (7, 30, 90, 365):
+            plan = make_plan(days)
+
+            habit = self.new_habit()
+            loop_inserts = InsertCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(loop_inserts):
+                for index, item in enumerate(plan):
+                    Task.objects.create(
+                        habit_id=habit,
+                        task=item['task'],
+                        date=date.today() + timedelta(days=index // TASKS_PER_DAY),
+                    )
+            loop_ms = (time.perf_counter() - started) * 1000
+
+            habit = self.new_habit()
+            bulk_inserts = InsertCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(bulk_inserts):
+                task_ids = write_plan(habit, plan)
+            bulk_ms = (time.perf_counter() - started) * 1000
+
+            print(f"{days:>6} {len(plan):>6} {loop_inserts.count:>13} "
+                  f"{loop_ms:>9.1f} {bulk_inserts.count:>13} {bulk_ms:>9.1f}")
+
+            self.assertEqual(loop_inserts.count, len(plan))
+            self.assertEqual(len(task_ids), len(plan))
+            # The backend may split a chunk further (SQLite caps variables per statement)
+            fields = [field for field in Task._meta.concrete_fields if not field.primary_key]
+            rows_per_insert = connection.ops.bulk_batch_size(fields, plan)
+            chunks = [min(BULK_CHUNK_SIZE, len(plan) - offset) for offset in range(0, len(plan), BULK_CHUNK_SIZE)]
+            self.assertEqual(bulk_inserts.count, sum(math.ceil(chunk / rows_per_insert) for chunk in chunks))
+
+
+def explain(sql):
+    """Plan rows of an executed statement, as dicts keyed by the backend's EXPLAIN columns."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def full_scans(sql, table):
+    """Plan steps that read every row of `table`."""
+    rows = explain(sql)
+    if connection.vendor == 'sqlite':
+        return [row['detail'] for row in rows if re.match(rf'SCAN {table}\b', row['detail'])]
+    if connection.vendor == 'mysql':
+        return [row for row in rows if row.get('table') == table and row.get('type') == 'ALL']
+    return [line for row in rows for line in row.values() if f'Seq Scan on {table}' in str(line)]
+
+
+class TaskQueryPlanTests(TestCase):
+    """Each hot Task (or rollup) query must be an index lookup; a full table scan fails the test."""
+
+    table = Task._meta.db_table
+    rollup_table = DailyCompletion._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='plans@example.com', full_name='Plans', password='pw')
+        other = CustomUser.objects.create_user(email='other@example.com', full_name='Other', password='pw')
+        for owner in (cls.user, other):
+            for name in ('Reading', 'Running', 'Smoking'):
+                habit = Habit.objects.create(name=name, type='Good', user=owner)
+                write_plan(habit, make_plan(60), start_date=date.today() - timedelta(days=30))
+
+    def task_selects(self, run, table=None):
+        table = table or self.table
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT') and table in query['sql']
+        ]
+
+    def assert_index_only(self, run, table=None):
+        table = table or self.table
+        task_selects = self.task_selects(run, table)
+        self.assertTrue(task_selects, f'no {table} query was captured')
+        for sql in task_selects:
+            self.assertEqual(full_scans(sql, table), [], f'full scan of {table} in:\n{sql}')
+
+    def test_harness_detects_full_scan(self):
+        # Task text is not indexed, so this has to be reported
+        sql, = self.task_selects(lambda: list(Task.objects.filter(task='Day 1 task 1')))
+        self.assertTrue(full_scans(sql, self.table))
+
+    def test_habits_today(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_index_only(lambda: client.get('/api/habits-today/'))
+
+    def test_completion_stats(self):
+        days = DailyCompletion.objects.filter(user=self.user)
+        for time_range in ('daily', 'monthly', 'yearly'):
+            self.assert_index_only(lambda: completion_buckets(days, time_range), self.rollup_table)
+
+    def test_profile_stats(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_index_only(lambda: client.get('/api/stats/'), self.rollup_table)
+
+    def test_leaderboard_refresh(self):
+        from profileandchat import leaderboard_service
+        self.assert_index_only(lambda: leaderboard_service.refresh_user(self.user), self.rollup_table)
+
+    def test_rollup_refresh(self):
+        task = Task.objects.filter(habit_id__user=self.user).first()
+        self.assert_index_only(lambda: rollup.refresh([task.habit_id_id], task.date, task.date))
+
+    def test_rollup_delta(self):
+        task = Task.objects.filter(habit_id__user=self.user).first()
+        task.isCompleted = True
+        self.assert_index_only(task.save, self.rollup_table)
+
+    def test_plan_id_requery(self):
+        habit = Habit.objects.filter(user=self.user).first()
+        start = date.today()
+        self.assert_index_only(lambda: list(
+            habit.tasks.filter(date__gte=start, date__lte=start + timedelta(days=6)).order_by('id')
+        ))
+
+
+class DailyCompletionRollupTests(TestCase):
+    """The rollup must always equal a fresh count of the task table."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='rollup@example.com', full_name='Rollup', password='pw')
+        self.habit = Habit.objects.create(name='Reading', type='Good', user=self.user)
+        self.start = date.today() - timedelta(days=2)
+        write_plan(self.habit, make_plan(5), start_date=self.start)
+
+    def rows(self):
+        return sorted(DailyCompletion.objects.values_list('habit_id', 'date', 'completed', 'total'))
+
+    def assert_matches_tasks(self):
+        incremental = self.rows()
+        rollup.rebuild()
+        self.assertEqual(incremental, self.rows())
+
+    def test_bulk_plan_write(self):
+        self.assertEqual(DailyCompletion.objects.count(), 5)
+        self.assert_matches_tasks()
+
+    def test_complete_and_delete(self):
+        task = self.habit.tasks.filter(date=self.start).first()
+        task.isCompleted = True
+        task.save()
+        self.assertEqual(
+            DailyCompletion.objects.get(habit=self.habit, date=self.start).completed, 1
+        )
+        self.habit.tasks.filter(date=self.start + timedelta(days=1)).first().delete()
+        self.assert_matches_tasks()
+
+    def test_last_task_of_day_removed(self):
+        for task in self.habit.tasks.filter(date=self.start):
+            task.delete()
+        self.assertFalse(DailyCompletion.objects.filter(habit=self.habit, date=self.start).exists())
+        self.assert_matches_tasks()
+
+    def test_task_moved_to_another_day(self):
+        task = self.habit.tasks.filter(date=self.start).first()
+        task.isCompleted = True
+        task.date = self.start + timedelta(days=10)
+        task.save()
+        self.assert_matches_tasks()
+
+    def test_fields_left_out_of_a_save_are_not_counted(self):
+        task = self.habit.tasks.filter(date=self.start).first()
+        task.isCompleted = True
+        task.date = self.start + timedelta(days=1)
+        task.save(update_fields=['isCompleted'])
+        self.assertEqual(DailyCompletion.objects.get(habit=self.habit, date=self.start).completed, 1)
+        self.assert_matches_tasks()
+
+    def test_unchanged_save_skips_the_rollup(self):
+        task = self.habit.tasks.first()
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertFalse([q for q in queries.captured_queries if DailyCompletion._meta.db_table in q['sql']])
+
+    def test_toggle_applies_deltas(self):
+        from profileandchat import leaderboard_service
+        from profileandchat.models import LeaderboardEntry
+        leaderboard_service.refresh_user(self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        today = self.habit.tasks.filter(date=self.start + timedelta(days=2)).first()
+        with CaptureQueriesContext(connection) as queries:
+            client.post(f'/api/task/{today.id}/update_task_status/', {'isCompleted': True}, format='json')
+        recounts = [q['sql'] for q in queries.captured_queries if 'COUNT(' in q['sql'] or 'SUM(' in q['sql']]
+        self.assertEqual(recounts, [])
+        self.assertTrue(Task.objects.get(pk=today.pk).isCompleted)
+
+        stored = list(LeaderboardEntry.objects.order_by('period').values_list(
+            'period', 'completed_tasks', 'total_tasks', 'completion_rate'
+        ))
+        leaderboard_service.refresh_user(self.user)
+        self.assertEqual(stored, list(LeaderboardEntry.objects.order_by('period').values_list(
+            'period', 'completed_tasks', 'total_tasks', 'completion_rate'
+        )))
+        self.assert_matches_tasks()
+
+
+class BatchTaskStatusTests(TestCase):
+    """POST /api/tasks/update_status/ applies many check-offs of the caller's own tasks."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='batch@example.com', full_name='Batch', password='pw')
+        self.start = date.today() - timedelta(days=1)
+        self.reading = Habit.objects.create(name='Reading', type='Good', user=self.user)
+        self.walking = Habit.objects.create(name='Walking', type='Good', user=self.user)
+        write_plan(self.reading, make_plan(2), start_date=self.start)
+        write_plan(self.walking, make_plan(2), start_date=self.start)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def task(self, habit, offset):
+        return habit.tasks.filter(date=self.start + timedelta(days=offset)).order_by('id').first()
+
+    def post(self, tasks):
+        return self.client.post('/api/tasks/update_status/', {'tasks': tasks}, format='json')
+
+    def test_returns_only_the_updated_days(self):
+        first, second = self.task(self.reading, 0), self.task(self.walking, 1)
+        response = self.post([{'task_id': first.id, 'isCompleted': True}, {'task_id': second.id, 'isCompleted': True}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(
+            [(day['habit_id'], day['date'], day['completed'], day['total']) for day in response.data['days']],
+            [(self.reading.id, self.start, 1, TASKS_PER_DAY), (self.walking.id, self.start + timedelta(days=1), 1, TASKS_PER_DAY)],
+        )
+        self.assertEqual((response.data['completed'], response.data['total']), (2, 2 * TASKS_PER_DAY))
+
+    def test_other_users_tasks_are_not_touched(self):
+        other = CustomUser.objects.create_user(email='batch-other@example.com', full_name='Other', password='pw')
+        foreign = Habit.objects.create(name='Cooking', type='Good', user=other)
+        write_plan(foreign, make_plan(1), start_date=self.start)
+        theirs, mine = foreign.tasks.first(), self.task(self.reading, 0)
+
+        response = self.post([{'task_id': theirs.id, 'isCompleted': True}, {'task_id': mine.id, 'isCompleted': True}])
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['not_found'], [theirs.id])
+        self.assertEqual([day['habit_id'] for day in response.data['days']], [self.reading.id])
+        self.assertFalse(Task.objects.get(pk=theirs.pk).isCompleted)
+        self.assertFalse(DailyCompletion.objects.filter(habit=foreign, completed__gt=0).exists())
+
+    def test_batch_size_and_payload_checked(self):
+        mine = self.task(self.reading, 0)
+        full = [{'task_id': mine.id, 'isCompleted': True}] + [
+            {'task_id': 10 ** 6 + offset, 'isCompleted': True} for offset in range(task_status.MAX_BATCH_SIZE - 1)
+        ]
+        response = self.post(full)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['not_found']), task_status.MAX_BATCH_SIZE - 1)
+
+        too_many = full + [{'task_id': mine.id, 'isCompleted': False}]
+        self.assertEqual(self.post(too_many).status_code, 400)
+        self.assertTrue(Task.objects.get(pk=mine.pk).isCompleted)
+        for tasks in ([], [{'task_id': mine.id}], [{'task_id': str(mine.id), 'isCompleted': False}], 'all'):
+            self.assertEqual(self.post(tasks).status_code, 400)
+
+    def test_one_ownership_query_and_one_update(self):
+        tasks = list(self.reading.tasks.all()) + list(self.walking.tasks.all())
+        with CaptureQueriesContext(connection) as queries:
+            self.post([{'task_id': task.id, 'isCompleted': True} for task in tasks])
+        task_table = Task._meta.db_table
+        # Besides the rollup's per-day recount
+        reads = [q for q in queries.captured_queries
+                 if q['sql'].startswith('SELECT') and f'FROM "{task_table}"' in q['sql'] and 'COUNT(' not in q['sql']]
+        updates = [q for q in queries.captured_queries if q['sql'].startswith(f'UPDATE "{task_table}"')]
+        self.assertEqual((len(reads), len(updates)), (1, 1))
+        self.assertFalse(Task.objects.filter(isCompleted=False).exists())
+
+
+class HabitStreakTests(TestCase):
+    """Incremental streak runs against a brute-force recount of the task table."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='streaks@example.com', full_name='Streaks', password='pw')
+        self.habit = Habit.objects.create(name='Reading', type='Good', user=self.user)
+        self.start = date.today() - timedelta(days=29)
+        write_plan(self.habit, make_plan(30), start_date=self.start)
+
+    def brute_force(self):
+        days = {}
+        for day, done in Task.objects.filter(habit_id=self.habit).values_list('date', 'isCompleted'):
+            days[day] = days.get(day, True) and done
+        return runs_from_days(sorted(day for day, full in days.items() if full))
+
+    def assert_matches(self):
+        expected = self.brute_force()
+        stored = sorted(HabitStreakRun.objects.filter(habit=self.habit).values_list('start', 'end', 'length'))
+        self.assertEqual(stored, [(start, end, (end - start).days + 1) for start, end in expected])
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.longest_streak, max([length for _, _, length in stored], default=0))
+        latest = expected[-1] if expected else (None, None)
+        self.assertEqual((self.habit.streak_start, self.habit.streak_end), latest)
+
+    def complete_days(self, *offsets, done=True):
+        updates = {
+            task_id: done for task_id in Task.objects.filter(
+                habit_id=self.habit, date__in=[self.start + timedelta(days=offset) for offset in offsets]
+            ).values_list('id', flat=True)
+        }
+        task_status.apply_updates(self.user, updates)
+
+    def test_merge_trim_and_split(self):
+        self.complete_days(0, 1, 2, 4, 5)
+        self.assert_matches()
+        self.complete_days(3)  # Joins both runs
+        self.assert_matches()
+        self.assertEqual(self.habit.longest_streak, 6)
+        self.complete_days(2, done=False)  # Splits it again
+        self.assert_matches()
+        self.complete_days(0, 5, done=False)  # Trims both ends
+        self.assert_matches()
+
+    def test_current_streak(self):
+        self.complete_days(27, 28)  # Up to yesterday; today still open
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.current_streak(), 2)
+        self.assertEqual(self.habit.current_streak(today=date.today() + timedelta(days=2)), 0)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        habit, = client.get('/api/get_habits/').json()
+        self.assertEqual((habit['current_streak'], habit['longest_streak']), (2, 2))
+
+    def test_random_changes_match_brute_force(self):
+        rng = random.Random(22)
+        for step in range(150):
+            action = rng.random()
+            day = self.start + timedelta(days=rng.randrange(-3, 33))
+            tasks = list(Task.objects.filter(habit_id=self.habit, date=day))
+            if action < 0.6 and tasks:
+                # Toggle one or all tasks of a day
+                chosen = tasks if rng.random() < 0.5 else [rng.choice(tasks)]
+                done = rng.random() < 0.7
+                if len(chosen) == 1:
+                    chosen[0].isCompleted = done
+                    chosen[0].save()
+                else:
+                    task_status.apply_updates(self.user, {task.id: done for task in chosen})
+            elif action < 0.8:
+                # Backfill a completed task (possibly onto a day that had none)
+                Task.objects.create(habit_id=self.habit, task='Backfilled', date=day, isCompleted=rng.random() < 0.8)
+            elif tasks:
+                rng.choice(tasks).delete()
+            self.assert_matches()
+
+    def test_rebuild_matches_incremental(self):
+        self.complete_days(*range(0, 30, 3), 1, 2, 10, 11)
+        incremental = sorted(HabitStreakRun.objects.filter(habit=self.habit).values_list('start', 'end'))
+        rollup.rebuild(self.user)
+        self.assertEqual(sorted(HabitStreakRun.objects.filter(habit=self.habit).values_list('start', 'end')), incremental)
+        self.assert_matches()
+
+
+WORDS = ('walk', 'read', 'write', 'drink', 'water', 'pages', 'minutes', 'journal', 'breathe', 'stretch',
+         'call', 'friend', 'cook', 'meal', 'sleep', 'early', 'phone', 'away', 'plan', 'tomorrow',
+         'meditate', 'quietly', 'track', 'cravings', 'reward', 'yourself', 'list', 'triggers', 'avoid', 'coffee')
+
+
+def plan_text(days, rng, planted=()):
+    """A model-style plan of random tasks; `planted` maps (day, slot) to an earlier (day, slot) to copy."""
+    tasks = {}
+    lines = []
+    for day in range(1, days + 1):
+        lines.append(f"Day {day}:")
+        for slot in range(TASKS_PER_DAY):
+            if (day, slot) in planted:
+                task = tasks[planted[day, slot]].replace(' ', '  ', 1) + '!'
+            else:
+                task = ' '.join(rng.choice(WORDS) for _ in range(6)).capitalize() + f' {day * 10 + slot}'
+            tasks[day, slot] = task
+            lines.append(f"{slot + 1}. {task}")
+    return '\n'.join(lines)
+
+
+def brute_force_duplicates(tasks, threshold):
+    sets = [shingles(task) for task in tasks]
+    return {
+        index for index in range(len(sets))
+        if any(jaccard(sets[index], sets[earlier]) >= threshold for earlier in range(index))
+    }
+
+
+class PlanParserTests(TestCase):
+    def test_keeps_unicode_and_drops_markdown(self):
+        tasks = extract_tasks("**Day 1:**\n1. **Walk** 10 நிமிடம் 🚶\n2. Café — lire 5 pages\n3. Drink water", 1)
+        self.assertEqual([task['task'] for task in tasks], ['Walk 10 நிமிடம்', 'Café — lire 5 pages', 'Drink water'])
+
+    def test_missing_and_duplicate_days(self):
+        text = plan_text(5, random.Random(1), planted={(5, 0): (2, 0), (5, 1): (2, 1), (5, 2): (2, 2), (4, 0): (1, 0)})
+        text = text.replace('Day 3:', 'Day 2:')  # Model repeats a day number and skips one
+        report = parse_plan(text, 6)
+        self.assertEqual(report.missing_days, [3, 6])
+        self.assertEqual(report.duplicate_days, [2, 5])  # Day 4 keeps two tasks of its own
+        self.assertEqual(
+            [(item['day'], item['index'], item['duplicate_of_day']) for item in report.near_duplicates],
+            [(4, 0, 1), (5, 0, 2), (5, 1, 2), (5, 2, 2)],
+        )
+
+        # Missing days keep their slots
+        tasks = extract_tasks(text, 6)
+        self.assertEqual(len(tasks), 6 * TASKS_PER_DAY)
+        self.assertEqual(tasks[3 * TASKS_PER_DAY]['task'], report.days[4][0])
+
+    def test_near_duplicates_versus_brute_force_on_365_days(self):
+        """Benchmark: sketch + LSH detection against exact all-pairs comparison."""
+        rng = random.Random(24)
+        planted = {}
+        for day in rng.sample(range(2, 366), 40):
+            planted[day, rng.randrange(TASKS_PER_DAY)] = (rng.randrange(1, day), rng.randrange(TASKS_PER_DAY))
+        text = plan_text(365, rng, planted)
+
+        started = time.perf_counter()
+        report = parse_plan(text, 365)
+        parse_ms = (time.perf_counter() - started) * 1000
+
+        tasks = [task for day in sorted(report.days) for task in report.days[day]]
+        started = time.perf_counter()
+        expected = brute_force_duplicates(tasks, NEAR_DUPLICATE_THRESHOLD)
+        brute_ms = (time.perf_counter() - started) * 1000
+        print(f"\n365 days, {len(tasks)} tasks: parse + LSH {parse_ms:.1f} ms, all-pairs {brute_ms:.1f} ms")
+
+        found = {(item['day'] - 1) * TASKS_PER_DAY + item['index'] for item in report.near_duplicates}
+        planted_positions = {(day - 1) * TASKS_PER_DAY + slot for day, slot in planted}
+        self.assertEqual(report.missing_days, [])
+        self.assertTrue(planted_positions <= found)
+        self.assertEqual(found, expected)
+
+
+class PlanRegenerationTests(TestCase):
+    """Only the selected days are rewritten, against the model's answer for them."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='regen@example.com', full_name='Regen', password='pw')
+        self.habit = Habit.objects.create(name='Reading', type='Good', user=self.user)
+        self.start = date.today() - timedelta(days=3)
+        write_plan(self.habit, extract_tasks(plan_text(10, random.Random(25)), 10), start_date=self.start)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def texts(self, day):
+        return list(self.habit.tasks.filter(date=self.start + timedelta(days=day - 1)).order_by('id')
+                    .values_list('task', flat=True))
+
+    def regenerate(self, answer, **data):
+        model = mock.Mock()
+        model.complete.return_value = answer
+        with mock.patch('analyze_responses.views.get_client', return_value=model):
+            response = self.client.post(f'/api/habits/{self.habit.id}/regenerate_days/', data, format='json')
+        return response, model.complete
+
+    def test_select_days(self):
+        self.assertEqual(regeneration.select_days({'days': [5, 2, 5]}, 10), [2, 5])
+        self.assertEqual(regeneration.select_days({'from_day': '3', 'to_day': 6}, 10), [3, 4, 5, 6])
+        self.assertEqual(regeneration.select_days({'from_day': 7}, 10), [7])
+        for data in ({'days': []}, {'days': [True]}, {'days': '3'}, {'days': [0, 2]}, {'from_day': 9, 'to_day': 11},
+                     {'to_day': 3}, {'from_day': 'x'}):
+            with self.assertRaises(regeneration.InvalidSelection):
+                regeneration.select_days(data, 10)
+        with self.assertRaises(regeneration.InvalidSelection):
+            regeneration.select_days({'from_day': 1, 'to_day': regeneration.MAX_DAYS + 1}, 100)
+
+    def test_context_days(self):
+        self.assertEqual(regeneration.context_days([4, 5], 10), [2, 3, 6, 7])
+        self.assertEqual(regeneration.context_days([1, 3], 4), [2, 4])
+        self.assertEqual(regeneration.context_days([2], 2), [1])
+
+    def test_selected_days_replaced_in_place(self):
+        kept = {day: self.texts(day) for day in (1, 2, 3, 6, 10)}
+        old_day_5 = list(self.habit.tasks.filter(date=self.start + timedelta(days=4)).order_by('id'))
+        self.habit.tasks.filter(date=self.start + timedelta(days=3)).update(isCompleted=True)
+        answer = (
+            "Day 4:\n1. Sketch a floor plan of your reading nook\n2. Borrow a novel from the library\n"
+            "3. Summarize a chapter in one sentence\nDay 5:\n1. Join an online book club thread\n"
+            "2. Write a short review of yesterday's chapter"
+        )
+        response, complete = self.regenerate(answer, from_day=4, to_day=5, note='Too easy')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['missing_days'], [])
+        self.assertEqual(response.data['repeated_days'], [])
+        self.assertEqual([task['task'] for task in response.data['days'][5]], [
+            'Join an online book club thread', "Write a short review of yesterday's chapter",
+        ])
+        self.assertEqual(self.texts(4)[0], 'Sketch a floor plan of your reading nook')
+        self.assertFalse(self.habit.tasks.filter(date=self.start + timedelta(days=3), isCompleted=True).exists())
+        # Day 5 got two tasks: its rows are reused in place and the third one removed
+        self.assertEqual(len(self.texts(5)), 2)
+        self.assertEqual([task['id'] for task in response.data['days'][5]], [task.id for task in old_day_5[:2]])
+        self.assertFalse(Task.objects.filter(pk=old_day_5[2].pk).exists())
+        self.assertEqual({day: self.texts(day) for day in kept}, kept)
+
+        messages, params = complete.call_args
+        prompt = messages[0][1]['content']
+        for day in (2, 3, 6, 7):
+            self.assertIn(f"Day {day}:\n1. {self.texts(day)[0]}", prompt)
+        self.assertNotIn("Day 1:", prompt)
+        self.assertIn('Too easy', prompt)
+        self.assertEqual(params['max_tokens'], regeneration.TOKENS_PER_DAY * 2 + 100)
+
+        incremental = sorted(DailyCompletion.objects.values_list('habit_id', 'date', 'completed', 'total'))
+        rollup.rebuild()
+        self.assertEqual(incremental, sorted(DailyCompletion.objects.values_list('habit_id', 'date', 'completed', 'total')))
+
+        from datasync.models import ChangeLog
+        self.assertTrue(ChangeLog.objects.filter(object_id=str(old_day_5[2].pk), op=ChangeLog.DELETE).exists())
+
+    def test_day_repeating_a_context_day_is_left_unchanged(self):
+        old_day_4 = self.texts(4)
+        answer = (
+            f"Day 4:\n1. Sketch a floor plan of your reading nook\n2. {self.texts(3)[1]}\n"
+            "3. Summarize a chapter in one sentence\nDay 5:\n1. Join an online book club thread\n"
+            "2. Write a short review of yesterday's chapter\n3. Read one poem out loud"
+        )
+        response, _ = self.regenerate(answer, days=[4, 5, 8])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['missing_days'], [8])
+        self.assertEqual(response.data['repeated_days'], [4])
+        self.assertEqual(list(response.data['days']), [5])
+        self.assertEqual(self.texts(4), old_day_4)
+        self.assertEqual(self.texts(5)[2], 'Read one poem out loud')
+
+    def test_other_users_habit_and_empty_answer(self):
+        other = CustomUser.objects.create_user(email='other-regen@example.com', full_name='Other', password='pw')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.regenerate('', days=[1])[0].status_code, 404)
+        self.client.force_authenticate(self.user)
+
+        before = self.texts(1)
+        response, _ = self.regenerate('Sorry, I cannot help with that.', days=[1])
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['missing_days'], [1])
+        self.assertEqual(self.texts(1), before)
+        self.assertEqual(self.regenerate('', days=[11])[0].status_code, 400)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+class ReminderDispatchTests(TestCase):
+    """Buckets and "today" follow the habit's own timezone; sends are checked through FileSender."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='remind@example.com', full_name='Remind', password='pw')
+        fd, self.outbox = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, self.outbox)
+        self.sender = reminders.FileSender(self.outbox)
+
+    def make_habit(self, zone, at, start):
+        habit = Habit(name='Reading', type='Good', user=self.user, notification_status=True,
+                      reminder_time=at, reminder_timezone=zone)
+        habit.save()
+        write_plan(habit, make_plan(3), start_date=start)
+        return habit
+
+    def sent(self):
+        with open(self.outbox, encoding='utf-8') as outbox:
+            return [json.loads(line) for line in outbox]
+
+    def test_bucket_is_utc_minute_of_local_time(self):
+        habit = self.make_habit('Asia/Colombo', datetime.min.time().replace(hour=9), date(2026, 1, 14))
+        self.assertEqual((habit.reminder_minute, habit.reminder_utc_offset), (3 * 60 + 30, 330))
+
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 15, 9, 0), self.sender), 0)
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 15, 3, 30), self.sender), 1)
+        self.assertEqual([(r['habit_id'], r['date']) for r in self.sent()], [(str(habit.pk), '2026-01-15')])
+
+    def test_local_date_across_utc_midnight(self):
+        # 21:00 in Bogota on the 15th is 02:00 UTC on the 16th, when the plan has no tasks
+        habit = self.make_habit('America/Bogota', datetime.min.time().replace(hour=21), date(2026, 1, 13))
+        self.assertEqual(habit.reminder_minute, 2 * 60)
+
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 16, 2, 0), self.sender), 1)
+        self.assertEqual(self.sent()[0]['date'], '2026-01-15')
+        habit.refresh_from_db()
+        self.assertEqual(habit.last_reminded_on, date(2026, 1, 15))
+
+    def test_sent_once_per_local_day(self):
+        self.make_habit('Asia/Colombo', datetime.min.time().replace(hour=9), date(2026, 1, 14))
+        moment = utc(2026, 1, 15, 3, 30)
+        self.assertEqual(reminders.dispatch_minute(moment, self.sender), 1)
+        self.assertEqual(reminders.dispatch_minute(moment, self.sender), 0)
+        self.assertEqual(reminders.dispatch_minute(moment + timedelta(days=1), self.sender), 1)
+        self.assertEqual([r['date'] for r in self.sent()], ['2026-01-15', '2026-01-16'])
+
+    def test_completed_day_skipped(self):
+        habit = self.make_habit('Asia/Colombo', datetime.min.time().replace(hour=9), date(2026, 1, 14))
+        for task in habit.tasks.filter(date=date(2026, 1, 15)):
+            task.isCompleted = True
+            task.save()
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 15, 3, 30), self.sender), 0)
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 16, 3, 30), self.sender), 1)
+
+    def test_batches(self):
+        for _ in range(5):
+            self.make_habit('UTC', datetime.min.time().replace(hour=7), date(2026, 1, 14))
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 1, 15, 7, 0), self.sender, batch_size=2), 5)
+        self.assertEqual(len({r['habit_id'] for r in self.sent()}), 5)
+
+    def test_rebucket_follows_dst(self):
+        habit = self.make_habit('America/Los_Angeles', datetime.min.time().replace(hour=20), date(2026, 7, 14))
+        Habit.objects.filter(pk=habit.pk).update(reminder_minute=4 * 60, reminder_utc_offset=-480)  # Saved in winter
+
+        self.assertEqual(reminders.rebucket(utc(2026, 7, 15, 12, 0)), 1)
+        self.assertEqual(reminders.rebucket(utc(2026, 7, 15, 12, 0)), 0)
+        habit.refresh_from_db()
+        self.assertEqual((habit.reminder_minute, habit.reminder_utc_offset), (3 * 60, -420))
+        self.assertEqual(reminders.dispatch_minute(utc(2026, 7, 16, 3, 0), self.sender), 1)
+
+    def test_settings_view_stores_timezone(self):
+        habit = self.make_habit('UTC', None, date(2026, 1, 14))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = '/api/update_reminder_settings/'
+        body = {'habit_id': str(habit.pk), 'wants_reminder': True, 'reminder_time': '09:00'}
+
+        response = client.post(url, {**body, 'timezone': 'Mars/Olympus'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {**body, 'timezone': 'Asia/Colombo'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        habit.refresh_from_db()
+        self.assertEqual((habit.reminder_timezone, habit.reminder_minute), ('Asia/Colombo', 3 * 60 + 30))
@@ -1,18 +1,20 @@
 from django.urls import path
-from .views import analyze_responses
+from .views import analyze_responses, analyze_responses_stream
 from .views import save_tasks
-from .views import HabitsWithTodayTasks,update_task_status
+from .views import HabitsWithTodayTasks,update_task_status,update_task_statuses
 from .views import task_completion_stats,  get_habits  # Add get_habits
 from .views import get_coin_balance,add_coins,deduct_coins,get_profile_stats
-from .views import delete_habit,update_reminder_settings
+from .views import delete_habit,update_reminder_settings,regenerate_plan_days
 
 
 
 urlpatterns = [
     path('analyze_responses/', analyze_responses, name='analyze_responses'),
+    path('analyze_responses/stream/', analyze_responses_stream, name='analyze_responses_stream'),
     path('save_tasks/', save_tasks, name='save_tasks'),
     path('habits-today/', HabitsWithTodayTasks.as_view(), name='habits_today'),
     path('task/<int:task_id>/update_task_status/', update_task_status, name='update_task_status'),
+    path('tasks/update_status/', update_task_statuses, name='update_task_statuses'),
     path('task_completion_stats/',task_completion_stats, name='habits_today'),
     #path('register/', RegisterView.as_view(), name='register'),
     #path('login/', LoginView.as_view(), name='login'),
@@ -22,5 +24,6 @@ urlpatterns = [
     path('coins/deduct/', deduct_coins, name='deduct_coins'),
     path('stats/', get_profile_stats, name='profile-stats'),
     path('habits/delete/<uuid:habit_id>/', delete_habit, name='delete_habit'),
+    path('habits/<uuid:habit_id>/regenerate_days/', regenerate_plan_days, name='regenerate_plan_days'),
     path('update_reminder_settings/', update_reminder_settings, name='update_reminder_settings'),
 ]
\ No newline at end of file
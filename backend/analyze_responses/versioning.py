@@ -0,0 +1,36 @@
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from .models import UserDataVersion
+
+
+def bump(user_id):
+    """Invalidate every cached view of the user's habit data."""
+    if user_id is None:
+        return
+    updated = UserDataVersion.objects.filter(user_id=user_id).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        try:
+            UserDataVersion.objects.create(user_id=user_id, version=1)
+        except IntegrityError:
+            bump(user_id)  # Created concurrently
+
+
+def current(user_id):
+    return UserDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+
+def etag(user_id, day=None):
+    """Strong ETag for "today" views: changes with the data version and with the date."""
+    day = day or timezone.now().date()
+    return f'"{current(user_id)}-{day.isoformat()}"'
+
+
+def matches(if_none_match, etag):
+    """Whether an If-None-Match header value covers etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
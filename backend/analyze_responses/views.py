@@ -1,17 +1,23 @@
 import json
-import requests
-from decouple import config  # Add this import
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Prefetch
 from django.views.decorators.csrf import csrf_exempt
-from .models import Task,Habit
+from .models import Task,Habit,DailyCompletion
 import uuid
-from datetime import time, timedelta, date,datetime
+from datetime import time, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework.views import APIView
-from .serializers import HabitSerializer
+from .serializers import HabitSerializer, TaskSerializer
+from .stats import completion_buckets, completion_totals
+from .plans import write_plan
+from . import regeneration, task_status, versioning
+from .plan_parser import parse_plan, plan_tasks, report_days, IncrementalPlanParser
 from rest_framework.response import Response
 from rest_framework.decorators import api_view,permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rewards.models import  Reward  # Add Reward to imports
+from deepapi.llm_client import get_client, LLMError
 
 
 ##from rest_framework import status
@@ -23,6 +29,79 @@ from rewards.models import  Reward  # Add Reward to imports
 ###########################################################################################################
                                     ## analyze response ##
 
+def build_plan_prompt(responses, regenerate=False):
+    """Chat messages asking for the task plan, and the number of days requested."""
+    # Required inputs
+    habit_name = responses.get("habit_name", "bad habit")
+    duration_str = responses.get("duration", "1")
+
+    try:
+        days_to_quit = int(duration_str)
+    except (ValueError, TypeError):
+        days_to_quit = 1
+    print(days_to_quit)
+
+    # Optional but useful
+    obstacle = responses.get("obstacle") or responses.get("challenge", "Not specified")
+    motivations = responses.get("motivation") or responses.get("reason", "Not specified")
+    quantity_per_day = responses.get("quantity_per_day", 3)
+
+    # NEW: dynamic Q&A list
+    dynamic_answers = responses.get("dynamic_answers", [])
+    print("\n==== DYNAMIC ANSWERS ====")  # For clarity in terminal
+    print(json.dumps(dynamic_answers, indent=2))  # Pretty-print JSON
+
+    # SYSTEM PROMPT
+    system_prompt = (
+         "You are an AI habit transformation coach helping users either quit bad habits or build good ones. "
+        "The user has entered a habit: {habit_name}. Generate a personalized task plan over {days} days.\n"
+        "Each day should have exactly 3 short, actionable tasks.\n"
+        "IMPORTANT RULES FOR TASK GENERATION:\n"
+        "1. All tasks must be unique - no repeating or similar tasks across days\n"
+        "2. Tasks should show logical progression (gradually harder/easier depending on habit type)\n"
+        "3. Each task should be distinct and address different aspects of the habit\n"
+        "\n"
+        "Tasks must:\n"
+        "- Gradually reduce the bad habit if it's harmful (e.g., reduce smoking from X/day to 0).\n"
+        "- Gradually increase effort for good habits (e.g., increase reading from 2 pages to 20).\n"
+        "- Incorporate tasks supporting user's motivation (e.g., if motivation is health, include light workouts).\n"
+        "- Tasks should be relevant to the user's trigger situations.\n"
+        "- Never include 'repeat previous task' or similar instructions\n"
+        "\n"
+        "Return the output in this format:\n"
+        "Day 1:\n1. Unique task one\n2. Unique task two\n3. Unique task three\nDay 2:\n... up to Day {days}"
+    ).format(habit_name=habit_name, days=days_to_quit)
+
+    # USER PROMPT
+    user_prompt = (
+        f"Habit: {habit_name}\n"
+        f"Days committed: {days_to_quit}\n"
+        f"Trigger situations: {obstacle}\n"
+        f"Motivations: {motivations}\n"
+    )
+    
+    
+    if regenerate:
+        user_prompt += "\nNote: The user was not satisfied with the previous plan. Please regenerate a new and different task plan.\n"
+
+    if quantity_per_day:
+        user_prompt += f"Current quantity per day: {quantity_per_day}\n"
+
+    if dynamic_answers:
+        user_prompt += "\nAdditional user responses:\n"
+        for pair in dynamic_answers:
+            q = pair.get("question", "").strip()
+            a = pair.get("answer", "").strip()
+            if q and a:
+                user_prompt += f"- {q}: {a}\n"
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return messages, days_to_quit
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def analyze_responses(request):
@@ -41,111 +120,94 @@ def analyze_responses(request):
         if not responses:
             return JsonResponse({"error": "No responses provided"}, status=400)
 
-        # Required inputs
-        habit_name = responses.get("habit_name", "bad habit")
-        duration_str = responses.get("duration", "1")
-
-        try:
-            days_to_quit = int(duration_str)
-        except (ValueError, TypeError):
-            days_to_quit = 1
-        print(days_to_quit)
-
-        # Optional but useful
-        obstacle = responses.get("obstacle") or responses.get("challenge", "Not specified")
-        motivations = responses.get("motivation") or responses.get("reason", "Not specified")
-        quantity_per_day = responses.get("quantity_per_day", 3)
-
-        # NEW: dynamic Q&A list
-        dynamic_answers = responses.get("dynamic_answers", [])
-        print("\n==== DYNAMIC ANSWERS ====")  # For clarity in terminal
-        print(json.dumps(dynamic_answers, indent=2))  # Pretty-print JSON
-
-        # SYSTEM PROMPT
-        system_prompt = (
-             "You are an AI habit transformation coach helping users either quit bad habits or build good ones. "
-            "The user has entered a habit: {habit_name}. Generate a personalized task plan over {days} days.\n"
-            "Each day should have exactly 3 short, actionable tasks.\n"
-            "IMPORTANT RULES FOR TASK GENERATION:\n"
-            "1. All tasks must be unique - no repeating or similar tasks across days\n"
-            "2. Tasks should show logical progression (gradually harder/easier depending on habit type)\n"
-            "3. Each task should be distinct and address different aspects of the habit\n"
-            "\n"
-            "Tasks must:\n"
-            "- Gradually reduce the bad habit if it's harmful (e.g., reduce smoking from X/day to 0).\n"
-            "- Gradually increase effort for good habits (e.g., increase reading from 2 pages to 20).\n"
-            "- Incorporate tasks supporting user's motivation (e.g., if motivation is health, include light workouts).\n"
-            "- Tasks should be relevant to the user's trigger situations.\n"
-            "- Never include 'repeat previous task' or similar instructions\n"
-            "\n"
-            "Return the output in this format:\n"
-            "Day 1:\n1. Unique task one\n2. Unique task two\n3. Unique task three\nDay 2:\n... up to Day {days}"
-        ).format(habit_name=habit_name, days=days_to_quit)
-
-        # USER PROMPT
-        user_prompt = (
-            f"Habit: {habit_name}\n"
-            f"Days committed: {days_to_quit}\n"
-            f"Trigger situations: {obstacle}\n"
-            f"Motivations: {motivations}\n"
-        )
-        
-        
-        if regenerate:
-         user_prompt += "\nNote: The user was not satisfied with the previous plan. Please regenerate a new and different task plan.\n"
-
-        if quantity_per_day:
-            user_prompt += f"Current quantity per day: {quantity_per_day}\n"
-
-        if dynamic_answers:
-            user_prompt += "\nAdditional user responses:\n"
-            for pair in dynamic_answers:
-                q = pair.get("question", "").strip()
-                a = pair.get("answer", "").strip()
-                if q and a:
-                    user_prompt += f"- {q}: {a}\n"
-
+        messages, days_to_quit = build_plan_prompt(responses, regenerate)
+
+        # Call OpenRouter through the shared pooled client
+        ai_text = get_client().complete(messages, temperature=0.5)
+        report = parse_plan(ai_text, days_to_quit)
+        tasks = plan_tasks(report, days_to_quit)
+
+        return JsonResponse({
+            "responses": responses,
+            "tasks": tasks,
+            "total_days": days_to_quit,
+            "total_tasks": len(tasks),
+            "tasks_per_day": 3,
+            # Days worth regenerating: padded, repeated, or near copies of other days
+            "missing_days": report.missing_days,
+            "duplicate_days": report.duplicate_days,
+            "near_duplicates": report.near_duplicates,
+        })
 
-        
+    except LLMError as e:
+        return JsonResponse({"error": str(e)}, status=e.status_code)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({"error": str(e)}, status=500)
 
-        # AI Payload
-        payload = {
-            "model":"deepseek/deepseek-chat-v3-0324:free",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "temperature": 0.5
-        }
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-        headers = {
-            "Authorization": f"Bearer {config('OPENROUTER_API_KEY')}",
-            "Content-Type": "application/json"
-        }
 
-        # Call OpenRouter
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
-        response_data = response.json()
-        print(response_data)
+def stream_plan_events(messages, days_to_quit):
+    """Server-sent events: one "day" event per parsed day, then "done" with the full plan."""
+    parser = IncrementalPlanParser()
+    days = {}  # Day number -> tasks, first block of each number
+    repeated = set()
 
-        if "choices" in response_data:
-            ai_text = response_data["choices"][0]["message"]["content"].strip()
-            tasks = extract_tasks(ai_text, days_to_quit)
+    def collect(day):
+        if day["label"] in days:
+            repeated.add(day["label"])
+        else:
+            days[day["label"]] = day["tasks"][:3]
 
-            return JsonResponse({
-                "responses": responses,
-                "tasks": tasks,
-                "total_days": days_to_quit,
-                "total_tasks": len(tasks),
-                "tasks_per_day": 3
-            })
+    try:
+        for fragment in get_client().stream(messages, temperature=0.5):
+            for day in parser.feed(fragment):
+                collect(day)
+                yield _sse("day", day)
+        for day in parser.finish():
+            collect(day)
+            yield _sse("day", day)
+    except LLMError as e:
+        yield _sse("error", {"error": str(e), "status": e.status_code})
+        return
+
+    report = report_days(days, days_to_quit, repeated=repeated)
+    tasks = plan_tasks(report, days_to_quit)
+    yield _sse("done", {
+        "tasks": tasks,
+        "total_days": days_to_quit,
+        "total_tasks": len(tasks),
+        "tasks_per_day": 3,
+        "missing_days": report.missing_days,
+        "duplicate_days": report.duplicate_days,
+        "near_duplicates": report.near_duplicates,
+    })
 
-        return JsonResponse({"error": "Failed to get response from OpenRouter"}, status=500)
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def analyze_responses_stream(request):
+    """Streaming variant of analyze_responses: each day's tasks are pushed as soon as they are parsed."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    responses = data.get("responses", {})
+    if not responses:
+        return JsonResponse({"error": "No responses provided"}, status=400)
+
+    messages, days_to_quit = build_plan_prompt(responses, data.get("regenerate", False))
+    response = StreamingHttpResponse(
+        stream_plan_events(messages, days_to_quit),
+        content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Keep nginx from buffering the stream
+    return response
 
 ###########################################################################################################
                                     ## extract tasks ##
@@ -153,34 +215,7 @@ def analyze_responses(request):
                                     ######################
                                     #changed code#########
 
-def extract_tasks(text, expected_days):
-    import re
-
-    def clean_text(text):
-        text = re.sub(r"[*_~`]+", "", text)
-        text = re.sub(r"[^a-zA-Z0-9\s,.'\-]", "", text)
-        text = re.sub(r"\s+", " ", text)
-        return text.strip()
-
-    task_list = []
-    day_pattern = re.compile(r"Day\s*(\d+):(.+?)(?=\nDay\s*\d+:|\Z)", re.DOTALL)
-    task_pattern = re.compile(r"\d+\.\s*(.*?)(?=\n\d+\.|\Z)", re.DOTALL)
-
-    for day, content in day_pattern.findall(text):
-        tasks = task_pattern.findall(content)
-        for task in tasks:
-            clean_task = task.strip()
-            clean_task = re.sub(r"\*\*Day\s*\d+\:\*\*", "", clean_task)
-            clean_task = clean_task.strip()
-            clean_task = clean_text(clean_task)
-            if clean_task and "repeat last task" not in clean_task.lower():
-                task_list.append({"task": clean_task, "isCompleted": False})
-
-    last_task = task_list[-1] if task_list else {"task": "Generic fallback task", "isCompleted": False}
-    while len(task_list) < expected_days * 3:
-        task_list.append(last_task)
-
-    return task_list[:expected_days * 3]
+# extract_tasks now lives in plan_parser.py
 
 ###########################################################################################################
                                     ## save tasks ##
@@ -202,42 +237,26 @@ def save_tasks(request):
             print(f"Parsed tasks count: {len(tasks)}")
             print(f"Raw duration value: {duration_days}")
 
-            # Create a new habit with a UUID
-            habit = Habit.objects.create(
-                id=uuid.uuid4(),
-                name=habit_name,
-                type=habit_type,
-                user=request.user,  # ✅ this links the habit to the logged-in user
-                duration_days=duration_days,
-                start_date=date.today(),
-            )
-
-
-            ###*************************###
-            tasks_per_day = 3
-            total_days = len(tasks) // tasks_per_day
-            today = date.today()
-            print(f"Total days calculated: {total_days}")
-
-
-            for day in range(total_days):
-                task_date = today + timedelta(days=day)
-                print(f"Creating tasks for day {day + 1}, date {task_date}")
+            with transaction.atomic():
+                # Create a new habit with a UUID
+                habit = Habit.objects.create(
+                    id=uuid.uuid4(),
+                    name=habit_name,
+                    type=habit_type,
+                    user=request.user,  # ✅ this links the habit to the logged-in user
+                    duration_days=duration_days,
+                    start_date=date.today(),
+                )
 
-                for i in range(tasks_per_day):
-                    task_index = day * tasks_per_day + i
-                    if task_index < len(tasks):
-                        Task.objects.create(
-                            habit_id=habit,
-                            task=tasks[task_index]['task'],
-                            isCompleted=tasks[task_index].get('isCompleted', False),
-                            date=task_date
-                        )
+                # Whole plan goes in as a few bulk INSERTs
+                task_ids = write_plan(habit, tasks, start_date=habit.start_date)
+            print(f"Created {len(task_ids)} tasks")
 
 
             return JsonResponse({'status': 'success',
                                   'habit_id': str(habit.id),
-                                  'duration_days': duration_days
+                                  'duration_days': duration_days,
+                                  'task_ids': task_ids
                                   }, status=201)
         except Exception as e:
             import traceback
@@ -257,17 +276,26 @@ def update_reminder_settings(request):
             habit_id = data.get('habit_id')
             wants_reminder = data.get('wants_reminder', False)
             reminder_time = data.get('reminder_time')
+            reminder_timezone = data.get('timezone')
+            if reminder_timezone is not None:
+                try:
+                    ZoneInfo(reminder_timezone)
+                except (ZoneInfoNotFoundError, ValueError, TypeError):
+                    return JsonResponse({'error': 'Unknown timezone'}, status=400)
             
             try:
                 habit = Habit.objects.get(id=habit_id, user=request.user)
                 
                 habit.notification_status = wants_reminder
+                if reminder_timezone is not None:
+                    habit.reminder_timezone = reminder_timezone
                 if wants_reminder and reminder_time:
                     # Convert "HH:MM" string to time object
                     hour, minute = map(int, reminder_time.split(':'))
                     habit.reminder_time = time(hour=hour, minute=minute)
                 else:
                     habit.reminder_time = None
+                habit.last_reminded_on = None  # A new time may still be due today
                 
                 habit.save()
                 
@@ -284,20 +312,43 @@ def update_reminder_settings(request):
 class HabitsWithTodayTasks(APIView):
     @permission_classes([IsAuthenticated])
     def get(self, request):
-        habits = Habit.objects.filter(user=request.user)  # Filter by current user
+        today = date.today()
+
+        # Unchanged since the client's copy: answer from the version counter alone
+        etag = versioning.etag(request.user.id, today)
+        if versioning.matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        # Filter by current user; today's tasks of all habits in one extra query
+        habits = Habit.objects.filter(user=request.user).prefetch_related(
+            Prefetch('tasks', queryset=Task.objects.filter(date=today), to_attr='today_tasks')
+        )
         serializer = HabitSerializer(habits, many=True)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': etag})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_task_status(request, task_id):
     try:
-        task = Task.objects.get(id=task_id)
+        task = Task.objects.select_related('habit_id').get(id=task_id, habit_id__user=request.user)
         task.isCompleted = request.data.get('isCompleted', task.isCompleted)
-        task.save()
+        task.save(update_fields=['isCompleted'])
         return Response({'success': True})
     except Task.DoesNotExist:
         return Response({'error': 'Task not found'}, status=404)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def update_task_statuses(request):
+    """
+    Body: {"tasks": [{"task_id": 1, "isCompleted": true}, ...]}
+    Applies every pair in one UPDATE and returns the completion counts of the touched days.
+    """
+    try:
+        updates = task_status.parse_updates(request.data.get('tasks'))
+    except task_status.InvalidBatch as e:
+        return Response({'error': str(e)}, status=400)
+    return Response(task_status.apply_updates(request.user, updates))
     
 
 ################ to show reports #################################################
@@ -305,14 +356,23 @@ def update_task_status(request, task_id):
 ##from django.db.models import Count, Q
 
 
-from django.utils import timezone
-
 # Add this new endpoint to get habits
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_habits(request):
-    habits = Habit.objects.filter(user=request.user).values('id', 'name', 'type')
-    return Response(list(habits))
+    habits = Habit.objects.filter(user=request.user).only(
+        'id', 'name', 'type', 'streak_start', 'streak_end', 'longest_streak'
+    )
+    return Response([
+        {
+            'id': habit.id,
+            'name': habit.name,
+            'type': habit.type,
+            'current_streak': habit.current_streak(),
+            'longest_streak': habit.longest_streak,
+        }
+        for habit in habits
+    ])
 
 # Update the stats endpoint to support habit filtering
 @api_view(['GET'])
@@ -322,68 +382,17 @@ def task_completion_stats(request):
     habit_type = request.GET.get('habit_type')
     habit_id = request.GET.get('habit_id')
     
-    now = timezone.now()
-    stats = []
-    labels = []
-    task_counts = []
-
-    # Create base queryset
-    tasks = Task.objects.filter(habit_id__user=request.user)
+    # Create base queryset (daily rollup rows, not tasks)
+    days = DailyCompletion.objects.filter(user=request.user)
     
     # Apply habit filters
     if habit_type:
-        tasks = tasks.filter(habit_id__type=habit_type)
+        days = days.filter(habit__type=habit_type)
     if habit_id:
-        tasks = tasks.filter(habit_id__id=habit_id)
-
-    if time_range == 'daily':
-        for i in range(7):
-            date = now - timedelta(days=6 - i)
-            date_tasks = tasks.filter(date=date.date())
-            completed = date_tasks.filter(isCompleted=True).count()
-            total = date_tasks.count()
-
-            stats.append((completed / total) * 100 if total > 0 else 0)
-            task_counts.append(completed)
-            labels.append(date.strftime('%a'))
-
-    elif time_range == 'monthly':
-        for i in range(12):
-            month = now.month - i
-            year = now.year
-            if month < 1:
-                month += 12
-                year -= 1
-
-            month_tasks = tasks.filter(date__year=year, date__month=month)
-            completed = month_tasks.filter(isCompleted=True).count()
-            total = month_tasks.count()
-
-            stats.append((completed / total) * 100 if total > 0 else 0)
-            task_counts.append(completed)
-            labels.append(datetime(year, month, 1).strftime('%b'))
-
-        # Reverse because months were counted backwards
-        stats.reverse()
-        task_counts.reverse()
-        labels.reverse()
-
-    elif time_range == 'yearly':
-        for i in range(5):
-            year = now.year - 4 + i
-            year_tasks = tasks.filter(date__year=year)
-            completed = year_tasks.filter(isCompleted=True).count()
-            total = year_tasks.count()
-
-            stats.append((completed / total) * 100 if total > 0 else 0)
-            task_counts.append(completed)
-            labels.append(str(year))
+        days = days.filter(habit_id=habit_id)
 
-    return Response({
-        'stats': stats,
-        'labels': labels,
-        'taskCounts': task_counts
-    })
+    # All buckets of the range come back from one grouped query
+    return Response(completion_buckets(days, time_range))
 
 #################################################################################
 ###########################################################################################
@@ -447,7 +456,6 @@ def get_coin_balance(request):
 def get_profile_stats(request):
     from profileandchat.models import UserProfile
     from django.utils import timezone
-    from django.db.models import Count, Q
     
     try:
         # Get user profile
@@ -456,12 +464,11 @@ def get_profile_stats(request):
         
         # Calculate completion rate
         today = timezone.now().date()
-        tasks = Task.objects.filter(
-            habit_id__user=request.user,
+        days = DailyCompletion.objects.filter(
+            user=request.user,
             date__lte=today
         )
-        total_tasks = tasks.count()
-        completed_tasks = tasks.filter(isCompleted=True).count()
+        completed_tasks, total_tasks = completion_totals(days)
         
         completion_rate = 0
         if total_tasks > 0:
@@ -477,6 +484,48 @@ def get_profile_stats(request):
     except UserProfile.DoesNotExist:
         return Response({'error': 'Profile not found'}, status=404)
     
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def regenerate_plan_days(request, habit_id):
+    """
+    Body: {"days": [3, 5]} or {"from_day": 3, "to_day": 7}, optional "note".
+    Only those days are regenerated (with the days around them as context) and saved in place.
+    Days the model left out (missing_days) or wrote with a task near-duplicating another one
+    (repeated_days) keep their tasks.
+    """
+    try:
+        habit = Habit.objects.get(id=habit_id, user=request.user)
+    except Habit.DoesNotExist:
+        return Response({'error': 'Habit not found'}, status=404)
+
+    _, total_days = regeneration.plan_span(habit)
+    if not total_days:
+        return Response({'error': 'Habit has no saved plan'}, status=400)
+    try:
+        days = regeneration.select_days(request.data, total_days)
+    except regeneration.InvalidSelection as e:
+        return Response({'error': str(e)}, status=400)
+
+    try:
+        new_days, missing, repeated = regeneration.regenerate(
+            habit, days, get_client().complete, note=request.data.get('note')
+        )
+    except LLMError as e:
+        return Response({'error': str(e)}, status=e.status_code)
+    if not new_days:
+        return Response({
+            'error': 'The AI response contained none of the requested days without repeating other days',
+            'missing_days': missing,
+            'repeated_days': repeated,
+        }, status=502)
+
+    return Response({
+        'habit_id': habit.id,
+        'days': {day: TaskSerializer(tasks, many=True).data for day, tasks in new_days.items()},
+        'missing_days': missing,
+        'repeated_days': repeated,
+    })
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_habit(request, habit_id):
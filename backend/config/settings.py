@@ -2,8 +2,11 @@
 Django settings for config project.
 """
 
+import os
+import tempfile
 from pathlib import Path
-from decouple import config
+from datetime import timedelta
+from decouple import Csv, config
 
 # Build paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,6 +38,7 @@ INSTALLED_APPS = [
     'deepapi',
     'analyze_responses',
     'profileandchat',
+    'datasync',
     'channels',
     'cloudinary',
     'cloudinary_storage',
@@ -170,9 +174,6 @@ CACHES = {
     }
 }
 
-    
-import os
-
 #MEDIA_URL = '/media/'
 #MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -196,12 +197,77 @@ LOGGING = {
     },
 }
 
+# Shared by every ASGI worker on the host so chat messages reach sockets in other processes
+# (profileandchat/channel_layer.py)
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+        "BACKEND": "profileandchat.channel_layer.SQLiteChannelLayer",
+        "CONFIG": {
+            "path": config('CHANNEL_LAYER_PATH', default=os.path.join(tempfile.gettempdir(), 'habitro-channels.sqlite3')),
+            "capacity": config('CHANNEL_LAYER_CAPACITY', default=100, cast=int),
+            "expiry": config('CHANNEL_LAYER_EXPIRY', default=60, cast=int),
+            "group_expiry": config('CHANNEL_LAYER_GROUP_EXPIRY', default=86400, cast=int),
+        },
     }
 }
 
+# Chat message writes: with a window > 0, messages arriving within that many seconds
+# of each other are committed together (profileandchat/message_pipeline.py)
+CHAT_GROUP_COMMIT_WINDOW = config('CHAT_GROUP_COMMIT_WINDOW', default=0.0, cast=float)
+CHAT_GROUP_COMMIT_MAX_BATCH = config('CHAT_GROUP_COMMIT_MAX_BATCH', default=100, cast=int)
+
+# Read reports for one conversation within this many seconds become one write and one receipt
+# (profileandchat/read_receipts.py)
+CHAT_READ_RECEIPT_WINDOW = config('CHAT_READ_RECEIPT_WINDOW', default=0.5, cast=float)
+
+# Master key wrapping the per-conversation chat keys (profileandchat/chat_crypto.py). To rotate it,
+# add the current one to CHAT_PREVIOUS_MASTER_KEYS as "<version>=<key>" (comma separated), set a new
+# key and a higher version, and run `manage.py rewrap_chat_keys`. Keys wrapped before versioning are
+# version 1; if CHAT_MASTER_KEY was unset then, version 1 is "chat-master-key:<SECRET_KEY>".
+CHAT_MASTER_KEY = config('CHAT_MASTER_KEY')
+CHAT_MASTER_KEY_VERSION = config('CHAT_MASTER_KEY_VERSION', default=1, cast=int)
+CHAT_PREVIOUS_MASTER_KEYS = config('CHAT_PREVIOUS_MASTER_KEYS', default='', cast=Csv())
+
+# Habit reminders (analyze_responses/reminders.py, sent by `manage.py dispatch_reminders`)
+REMINDER_SENDER = config('REMINDER_SENDER', default='analyze_responses.reminders.LogSender')
+REMINDER_OUTBOX_PATH = config('REMINDER_OUTBOX_PATH', default=os.path.join(tempfile.gettempdir(), 'habitro-reminders.jsonl'))
+REMINDER_BATCH_SIZE = config('REMINDER_BATCH_SIZE', default=500, cast=int)
+REMINDER_CATCH_UP_MINUTES = config('REMINDER_CATCH_UP_MINUTES', default=5, cast=int)
+
+# Delta sync: change-log entries returned per /api/sync/ call (datasync/changelog.py)
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=1000, cast=int)
+SYNC_LOG_RETENTION = timedelta(days=config('SYNC_LOG_RETENTION_DAYS', default=30, cast=int))  # Older tokens get a full reset
+
+# OpenRouter client shared by the AI features (deepapi/llm_client.py)
+OPENROUTER_API_KEY = config('OPENROUTER_API_KEY', default='')
+LLM_MODEL = config('LLM_MODEL', default='deepseek/deepseek-chat-v3-0324:free')
+LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=5, cast=float)
+LLM_READ_TIMEOUT = config('LLM_READ_TIMEOUT', default=90, cast=float)
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', default=4, cast=int)  # Across every process sharing the database
+LLM_QUEUE_TIMEOUT = config('LLM_QUEUE_TIMEOUT', default=2, cast=float)  # Seconds to wait for a free slot
+# Separate slots for refill jobs, which can afford to wait (and never take the interactive ones)
+LLM_BACKGROUND_CONCURRENCY = config('LLM_BACKGROUND_CONCURRENCY', default=2, cast=int)
+LLM_BACKGROUND_QUEUE_TIMEOUT = config('LLM_BACKGROUND_QUEUE_TIMEOUT', default=60, cast=float)
+LLM_POOL_SIZE = config('LLM_POOL_SIZE', default=10, cast=int)
+
+# Habit classification cache (deepapi/classification_cache.py)
+HABIT_CLASSIFICATION_TTL = timedelta(days=config('HABIT_CLASSIFICATION_TTL_DAYS', default=30, cast=int))
+HABIT_CLASSIFICATION_LRU_SIZE = config('HABIT_CLASSIFICATION_LRU_SIZE', default=2048, cast=int)
+
+# Onboarding question bank (deepapi/question_bank.py)
+QUESTION_BANK_SIZE = config('QUESTION_BANK_SIZE', default=3, cast=int)  # Fresh sets kept per habit
+QUESTION_BANK_MAX_SERVES = config('QUESTION_BANK_MAX_SERVES', default=25, cast=int)  # Serves before a set is rotated out
+BACKGROUND_WORKERS = config('BACKGROUND_WORKERS', default=2, cast=int)  # Threads for in-process refills
+BACKGROUND_JOB_TIMEOUT = config('BACKGROUND_JOB_TIMEOUT', default=600, cast=int)  # Seconds before another worker may take over a refill
+
+# Quiz bank refills (quiz/jobs.py, processed by `manage.py quiz_worker`)
+QUIZ_STOCK_LOW_WATER = config('QUIZ_STOCK_LOW_WATER', default=30, cast=int)  # Unseen questions left before a refill is queued
+QUIZ_STOCK_HIGH_WATER = config('QUIZ_STOCK_HIGH_WATER', default=100, cast=int)  # Unseen questions a refill tops up to
+QUIZ_JOB_MAX_BATCHES = config('QUIZ_JOB_MAX_BATCHES', default=15, cast=int)  # 10 questions per batch
+QUIZ_JOB_TIMEOUT = config('QUIZ_JOB_TIMEOUT', default=1800, cast=int)  # Seconds before a running job is considered dead
+QUIZ_RETRY_BASE_DELAY = config('QUIZ_RETRY_BASE_DELAY', default=30, cast=int)  # Seconds before retrying after a refill that failed or fell short, doubled per consecutive miss
+QUIZ_RETRY_MAX_DELAY = config('QUIZ_RETRY_MAX_DELAY', default=3600, cast=int)  # Cap on that wait
+
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 CLOUDINARY_STORAGE = {
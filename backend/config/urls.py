@@ -18,6 +18,7 @@ urlpatterns = [
     
     path('quiz/', include('quiz.urls')),
     path('api/', include('rewards.urls')),
+    path('api/', include('datasync.urls')),
     path('game/', include('game.urls')),
     path('achievements/', include('achievements.urls')),
     path('article/', include('articles.urls')),
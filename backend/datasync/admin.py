@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import ChangeLog
+
+
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'seq', 'model', 'object_id', 'op', 'created_at')
+    list_filter = ('model', 'op')
+
+admin.site.register(ChangeLog, ChangeLogAdmin)
@@ -0,0 +1,153 @@
+"""
+Delta sync: writes to habits, tasks, rewards and achievements append
+ChangeLog rows (see signals.py); clients send the last token they saw and
+get back only the rows changed since, plus tombstones for deletes.
+
+Entries older than SYNC_LOG_RETENTION are pruned as a user's log grows. A
+token from before the pruned range (or one this server never handed out)
+gets a full snapshot with reset=true instead of a delta.
+"""
+from collections import namedtuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from achievements.models import UserAchievement
+from analyze_responses.models import Habit, Task
+from rewards.models import Reward
+from .models import ChangeLog, SyncSequence
+from .serializers import (
+    SyncHabitSerializer, SyncTaskSerializer, SyncRewardSerializer, SyncUserAchievementSerializer,
+)
+
+Synced = namedtuple('Synced', 'name owned serializer')
+
+PRUNE_EVERY = 500  # A user's log is pruned each time their sequence passes a multiple of this
+
+# ChangeLog.model -> how to load and serialize the user's current rows
+SYNCED = {
+    'habit': Synced('habits', lambda user: Habit.objects.filter(user=user), SyncHabitSerializer),
+    'task': Synced('tasks', lambda user: Task.objects.filter(habit_id__user=user), SyncTaskSerializer),
+    'reward': Synced('rewards', lambda user: Reward.objects.filter(user=user), SyncRewardSerializer),
+    'achievement': Synced(
+        'achievements',
+        lambda user: UserAchievement.objects.filter(user=user).select_related('achievement'),
+        SyncUserAchievementSerializer,
+    ),
+}
+
+
+def _reserve(user_id, count):
+    """
+    Take the next `count` sequence numbers of the user. The counter row stays
+    locked until the caller's transaction ends, so a user's entries become
+    visible in seq order and a client can never sync past one still uncommitted.
+    """
+    sequences = SyncSequence.objects.filter(user_id=user_id)
+    if not sequences.update(seq=F('seq') + count):
+        try:
+            with transaction.atomic():
+                SyncSequence.objects.create(user_id=user_id, seq=count)
+            return 1
+        except IntegrityError:
+            sequences.update(seq=F('seq') + count)  # Created concurrently
+    return sequences.values_list('seq', flat=True).get() - count + 1
+
+
+def record(user_id, model, object_ids, op=ChangeLog.UPSERT):
+    """Log changes inside the writing transaction (rolled back writes leave no entry)."""
+    object_ids = list(object_ids)
+    if user_id is None or not object_ids:
+        return
+    with transaction.atomic():
+        first = _reserve(user_id, len(object_ids))
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, model=model, object_id=str(object_id), op=op, seq=first + offset)
+            for offset, object_id in enumerate(object_ids)
+        ], batch_size=1000)
+        last = first + len(object_ids) - 1
+        if (first - 1) // PRUNE_EVERY != last // PRUNE_EVERY:
+            prune(user_id)
+
+
+def prune(user_id, before=None):
+    """
+    Drop the user's entries logged before `before` (default: now minus
+    SYNC_LOG_RETENTION) and raise their pruned_through floor; returns how
+    many entries were removed.
+    """
+    before = before or timezone.now() - settings.SYNC_LOG_RETENTION
+    entries = ChangeLog.objects.filter(user_id=user_id)
+    last = entries.filter(created_at__lt=before).aggregate(last=Max('seq'))['last']
+    if last is None:
+        return 0
+    with transaction.atomic():
+        # Floor first: a sync that no longer finds these entries must already see it
+        SyncSequence.objects.filter(user_id=user_id, pruned_through__lt=last).update(pruned_through=last)
+        deleted, _ = entries.filter(seq__lte=last).delete()
+    return deleted
+
+
+def latest_token(user):
+    return SyncSequence.objects.filter(user=user).values_list('seq', flat=True).first() or 0
+
+
+def _empty_payload():
+    payload = {synced.name: [] for synced in SYNCED.values()}
+    payload['deleted'] = {synced.name: [] for synced in SYNCED.values()}
+    return payload
+
+
+def snapshot(user):
+    """Full state for a client without a token (first launch or reinstall)."""
+    token = latest_token(user)  # Read first so nothing written meanwhile is skipped next time
+    payload = _empty_payload()
+    for synced in SYNCED.values():
+        payload[synced.name] = synced.serializer(synced.owned(user), many=True).data
+    payload.update(token=token, has_more=False, reset=True)
+    return payload
+
+
+def changes_since(user, since, limit=None):
+    """
+    Rows changed after token `since`, at most `limit` log entries at a time
+    (the client repeats with the returned token while has_more is true).
+    Deleting a habit yields only the habit's tombstone; its tasks go with it.
+    A token older than the retained log, or newer than any handed out, gets
+    snapshot() (reset=true) instead.
+    """
+    latest, pruned_through = (
+        SyncSequence.objects.filter(user=user).values_list('seq', 'pruned_through').first() or (0, 0)
+    )
+    if since < pruned_through or since > latest:
+        return snapshot(user)
+
+    limit = limit or settings.SYNC_PAGE_SIZE
+    entries = list(
+        ChangeLog.objects.filter(user=user, seq__gt=since)
+        .order_by('seq')
+        .values_list('seq', 'model', 'object_id', 'op')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Only the latest op per object matters
+    latest = {}
+    for _, model, object_id, op in entries:
+        if model in SYNCED:
+            latest[(model, object_id)] = op
+
+    payload = _empty_payload()
+    for model, synced in SYNCED.items():
+        deleted = {object_id for (m, object_id), op in latest.items() if m == model and op == ChangeLog.DELETE}
+        changed = {object_id for (m, object_id), op in latest.items() if m == model and op == ChangeLog.UPSERT}
+        if changed:
+            rows = list(synced.owned(user).filter(pk__in=changed))
+            payload[synced.name] = synced.serializer(rows, many=True).data
+            # Gone (or no longer this user's) since it was logged
+            deleted |= changed - {str(row.pk) for row in rows}
+        pk = synced.owned(user).model._meta.pk
+        payload['deleted'][synced.name] = sorted(pk.to_python(object_id) for object_id in deleted)
+
+    payload.update(token=entries[-1][0] if entries else since, has_more=has_more, reset=False)
+    return payload
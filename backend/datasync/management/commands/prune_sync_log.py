@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datasync import changelog
+from datasync.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop sync log entries older than SYNC_LOG_RETENTION for every user. Writes prune "
+        "a user's log as it grows; this clears logs that stopped growing."
+    )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - settings.SYNC_LOG_RETENTION
+        users = list(ChangeLog.objects.filter(created_at__lt=before).values_list('user_id', flat=True).distinct())
+        removed = sum(changelog.prune(user_id, before) for user_id in users)
+        self.stdout.write(self.style.SUCCESS(f"Pruned {removed} sync log entries of {len(users)} user(s)"))
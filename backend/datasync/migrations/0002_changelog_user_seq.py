@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing(apps, schema_editor):
+    # Tokens handed out so far were ChangeLog ids; keep them valid by starting seq from them
+    ChangeLog = apps.get_model('datasync', 'ChangeLog')
+    SyncSequence = apps.get_model('datasync', 'SyncSequence')
+    ChangeLog.objects.update(seq=F('id'))
+    SyncSequence.objects.bulk_create([
+        SyncSequence(user_id=user_id, seq=last)
+        for user_id, last in ChangeLog.objects.values('user_id').annotate(last=Max('id')).values_list('user_id', 'last')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_frontend', '0004_challenge_challengehabit_userchallenge_and_more'),
+        ('datasync', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_sequence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seq', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changelog',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_existing, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='changelog',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='changelog_user_seq_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='changelog',
+            name='changelog_user_id_idx',
+        ),
+    ]
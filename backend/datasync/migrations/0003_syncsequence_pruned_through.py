@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasync', '0002_changelog_user_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncsequence',
+            name='pruned_through',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+
+class SyncSequence(models.Model):
+    """Per-user counter handing out ChangeLog.seq; its row lock orders a user's log writes."""
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='sync_sequence'
+    )
+    seq = models.PositiveBigIntegerField(default=0)
+    # Entries up to here may have been pruned; a client holding an older token gets a full reset
+    pruned_through = models.PositiveBigIntegerField(default=0)
+
+
+class ChangeLog(models.Model):
+    """
+    One row per write to a synced object. `seq` is the sync token: a client
+    holding token N asks for this user's rows with seq > N.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPS = [(UPSERT, 'Upsert'), (DELETE, 'Delete')]
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='changes')
+    model = models.CharField(max_length=20)  # Key of datasync.changelog.SYNCED
+    object_id = models.CharField(max_length=64)
+    seq = models.PositiveBigIntegerField()
+    op = models.CharField(max_length=10, choices=OPS, default=UPSERT)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'seq'], name='changelog_user_seq_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.op} {self.model}:{self.object_id}"
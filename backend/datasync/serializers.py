@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from analyze_responses.models import Habit, Task
+from achievements.serializers import UserAchievementSerializer
+from rewards.serializers import RewardSerializer
+
+
+class SyncHabitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Habit
+        fields = ['id', 'name', 'type', 'duration_days', 'start_date', 'end_date',
+                  'notification_status', 'reminder_time', 'created_at']
+
+
+class SyncTaskSerializer(serializers.ModelSerializer):
+    habit_id = serializers.UUIDField(source='habit_id_id')
+
+    class Meta:
+        model = Task
+        fields = ['id', 'habit_id', 'task', 'isCompleted', 'date', 'created_at']
+
+
+class SyncRewardSerializer(RewardSerializer):
+    class Meta(RewardSerializer.Meta):
+        fields = ['id'] + RewardSerializer.Meta.fields
+
+
+class SyncUserAchievementSerializer(UserAchievementSerializer):
+    class Meta(UserAchievementSerializer.Meta):
+        fields = ['id'] + UserAchievementSerializer.Meta.fields
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from achievements.models import UserAchievement
+from analyze_responses.models import Habit, Task
+from analyze_responses.signals import tasks_updated
+from rewards.models import Reward
+from .models import ChangeLog
+from . import changelog
+
+
+@receiver(post_save, sender=Habit)
+def log_habit_save(sender, instance, **kwargs):
+    changelog.record(instance.user_id, 'habit', [instance.pk])
+
+
+@receiver(post_delete, sender=Habit)
+def log_habit_delete(sender, instance, **kwargs):
+    # User deletes take the log with them
+    if isinstance(kwargs.get('origin'), Habit):
+        changelog.record(instance.user_id, 'habit', [instance.pk], ChangeLog.DELETE)
+
+
+@receiver(post_save, sender=Task)
+def log_task_save(sender, instance, **kwargs):
+    changelog.record(instance.habit_id.user_id, 'task', [instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def log_task_delete(sender, instance, **kwargs):
+    # Tasks removed with their habit are covered by the habit's tombstone
+    if isinstance(kwargs.get('origin'), Task):
+        changelog.record(instance.habit_id.user_id, 'task', [instance.pk], ChangeLog.DELETE)
+
+
+@receiver(tasks_updated, sender=Task)
+def log_bulk_task_update(sender, user, task_ids, deleted_task_ids=(), **kwargs):
+    if user is not None:
+        changelog.record(user.pk, 'task', task_ids)
+        changelog.record(user.pk, 'task', deleted_task_ids, ChangeLog.DELETE)
+
+
+@receiver(post_save, sender=Reward)
+def log_reward_save(sender, instance, **kwargs):
+    changelog.record(instance.user_id, 'reward', [instance.pk])
+
+
+@receiver(post_save, sender=UserAchievement)
+def log_achievement_save(sender, instance, **kwargs):
+    changelog.record(instance.user_id, 'achievement', [instance.pk])
+
+
+@receiver(post_delete, sender=UserAchievement)
+def log_achievement_delete(sender, instance, **kwargs):
+    # Removing an Achievement also removes it from every user; a user delete doesn't need tombstones
+    if not isinstance(kwargs.get('origin'), get_user_model()):
+        changelog.record(instance.user_id, 'achievement', [instance.pk], ChangeLog.DELETE)
@@ -0,0 +1,152 @@
+import os
+from datetime import timedelta
+from unittest import mock
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app_frontend.models import CustomUser
+from analyze_responses.models import Habit, Task
+from analyze_responses.plans import write_plan
+from rewards.models import Reward
+from .models import ChangeLog, SyncSequence
+from . import changelog
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='sync@example.com', full_name='Sync', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.habit = Habit.objects.create(name='Reading', type='Good', user=self.user)
+        self.task_ids = write_plan(self.habit, [{'task': f'Task {i}'} for i in range(6)])
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/' if since is None else f'/api/sync/?since={since}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_snapshot_then_nothing_new(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot['reset'])
+        self.assertEqual(len(snapshot['habits']), 1)
+        self.assertEqual(sorted(task['id'] for task in snapshot['tasks']), sorted(self.task_ids))
+
+        again = self.sync(snapshot['token'])
+        self.assertEqual(again['token'], snapshot['token'])
+        self.assertEqual(again['tasks'], [])
+        self.assertFalse(again['has_more'])
+
+    def test_token_round_trip_returns_only_changes(self):
+        token = self.sync()['token']
+        task = Task.objects.get(pk=self.task_ids[0])
+        task.isCompleted = True
+        task.save()
+        Reward.objects.create(user=self.user)
+
+        delta = self.sync(token)
+        self.assertEqual([row['id'] for row in delta['tasks']], [task.pk])
+        self.assertTrue(delta['tasks'][0]['isCompleted'])
+        self.assertEqual(len(delta['rewards']), 1)
+        self.assertGreater(delta['token'], token)
+        self.assertEqual(self.sync(delta['token'])['tasks'], [])
+
+    def test_tombstones(self):
+        token = self.sync()['token']
+        Task.objects.get(pk=self.task_ids[0]).delete()
+        other = Habit.objects.create(name='Running', type='Good', user=self.user)
+        other_tasks = write_plan(other, [{'task': 'Run'}] * 3)
+        other_id = other.pk
+        other.delete()
+
+        delta = self.sync(token)
+        self.assertEqual(delta['deleted']['habits'], [str(other_id)])
+        # Logged as written and gone by now: reported deleted rather than silently dropped
+        self.assertEqual(delta['deleted']['tasks'], sorted([self.task_ids[0], *other_tasks]))
+        self.assertEqual(delta['habits'], [])
+        self.assertEqual(delta['tasks'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=4)
+    def test_paging(self):
+        token = self.sync()['token']
+        Task.objects.filter(pk__in=self.task_ids).update(isCompleted=True)
+        changelog.record(self.user.pk, 'task', self.task_ids)
+
+        seen = []
+        pages = 0
+        while True:
+            delta = self.sync(token)
+            pages += 1
+            seen += [row['id'] for row in delta['tasks']]
+            token = delta['token']
+            if not delta['has_more']:
+                break
+        self.assertEqual(pages, 2)
+        self.assertEqual(sorted(seen), sorted(self.task_ids))
+
+    def test_bad_token(self):
+        self.assertEqual(self.client.get('/api/sync/?since=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/sync/?since=-1').status_code, 400)
+
+    def age_log(self, days=60):
+        ChangeLog.objects.update(created_at=timezone.now() - timedelta(days=days))
+
+    def test_token_older_than_retained_log_resets(self):
+        old_token = self.sync()['token']
+        Reward.objects.create(user=self.user)
+        self.age_log()
+        changelog.prune(self.user.pk)
+        self.assertFalse(ChangeLog.objects.exists())
+
+        reset = self.sync(old_token)
+        self.assertTrue(reset['reset'])
+        self.assertEqual(len(reset['rewards']), 1)
+        self.assertEqual(sorted(task['id'] for task in reset['tasks']), sorted(self.task_ids))
+        # The latest token survives pruning and still gets deltas
+        delta = self.sync(reset['token'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual(delta['rewards'], [])
+
+    def test_token_from_the_future_resets(self):
+        token = self.sync()['token']
+        self.assertTrue(self.sync(token + 100)['reset'])
+
+    def test_log_pruned_as_it_grows(self):
+        token = self.sync()['token']
+        self.age_log()
+        with mock.patch.object(changelog, 'PRUNE_EVERY', 5):
+            changelog.record(self.user.pk, 'task', self.task_ids[:5])
+        self.assertEqual(ChangeLog.objects.filter(seq__lte=token).count(), 0)
+        self.assertEqual(SyncSequence.objects.get(user=self.user).pruned_through, token)
+        self.assertEqual(sorted(row['id'] for row in self.sync(token)['tasks']), sorted(self.task_ids[:5]))
+
+    def test_prune_command(self):
+        self.age_log()
+        fresh = Reward.objects.create(user=self.user)
+        call_command('prune_sync_log', stdout=open(os.devnull, 'w'))
+        self.assertEqual(list(ChangeLog.objects.values_list('object_id', flat=True)), [str(fresh.pk)])
+
+    def test_rolled_back_write_leaves_no_entry(self):
+        token = self.sync()['token']
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Habit.objects.create(name='Doomed', type='Good', user=self.user)
+            raise RuntimeError
+        self.assertEqual(changelog.latest_token(self.user), token)
+        self.assertFalse(ChangeLog.objects.filter(user=self.user, seq__gt=token).exists())
+
+
+class SyncSequenceTests(TestCase):
+    def test_sequences_are_per_user_and_contiguous(self):
+        alice = CustomUser.objects.create_user(email='alice@example.com', full_name='Alice', password='pw')
+        bob = CustomUser.objects.create_user(email='bob@example.com', full_name='Bob', password='pw')
+        changelog.record(alice.pk, 'habit', ['a1', 'a2'])
+        changelog.record(bob.pk, 'habit', ['b1'])
+        changelog.record(alice.pk, 'habit', ['a3'])
+
+        self.assertEqual(
+            list(ChangeLog.objects.filter(user=alice).order_by('seq').values_list('object_id', 'seq')),
+            [('a1', 1), ('a2', 2), ('a3', 3)],
+        )
+        self.assertEqual(changelog.latest_token(alice), 3)
+        self.assertEqual(changelog.latest_token(bob), 1)
@@ -0,0 +1,25 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from . import changelog
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """
+    GET /api/sync/               -> full state and a token
+    GET /api/sync/?since=<token> -> rows changed since the token, tombstones under "deleted"
+    Keep calling with the returned token while "has_more" is true. A token older than
+    the retained log comes back as a full state with "reset": true.
+    """
+    since = request.GET.get('since')
+    if since in (None, ''):
+        return Response(changelog.snapshot(request.user))
+    try:
+        since = int(since)
+    except ValueError:
+        return Response({'error': 'since must be a sync token'}, status=400)
+    if since < 0:
+        return Response({'error': 'since must be a sync token'}, status=400)
+    return Response(changelog.changes_since(request.user, since))
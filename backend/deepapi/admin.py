@@ -1,3 +1,21 @@
 from django.contrib import admin
+from .models import HabitClassification, LLMSlot, QuestionSet
 
 # Register your models here.
+
+class HabitClassificationAdmin(admin.ModelAdmin):
+    list_display = ('normalized_text', 'classification', 'updated_at')
+    search_fields = ('normalized_text',)
+
+admin.site.register(HabitClassification, HabitClassificationAdmin)
+
+class QuestionSetAdmin(admin.ModelAdmin):
+    list_display = ('habit_key', 'habit_type', 'served_count', 'created_at')
+    search_fields = ('habit_key',)
+
+admin.site.register(QuestionSet, QuestionSetAdmin)
+
+class LLMSlotAdmin(admin.ModelAdmin):
+    list_display = ('slot', 'holder', 'leased_until')
+
+admin.site.register(LLMSlot, LLMSlotAdmin)
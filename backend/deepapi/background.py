@@ -0,0 +1,70 @@
+"""
+Small in-process background runner for cache refills. Jobs are keyed and
+claimed through a BackgroundLease row first, so a refill that is already
+queued or running in any web worker is not submitted twice. A lease held by
+a process that died runs out after BACKGROUND_JOB_TIMEOUT. Model calls made
+by a job use the background LLM pool.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .llm_client import use_pool
+from .models import BackgroundLease
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BACKGROUND_WORKERS,
+    thread_name_prefix='deepapi-background',
+)
+
+
+def _lease_key(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def claim(key):
+    """Lease the job key for this process; returns the lease's expiry, or None if it is held."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.BACKGROUND_JOB_TIMEOUT)
+    try:
+        with transaction.atomic():
+            BackgroundLease.objects.create(key=_lease_key(key), expires_at=expires_at)
+        return expires_at
+    except IntegrityError:
+        # Held elsewhere, unless that lease ran out
+        taken = BackgroundLease.objects.filter(key=_lease_key(key), expires_at__lt=now).update(expires_at=expires_at)
+        return expires_at if taken else None
+
+
+def release(key, expires_at):
+    """Drop our lease (not one another process took over after ours ran out)."""
+    BackgroundLease.objects.filter(key=_lease_key(key), expires_at=expires_at).delete()
+
+
+def _run(key, expires_at, fn, args, kwargs):
+    try:
+        with use_pool('background'):
+            fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background job %s failed", key)
+    finally:
+        try:
+            release(key, expires_at)
+        finally:
+            connection.close()  # Each worker thread holds its own DB connection
+
+
+def submit_once(key, fn, *args, **kwargs):
+    """Queue fn unless a job with the same key is pending in any process; returns whether it was queued."""
+    expires_at = claim(key)
+    if expires_at is None:
+        return False
+    _executor.submit(_run, key, expires_at, fn, args, kwargs)
+    return True
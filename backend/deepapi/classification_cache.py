@@ -0,0 +1,140 @@
+"""
+Two-tier cache in front of the habit classifier: an in-process LRU and the
+HabitClassification table, both keyed by the normalized habit text.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import HabitClassification
+
+CACHEABLE_RESULTS = ('Good', 'Bad')
+
+
+def normalize_habit(text):
+    """
+    Fold case, punctuation and whitespace so "Drinking  water!" and "drinking water"
+    share a key. Not truncated: cache_key hashes all of it, and callers storing it
+    in a column cut it to fit.
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = ''.join(' ' if unicodedata.category(ch)[0] in 'PSC' else ch for ch in text)
+    return ' '.join(text.split())
+
+
+def cache_key(normalized):
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry time to live."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value for `ttl` seconds (default: the cache's ttl)."""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_memory = LRUCache(
+    maxsize=settings.HABIT_CLASSIFICATION_LRU_SIZE,
+    ttl=settings.HABIT_CLASSIFICATION_TTL.total_seconds(),
+)
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hit/miss counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def classify(habit_text, classifier):
+    """
+    Return the cached classification of habit_text, calling
+    classifier(habit_text) and storing its answer on a miss.
+    """
+    normalized = normalize_habit(habit_text)
+    if not normalized:
+        return classifier(habit_text)
+    key = cache_key(normalized)
+
+    result = _memory.get(key)
+    if result is not None:
+        _count('memory_hits')
+        return result
+
+    now = timezone.now()
+    row = (
+        HabitClassification.objects
+        .filter(key=key, updated_at__gte=now - settings.HABIT_CLASSIFICATION_TTL)
+        .values_list('classification', 'updated_at')
+        .first()
+    )
+    if row is not None:
+        _count('db_hits')
+        result, updated_at = row
+        # Only for what is left of the row's TTL, so memory never outlives the table
+        _memory.set(key, result, (updated_at + settings.HABIT_CLASSIFICATION_TTL - now).total_seconds())
+        return result
+
+    _count('misses')
+    result = classifier(habit_text)
+    if result in CACHEABLE_RESULTS:
+        HabitClassification.objects.update_or_create(
+            key=key,
+            defaults={'normalized_text': normalized[:255], 'classification': result},
+        )
+        _memory.set(key, result)
+    return result
+
+
+def invalidate(habit_text=None):
+    """Forget one habit, or everything when called without arguments."""
+    if habit_text is None:
+        _memory.clear()
+        HabitClassification.objects.all().delete()
+        return
+    key = cache_key(normalize_habit(habit_text))
+    _memory.delete(key)
+    HabitClassification.objects.filter(key=key).delete()
+
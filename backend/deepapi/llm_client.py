@@ -0,0 +1,251 @@
+"""
+Shared OpenRouter client: one pooled keep-alive session per process with
+timeouts, and a concurrency limit that holds across every web worker and
+background process. Each call leases an LLMSlot row; a lease runs out on its
+own if its process dies mid-call.
+
+Background work (refill jobs, in-process refills) leases from its own range of
+slots, so it can never take the slots interactive requests wait for. Code run
+inside use_pool('background') gets that client from get_client().
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import LLMSlot
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "deepseek/deepseek-chat-v3-0324:free"
+SLOT_POLL_INTERVAL = 0.02  # First wait while every slot is leased; doubles up to SLOT_POLL_MAX
+SLOT_POLL_MAX = 0.5
+LEASE_MARGIN = 30  # Seconds a lease outlives the request timeouts
+BACKGROUND_FIRST_SLOT = 1000  # Background slots are numbered from here, clear of the interactive ones
+POOLS = ('interactive', 'background')
+
+
+class LLMError(Exception):
+    status_code = 500
+
+
+class LLMBusyError(LLMError):
+    """Every slot is taken by other generations; the caller should retry later."""
+    status_code = 503
+
+
+class LLMTimeoutError(LLMError):
+    status_code = 504
+
+
+class OpenRouterClient:
+    def __init__(self, api_key, model=DEFAULT_MODEL, url=OPENROUTER_URL,
+                 connect_timeout=5.0, read_timeout=60.0,
+                 max_concurrency=4, queue_timeout=2.0, pool_size=10, first_slot=0):
+        self.api_key = api_key
+        self.model = model
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+        self.slots = range(first_slot, first_slot + max_concurrency)
+        self.queue_timeout = queue_timeout
+        # A streamed call renews its lease, so this only has to cover one read
+        self.lease = timedelta(seconds=connect_timeout + read_timeout + LEASE_MARGIN)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._slots_created = False
+
+    def _payload(self, messages, params):
+        payload = {"model": params.pop("model", self.model), "messages": messages}
+        payload.update(params)
+        return payload
+
+    def _acquire(self):
+        """Lease a free slot, waiting up to queue_timeout; returns (slot, holder)."""
+        if not self._slots_created:
+            LLMSlot.objects.bulk_create([LLMSlot(slot=slot) for slot in self.slots], ignore_conflicts=True)
+            self._slots_created = True
+
+        holder = uuid.uuid4().hex
+        deadline = time.monotonic() + self.queue_timeout
+        delay = SLOT_POLL_INTERVAL
+        # Uncontended, a random slot is free and the lease costs one UPDATE
+        slots = [random.choice(self.slots)]
+        while True:
+            now = timezone.now()
+            free = Q(leased_until__isnull=True) | Q(leased_until__lt=now)
+            for slot in slots:
+                # Conditional UPDATE: another process may have leased it since we looked
+                if LLMSlot.objects.filter(free, slot=slot).update(holder=holder, leased_until=now + self.lease):
+                    return slot, holder
+            slots = list(LLMSlot.objects.filter(
+                free, slot__gte=self.slots.start, slot__lt=self.slots.stop,
+            ).values_list('slot', flat=True))
+            random.shuffle(slots)
+            if not slots:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMBusyError("Too many AI requests in progress, please try again shortly")
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, SLOT_POLL_MAX)
+
+    def _renew(self, slot, holder):
+        LLMSlot.objects.filter(slot=slot, holder=holder).update(leased_until=timezone.now() + self.lease)
+
+    def _release(self, slot, holder):
+        LLMSlot.objects.filter(slot=slot, holder=holder).update(holder='', leased_until=None)
+
+    @contextmanager
+    def _slot(self):
+        """Hold a slot for the block; yields a callable that extends the lease."""
+        slot, holder = self._acquire()
+        try:
+            yield lambda: self._renew(slot, holder)
+        except requests.exceptions.Timeout as e:
+            raise LLMTimeoutError(f"AI request timed out: {e}") from e
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"API request failed: {e}") from e
+        finally:
+            self._release(slot, holder)
+
+    def _post(self, payload, **kwargs):
+        with self._slot():
+            return self.session.post(self.url, json=payload, timeout=self.timeout, **kwargs)
+
+    def _raise_for_error(self, response, data):
+        if response.status_code >= 400:
+            error = data.get("error") if isinstance(data, dict) else None
+            message = error.get("message") if isinstance(error, dict) else error
+            raise LLMError(f"OpenRouter returned HTTP {response.status_code}: {message or 'unknown error'}")
+
+    def chat(self, messages, **params):
+        """POST a chat completion and return the decoded JSON body."""
+        response = self._post(self._payload(messages, params))
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise LLMError(f"Invalid response from OpenRouter (HTTP {response.status_code})") from e
+        self._raise_for_error(response, data)
+        return data
+
+    def complete(self, messages, **params):
+        """Return the stripped text of the first choice."""
+        data = self.chat(messages, **params)
+        try:
+            return data["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raise LLMError("Failed to get response from OpenRouter")
+
+    async def acomplete(self, messages, **params):
+        """
+        complete() for async views and consumers (config/asgi.py). The call, slot
+        lease included, runs in a worker thread so the event loop keeps serving.
+        """
+        return await sync_to_async(self._complete_in_thread, thread_sensitive=False)(messages, params)
+
+    def _complete_in_thread(self, messages, params):
+        try:
+            return self.complete(messages, **params)
+        finally:
+            connection.close()  # Each worker thread holds its own DB connection
+
+    def stream(self, messages, **params):
+        """
+        Yield content fragments as OpenRouter streams them (server-sent events).
+        The concurrency slot is held until the stream is exhausted or closed.
+        """
+        payload = self._payload(messages, dict(params, stream=True))
+        with self._slot() as renew:
+            renewed = time.monotonic()
+            response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=True)
+            try:
+                if response.status_code >= 400:
+                    try:
+                        data = response.json()
+                    except ValueError:
+                        data = None
+                    self._raise_for_error(response, data)
+
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line.startswith("data:"):
+                        continue  # Blank separators and ": OPENROUTER PROCESSING" keep-alives
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    if chunk.get("error"):
+                        raise LLMError(f"OpenRouter stream failed: {chunk['error']}")
+                    choices = chunk.get("choices") or [{}]
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+                    if time.monotonic() - renewed > self.lease.total_seconds() / 2:
+                        renew()
+                        renewed = time.monotonic()
+            finally:
+                response.close()
+
+
+_clients = {}
+_client_lock = threading.Lock()
+_context = threading.local()
+
+
+@contextmanager
+def use_pool(pool):
+    """Make get_client() in this thread return the client of `pool` for the block."""
+    assert pool in POOLS, pool
+    previous = getattr(_context, 'pool', 'interactive')
+    _context.pool = pool
+    try:
+        yield
+    finally:
+        _context.pool = previous
+
+
+def get_client(pool=None):
+    """Process-wide client of a pool (by default the one this thread runs in), configured from settings."""
+    pool = pool or getattr(_context, 'pool', 'interactive')
+    client = _clients.get(pool)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(pool)
+            if client is None:
+                background = pool == 'background'
+                client = _clients[pool] = OpenRouterClient(
+                    api_key=settings.OPENROUTER_API_KEY,
+                    model=settings.LLM_MODEL,
+                    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+                    read_timeout=settings.LLM_READ_TIMEOUT,
+                    max_concurrency=(
+                        settings.LLM_BACKGROUND_CONCURRENCY if background else settings.LLM_MAX_CONCURRENCY
+                    ),
+                    queue_timeout=(
+                        settings.LLM_BACKGROUND_QUEUE_TIMEOUT if background else settings.LLM_QUEUE_TIMEOUT
+                    ),
+                    pool_size=settings.LLM_POOL_SIZE,
+                    first_slot=BACKGROUND_FIRST_SLOT if background else 0,
+                )
+    return client
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deepapi', '0001_habitclassification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('habit_key', models.CharField(max_length=255)),
+                ('habit_type', models.CharField(max_length=10)),
+                ('questions', models.JSONField()),
+                ('served_count', models.PositiveIntegerField(default=0)),
+                ('last_served_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['habit_key', 'habit_type', 'served_count'], name='question_bank_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deepapi', '0002_questionset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMSlot',
+            fields=[
+                ('slot', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('holder', models.CharField(blank=True, max_length=32)),
+                ('leased_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deepapi', '0003_llmslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundLease',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,3 +1,54 @@
 from django.db import models
 
 # Create your models here.
+
+class HabitClassification(models.Model):
+    """Cached Good/Bad classification, keyed by a hash of the normalized habit text."""
+    key = models.CharField(max_length=64, unique=True)  # sha256 of the normalized text
+    normalized_text = models.CharField(max_length=255)
+    classification = models.CharField(max_length=10)  # "Good" or "Bad"
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.normalized_text}: {self.classification}"
+
+
+class QuestionSet(models.Model):
+    """One pre-generated set of onboarding questions for a habit, rotated by how often it was served."""
+    habit_key = models.CharField(max_length=255)  # normalize_habit() of the habit name
+    habit_type = models.CharField(max_length=10)  # "good" or "bad"
+    questions = models.JSONField()
+    served_count = models.PositiveIntegerField(default=0)
+    last_served_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['habit_key', 'habit_type', 'served_count'], name='question_bank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_key} ({self.habit_type})"
+
+
+class LLMSlot(models.Model):
+    """
+    One lease on an OpenRouter call, shared by every process (see llm_client.py).
+    Slots 0.. are the interactive pool, BACKGROUND_FIRST_SLOT.. the background one.
+    """
+    slot = models.PositiveSmallIntegerField(primary_key=True)
+    holder = models.CharField(max_length=32, blank=True)  # Random id of the call holding it
+    leased_until = models.DateTimeField(null=True, blank=True)  # Free once past, even if the holder died
+
+    def __str__(self):
+        return f"LLM slot {self.slot}"
+
+
+class BackgroundLease(models.Model):
+    """Claim on a keyed background refill, so only one process runs it at a time (see background.py)."""
+    key = models.CharField(max_length=64, primary_key=True)  # sha256 of the job key
+    expires_at = models.DateTimeField()  # Another process may take the job over once past
+
+    def __str__(self):
+        return self.key
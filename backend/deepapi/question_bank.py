@@ -0,0 +1,86 @@
+"""
+Bank of pre-generated onboarding question sets, keyed by normalized habit
+name and habit type. Requests are served from stored sets; new sets are
+generated in the background, and synchronously only when a habit has none.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import background
+from .classification_cache import normalize_habit
+from .models import QuestionSet
+
+
+def _habit_key(habit_name):
+    return normalize_habit(habit_name)[:255]  # QuestionSet.habit_key length
+
+
+def _habit_type(habit_type):
+    return 'good' if (habit_type or '').lower() == 'good' else 'bad'
+
+
+def _store(habit_key, habit_type, questions, served_count=0):
+    if questions:
+        return QuestionSet.objects.create(
+            habit_key=habit_key,
+            habit_type=habit_type,
+            questions=questions,
+            served_count=served_count,
+            last_served_at=timezone.now() if served_count else None,
+        )
+
+
+def refill(habit_name, habit_type, generator):
+    """Top the bank up to QUESTION_BANK_SIZE fresh sets and drop worn-out ones."""
+    habit_key = _habit_key(habit_name)
+    habit_type = _habit_type(habit_type)
+    sets = QuestionSet.objects.filter(habit_key=habit_key, habit_type=habit_type)
+
+    fresh = sets.filter(served_count__lt=settings.QUESTION_BANK_MAX_SERVES).count()
+    for _ in range(settings.QUESTION_BANK_SIZE - fresh):
+        if _store(habit_key, habit_type, generator(habit_name, habit_type)):
+            fresh += 1
+
+    if fresh:
+        sets.filter(served_count__gte=settings.QUESTION_BANK_MAX_SERVES).delete()
+
+
+def schedule_refill(habit_name, habit_type, generator):
+    key = f"question-bank:{_habit_type(habit_type)}:{_habit_key(habit_name)}"
+    return background.submit_once(key, refill, habit_name, habit_type, generator)
+
+
+def get_questions(habit_name, habit_type, generator):
+    """
+    Questions for a habit, rotating through the least-served stored set.
+    generator(habit_name, habit_type) produces a new list of questions.
+    """
+    habit_key = _habit_key(habit_name)
+    habit_type = _habit_type(habit_type)
+
+    sets = list(
+        QuestionSet.objects
+        .filter(habit_key=habit_key, habit_type=habit_type)
+        .order_by('served_count', 'created_at')
+        .values('id', 'questions', 'served_count')
+    )
+
+    if not sets:
+        # Cold miss: nothing to serve yet, so this request waits for the model
+        questions = generator(habit_name, habit_type)
+        _store(habit_key, habit_type, questions, served_count=1)
+        schedule_refill(habit_name, habit_type, generator)
+        return questions
+
+    chosen = sets[0]
+    QuestionSet.objects.filter(id=chosen['id']).update(
+        served_count=F('served_count') + 1,
+        last_served_at=timezone.now(),
+    )
+
+    fresh = [s for s in sets if s['served_count'] < settings.QUESTION_BANK_MAX_SERVES]
+    if len(fresh) < settings.QUESTION_BANK_SIZE or chosen['served_count'] + 1 >= settings.QUESTION_BANK_MAX_SERVES:
+        schedule_refill(habit_name, habit_type, generator)
+
+    return chosen['questions']
@@ -1,3 +1,207 @@
-from django.test import TestCase
+import asyncio
+from contextlib import ExitStack
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import background, classification_cache, llm_client, question_bank
+from .llm_client import LLMBusyError, OpenRouterClient
+from .models import BackgroundLease, HabitClassification, LLMSlot, QuestionSet
 
-# Create your tests here.
+
+class LLMSlotTests(TestCase):
+    """The concurrency limit is held in the database, so it spans processes (and clients)."""
+
+    def make_client(self):
+        return OpenRouterClient(api_key='test', max_concurrency=2, queue_timeout=0)
+
+    def test_limit_is_shared_between_clients(self):
+        with ExitStack() as stack:
+            stack.enter_context(self.make_client()._slot())
+            stack.enter_context(self.make_client()._slot())
+            with self.assertRaises(LLMBusyError):
+                stack.enter_context(self.make_client()._slot())
+        # Released on exit
+        with self.make_client()._slot():
+            pass
+        self.assertFalse(LLMSlot.objects.exclude(holder='').exists())
+
+    def test_released_after_error(self):
+        client = self.make_client()
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                with client._slot():
+                    raise ValueError
+        self.assertFalse(LLMSlot.objects.exclude(holder='').exists())
+
+    def test_expired_lease_is_reclaimed(self):
+        client = self.make_client()
+        with client._slot(), client._slot():
+            # The holder of slot 0 died mid-call
+            LLMSlot.objects.filter(slot=0).update(leased_until=timezone.now() - timedelta(seconds=1))
+            with self.make_client()._slot():
+                self.assertEqual(LLMSlot.objects.filter(leased_until__gt=timezone.now()).count(), 2)
+
+    def test_background_pool_leaves_interactive_slots_free(self):
+        background_client = OpenRouterClient(
+            api_key='test', max_concurrency=1, queue_timeout=0, first_slot=llm_client.BACKGROUND_FIRST_SLOT,
+        )
+        with background_client._slot():
+            with self.assertRaises(LLMBusyError):
+                background_client._acquire()
+            with self.make_client()._slot(), self.make_client()._slot():
+                pass
+
+    def test_uncontended_lease_is_one_query(self):
+        client = self.make_client()
+        with client._slot():
+            pass
+        with self.assertNumQueries(1):
+            slot, holder = client._acquire()
+        client._release(slot, holder)
+
+    @override_settings(LLM_MAX_CONCURRENCY=3, LLM_BACKGROUND_CONCURRENCY=1)
+    def test_get_client_follows_pool(self):
+        llm_client._clients.clear()
+        self.addCleanup(llm_client._clients.clear)
+        self.assertEqual(llm_client.get_client().slots, range(0, 3))
+        with llm_client.use_pool('background'):
+            background_client = llm_client.get_client()
+        self.assertEqual(background_client.slots, range(llm_client.BACKGROUND_FIRST_SLOT, llm_client.BACKGROUND_FIRST_SLOT + 1))
+        self.assertIs(llm_client.get_client('background'), background_client)
+
+
+class AsyncCompleteTests(TransactionTestCase):
+    """acomplete holds a slot like complete, from a worker thread."""
+
+    def test_acomplete(self):
+        client = OpenRouterClient(api_key='test', max_concurrency=1, queue_timeout=0)
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'choices': [{'message': {'content': ' Good \n'}}]}
+
+        def post(*args, **kwargs):
+            self.assertEqual(LLMSlot.objects.exclude(holder='').count(), 1)
+            return response
+
+        with mock.patch.object(client.session, 'post', side_effect=post):
+            self.assertEqual(asyncio.run(client.acomplete([{'role': 'user', 'content': 'hi'}])), 'Good')
+        self.assertFalse(LLMSlot.objects.exclude(holder='').exists())
+
+
+class BackgroundLeaseTests(TestCase):
+    """A refill key is claimed in the database, so two web workers can't both start it."""
+
+    def test_claim_once(self):
+        expires_at = background.claim('question-bank:good:reading')
+        self.assertIsNotNone(expires_at)
+        self.assertIsNone(background.claim('question-bank:good:reading'))
+        self.assertIsNotNone(background.claim('question-bank:bad:reading'))
+
+        background.release('question-bank:good:reading', expires_at)
+        self.assertIsNotNone(background.claim('question-bank:good:reading'))
+
+    def test_expired_lease_taken_over(self):
+        old = background.claim('question-bank:good:reading')
+        BackgroundLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        new = background.claim('question-bank:good:reading')
+        self.assertIsNotNone(new)
+        # The original holder finishing late must not drop the new lease
+        background.release('question-bank:good:reading', old)
+        self.assertIsNone(background.claim('question-bank:good:reading'))
+
+    def test_submit_once_skips_claimed_key(self):
+        background.claim('question-bank:good:reading')
+        with mock.patch.object(background._executor, 'submit') as submit:
+            self.assertFalse(background.submit_once('question-bank:good:reading', print))
+        submit.assert_not_called()
+
+    def test_jobs_use_the_background_pool(self):
+        expires_at = background.claim('question-bank:good:reading')
+        pools = []
+        background._run('question-bank:good:reading', expires_at, lambda: pools.append(llm_client.get_client()), (), {})
+        self.assertEqual(pools, [llm_client.get_client('background')])
+        self.assertIsNot(llm_client.get_client(), pools[0])
+
+
+@override_settings(QUESTION_BANK_SIZE=2, QUESTION_BANK_MAX_SERVES=3)
+class QuestionBankTests(TestCase):
+    def setUp(self):
+        self.generated = 0
+        patcher = mock.patch.object(question_bank.background, 'submit_once', return_value=True)
+        self.submit_once = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generator(self, habit_name, habit_type):
+        self.generated += 1
+        return [f'{habit_name} question {self.generated}']
+
+    def test_cold_miss_generates_and_schedules(self):
+        questions = question_bank.get_questions('Reading  Books', 'Good', self.generator)
+        self.assertEqual(questions, ['Reading  Books question 1'])
+        self.assertEqual(QuestionSet.objects.get().served_count, 1)
+        self.submit_once.assert_called_once()
+
+    def test_rotates_least_served(self):
+        question_bank.refill('Reading', 'good', self.generator)
+        self.assertEqual(QuestionSet.objects.count(), 2)
+        served = [question_bank.get_questions('Reading', 'good', self.generator)[0] for _ in range(4)]
+        self.assertEqual(sorted(served), ['Reading question 1'] * 2 + ['Reading question 2'] * 2)
+        self.assertEqual(self.generated, 2)  # Served from the bank, never the model
+
+    def test_refill_replaces_worn_out_sets(self):
+        question_bank.refill('Reading', 'good', self.generator)
+        QuestionSet.objects.filter(questions=['Reading question 1']).update(served_count=3)
+        question_bank.refill('Reading', 'good', self.generator)
+        self.assertEqual(
+            sorted(q[0] for q in QuestionSet.objects.values_list('questions', flat=True)),
+            ['Reading question 2', 'Reading question 3'],
+        )
+
+
+class ClassificationCacheTests(TestCase):
+    def setUp(self):
+        classification_cache._memory.clear()
+        self.addCleanup(classification_cache._memory.clear)
+        self.calls = []
+
+    def classifier(self, text):
+        self.calls.append(text)
+        return 'Good'
+
+    def test_normalized_variants_share_an_entry(self):
+        classification_cache.classify('Drinking  water!', self.classifier)
+        classification_cache._memory.clear()
+        self.assertEqual(classification_cache.classify('drinking water', self.classifier), 'Good')
+        self.assertEqual(self.calls, ['Drinking  water!'])
+
+    def test_long_habits_sharing_a_prefix_do_not_collide(self):
+        prefix = 'walk ' * 60
+        classification_cache.classify(prefix + 'in the park', self.classifier)
+        classification_cache.classify(prefix + 'to the bar', self.classifier)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(HabitClassification.objects.count(), 2)
+        self.assertTrue(all(len(t) <= 255 for t in HabitClassification.objects.values_list('normalized_text', flat=True)))
+
+    def test_db_hit_keeps_the_rows_remaining_ttl(self):
+        classification_cache.classify('reading', self.classifier)
+        ttl = classification_cache.settings.HABIT_CLASSIFICATION_TTL
+        HabitClassification.objects.update(updated_at=timezone.now() - ttl + timedelta(hours=1))
+        classification_cache._memory.clear()
+
+        self.assertEqual(classification_cache.classify('reading', self.classifier), 'Good')
+        key = classification_cache.cache_key('reading')
+        remaining = classification_cache._memory._data[key][1] - classification_cache.time.monotonic()
+        self.assertAlmostEqual(remaining, 3600, delta=60)
+
+    def test_expired_row_is_reclassified(self):
+        classification_cache.classify('reading', self.classifier)
+        ttl = classification_cache.settings.HABIT_CLASSIFICATION_TTL
+        HabitClassification.objects.update(updated_at=timezone.now() - ttl - timedelta(seconds=1))
+        classification_cache._memory.clear()
+        classification_cache.classify('reading', self.classifier)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_unexpected_answers_not_cached(self):
+        classification_cache.classify('reading', lambda text: 'Unknown')
+        self.assertFalse(HabitClassification.objects.exists())
+        self.assertIsNone(classification_cache._memory.get(classification_cache.cache_key('reading')))
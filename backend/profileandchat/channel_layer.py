@@ -0,0 +1,348 @@
+"""
+Channel layer shared by every ASGI worker on one host, backed by a SQLite
+file in WAL mode, so chat group_send reaches sockets in other processes
+without running a broker.
+
+Each process reads its own specific channels ("<prefix>!<id>") with one
+poller per event loop instead of one query per consumer. Messages must be
+JSON-serializable.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "habitro-channels.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_message_channel_idx ON channel_message (channel, id);
+CREATE INDEX IF NOT EXISTS channel_message_expires_idx ON channel_message (expires);
+CREATE TABLE IF NOT EXISTS channel_group (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+CREATE INDEX IF NOT EXISTS channel_group_expires_idx ON channel_group (expires);
+"""
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Same-host channel layer.
+
+    - capacity / channel_capacity: unread messages a channel may hold; send()
+      raises ChannelFull past it and group_send() skips that member (backpressure).
+      A receiving process also buffers up to capacity per channel in memory and
+      stops taking that channel's rows while its buffer is full.
+    - expiry: seconds an undelivered message is kept.
+    - group_expiry: seconds a group membership lives unless re-added.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path=DEFAULT_PATH, expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.005, max_poll_interval=0.05,
+                 batch_size=500, cleanup_interval=5.0):
+        super().__init__(expiry=expiry, capacity=capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = path
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.batch_size = batch_size
+        self.cleanup_interval = cleanup_interval
+        self.client_prefix = uuid.uuid4().hex
+
+        # sqlite3 calls block, so they all run on one thread owned by this layer
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="channel-layer")
+        self._db = None
+        self._last_cleanup = 0.0
+
+        # Specific channels of this process: channel -> queue of (expires, message), bounded by
+        # the channel's capacity; the poller leaves what doesn't fit in SQLite
+        self._queues = {}
+        self._waiters = {}
+        self._poller = None
+        self._poller_loop = None
+
+    # Database side (runs on the executor thread)
+
+    def _connection(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def _transaction(self, fn, *args):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db, time.time(), *args)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def _claim(self, probe, fn, *args):
+        # Idle polls only read (WAL readers never block writers); the write lock is
+        # taken when probe finds something to claim
+        if not probe(self._connection(), time.time(), *args):
+            return None
+        return self._transaction(fn, *args)
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transaction, fn, *args)
+
+    async def _run_claim(self, probe, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._claim, probe, fn, *args)
+
+    def _cleanup(self, db, now):
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        db.execute("DELETE FROM channel_message WHERE expires < ?", (now,))
+        db.execute("DELETE FROM channel_group WHERE expires < ?", (now,))
+
+    def _pending(self, db, now, channels):
+        """Unexpired message count of each channel."""
+        counts = dict.fromkeys(channels, 0)
+        for offset in range(0, len(channels), self.batch_size):
+            chunk = channels[offset:offset + self.batch_size]
+            rows = db.execute(
+                "SELECT channel, COUNT(*) FROM channel_message "
+                f"WHERE expires >= ? AND channel IN ({','.join('?' * len(chunk))}) GROUP BY channel",
+                (now, *chunk),
+            )
+            counts.update(rows)
+        return counts
+
+    def _insert(self, db, now, channels, body):
+        """Queue body on every channel that has room; returns the channels skipped as full."""
+        counts = self._pending(db, now, channels)
+        accepted = [c for c in channels if counts[c] < self.get_capacity(c)]
+        db.executemany(
+            "INSERT INTO channel_message (channel, expires, body) VALUES (?, ?, ?)",
+            [(channel, now + self.expiry, body) for channel in accepted],
+        )
+        self._cleanup(db, now)
+        return [c for c in channels if c not in accepted]
+
+    def _send(self, db, now, channel, body):
+        return self._insert(db, now, [channel], body)
+
+    def _group_send(self, db, now, group, body):
+        channels = [row[0] for row in db.execute(
+            "SELECT channel FROM channel_group WHERE group_name = ? AND expires >= ?", (group, now)
+        )]
+        return self._insert(db, now, channels, body) if channels else []
+
+    def _queued(self, db, low, high, room, limit):
+        full = [channel for channel, free in room.items() if free <= 0]
+        return db.execute(
+            "SELECT id, channel, expires, body FROM channel_message "
+            f"WHERE channel >= ? AND channel < ? AND channel NOT IN ({','.join('?' * len(full))}) "
+            "ORDER BY id LIMIT ?",
+            (low, high, *full, limit),
+        ).fetchall()
+
+    def _has_queued(self, db, now, low, high, room):
+        return bool(self._queued(db, low, high, room, 1))
+
+    def _take(self, db, now, low, high, room):
+        """
+        Remove and return the queued messages of channels in [low, high), at most
+        room[channel] per channel (capacity for channels without a queue yet).
+        Messages past that stay in the table, where send() counts them.
+        """
+        rows = self._queued(db, low, high, room, self.batch_size)
+        taken, done = [], []
+        for message_id, channel, expires, body in rows:
+            if expires >= now:
+                free = room.setdefault(channel, self.get_capacity(channel))
+                if not free:
+                    continue
+                room[channel] = free - 1
+                taken.append((channel, expires, body))
+            done.append((message_id,))
+        db.executemany("DELETE FROM channel_message WHERE id = ?", done)
+        return taken
+
+    def _has_one(self, db, now, channel):
+        return db.execute(
+            "SELECT 1 FROM channel_message WHERE channel = ? AND expires >= ? LIMIT 1", (channel, now)
+        ).fetchone() is not None
+
+    def _take_one(self, db, now, channel):
+        row = db.execute(
+            "SELECT id, body FROM channel_message WHERE channel = ? AND expires >= ? ORDER BY id LIMIT 1",
+            (channel, now),
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute("DELETE FROM channel_message WHERE id = ?", (row[0],))
+        return row[1]
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+
+        if await self._run(self._send, channel, json.dumps(message)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if "!" in channel:
+            return await self._receive_local(channel)
+
+        delay = self.poll_interval
+        while True:
+            body = await self._run_claim(self._has_one, self._take_one, channel)
+            if body is not None:
+                return json.loads(body)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    async def new_channel(self, prefix="specific"):
+        suffix = "".join(random.choice(string.ascii_letters) for _ in range(12))
+        return f"{prefix}.{self.client_prefix}!{suffix}"
+
+    async def flush(self):
+        def flush(db, now):
+            db.execute("DELETE FROM channel_message")
+            db.execute("DELETE FROM channel_group")
+
+        await self._run(flush)
+        self._queues.clear()
+
+    async def close(self):
+        self._executor.submit(self._close_db).result()
+
+    def _close_db(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+
+        def add(db, now):
+            db.execute(
+                "INSERT OR REPLACE INTO channel_group (group_name, channel, expires) VALUES (?, ?, ?)",
+                (group, channel, now + self.group_expiry),
+            )
+
+        await self._run(add)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+
+        def discard(db, now):
+            db.execute("DELETE FROM channel_group WHERE group_name = ? AND channel = ?", (group, channel))
+
+        await self._run(discard)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        # Members that are full miss this message, as with the other channel layers
+        await self._run(self._group_send, group, json.dumps(message))
+
+    # Process-local delivery
+
+    async def _receive_local(self, channel):
+        self._ensure_poller()
+        queue = self._queue(channel)
+        self._waiters[channel] = self._waiters.get(channel, 0) + 1
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        finally:
+            self._waiters[channel] -= 1
+            if not self._waiters[channel]:
+                del self._waiters[channel]
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller_loop is not loop or self._poller is None or self._poller.done():
+            if self._poller_loop is not loop:
+                self._queues = {}  # Queues belong to the loop that created them
+            self._poller_loop = loop
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        # Every channel of this process sorts between "<prefix>!" and "<prefix>\""
+        delay = self.poll_interval
+        while self._waiters or any(not q.empty() for q in self._queues.values()):
+            rows = []
+            room = {channel: queue.maxsize - queue.qsize() for channel, queue in self._queues.items()}
+            try:
+                for low, high in self._local_ranges():
+                    rows.extend(await self._run_claim(self._has_queued, self._take, low, high, room) or [])
+            except sqlite3.Error:
+                logger.exception("Channel layer poll failed")
+                await asyncio.sleep(self.max_poll_interval)
+                continue
+            for channel, expires, body in rows:
+                self._queue(channel).put_nowait((expires, json.loads(body)))
+            self._prune_queues()
+            if len(rows) >= self.batch_size:
+                continue
+            delay = self.poll_interval if rows else min(delay * 2, self.max_poll_interval)
+            await asyncio.sleep(delay)
+        self._poller = None
+
+    def _queue(self, channel):
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    def _local_ranges(self):
+        prefixes = {channel[:channel.index("!")] for channel in self._waiters}
+        return [(f"{prefix}!", f'{prefix}"') for prefix in prefixes]
+
+    def _prune_queues(self):
+        # Drop the backlog of channels nobody is receiving on once it has expired
+        now = time.time()
+        for channel, queue in list(self._queues.items()):
+            if self._waiters.get(channel):
+                continue
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+            if queue.empty():
+                del self._queues[channel]
@@ -0,0 +1,184 @@
+"""
+Chat encryption: every conversation has one random data key, stored wrapped
+(AES-GCM) under a master key from settings. Messages are AES-GCM encrypted
+with their conversation's key into a compact binary column:
+
+    nonce (12 bytes) | ciphertext | tag (16 bytes)
+
+Each wrapped key records the master key version it was wrapped under, so the
+master key can be rotated: the old one stays in CHAT_PREVIOUS_MASTER_KEYS
+until `manage.py rewrap_chat_keys` has moved every key to the current one.
+
+Unwrapped ciphers are cached in-process, so decrypting a page of history
+costs one key lookup per conversation rather than one per message.
+"""
+import hashlib
+import logging
+import os
+import threading
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+
+logger = logging.getLogger(__name__)
+
+NONCE_SIZE = 12
+KEY_CACHE_SIZE = 1024
+
+_ciphers = {}  # ConversationKey id -> AESGCM
+_pair_keys = {}  # (user_low_id, user_high_id) -> ConversationKey id
+_lock = threading.Lock()
+_masters = {}  # Master key version -> AESGCM
+
+
+class DecryptionError(Exception):
+    """A stored message or key could not be decrypted (wrong master key or corrupted data)."""
+
+
+def master_secrets():
+    """{version: secret} of the current master key and the previous ones still configured."""
+    if not settings.CHAT_MASTER_KEY:
+        raise ImproperlyConfigured("CHAT_MASTER_KEY must be set to encrypt chat messages")
+    secrets = {}
+    for entry in settings.CHAT_PREVIOUS_MASTER_KEYS:
+        version, _, secret = entry.partition('=')
+        if not version.strip().isdigit() or not secret:
+            raise ImproperlyConfigured("CHAT_PREVIOUS_MASTER_KEYS entries must look like <version>=<key>")
+        secrets[int(version)] = secret
+    secrets[settings.CHAT_MASTER_KEY_VERSION] = settings.CHAT_MASTER_KEY
+    return secrets
+
+
+def master_key(version=None):
+    """32-byte key-encryption key of a version (default: the current one)."""
+    version = settings.CHAT_MASTER_KEY_VERSION if version is None else version
+    secret = master_secrets().get(version)
+    if secret is None:
+        raise ImproperlyConfigured(f"No chat master key configured for version {version}")
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def _master_cipher(version=None):
+    version = settings.CHAT_MASTER_KEY_VERSION if version is None else version
+    master = _masters.get(version)
+    if master is None:
+        master = _masters[version] = AESGCM(master_key(version))
+    return master
+
+
+def wrap_key(data_key):
+    """(wrapped key, version): data_key encrypted under the current master key."""
+    nonce = os.urandom(NONCE_SIZE)
+    wrapped = nonce + _master_cipher().encrypt(nonce, data_key, b"conversation-key")
+    return wrapped, settings.CHAT_MASTER_KEY_VERSION
+
+
+def generate_wrapped_key():
+    """(wrapped key, version) of a new random data key."""
+    return wrap_key(AESGCM.generate_key(bit_length=256))
+
+
+def unwrap_data_key(wrapped_key, version):
+    wrapped_key = bytes(wrapped_key)
+    try:
+        return _master_cipher(version).decrypt(wrapped_key[:NONCE_SIZE], wrapped_key[NONCE_SIZE:], b"conversation-key")
+    except (InvalidTag, ValueError) as e:
+        raise DecryptionError(f"Conversation key does not open with master key version {version}") from e
+
+
+def unwrap_key(wrapped_key, version):
+    return AESGCM(unwrap_data_key(wrapped_key, version))
+
+
+def rewrap(key):
+    """Re-wrap a ConversationKey under the current master key; returns whether it changed."""
+    if key.key_version == settings.CHAT_MASTER_KEY_VERSION:
+        return False
+    key.wrapped_key, key.key_version = wrap_key(unwrap_data_key(key.wrapped_key, key.key_version))
+    return True
+
+
+def pair_aad(user_a_id, user_b_id):
+    """Bind ciphertexts to their conversation so rows cannot be moved between chats."""
+    low, high = sorted((user_a_id, user_b_id))
+    return f"{low}:{high}".encode()
+
+
+def encrypt(cipher, plain_text, aad):
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + cipher.encrypt(nonce, plain_text.encode(), aad)
+
+
+def decrypt(cipher, data, aad):
+    data = bytes(data)
+    return cipher.decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], aad).decode()
+
+
+def _remember(key):
+    """Cipher of a ConversationKey row, cached once the row is known to be committed."""
+    cipher = unwrap_key(key.wrapped_key, key.key_version)
+
+    def cache():
+        with _lock:
+            if len(_ciphers) >= KEY_CACHE_SIZE:
+                _ciphers.clear()
+                _pair_keys.clear()
+            _ciphers[key.id] = cipher
+            _pair_keys[(key.user_low_id, key.user_high_id)] = key.id
+
+    # A key created in a transaction that rolls back must not be reused (nor its id, which may be)
+    transaction.on_commit(cache)
+    return cipher
+
+
+def cipher_for_key(key_id):
+    cipher = _ciphers.get(key_id)
+    if cipher is None:
+        from .models import ConversationKey
+        cipher = _remember(ConversationKey.objects.get(id=key_id))
+    return cipher
+
+
+def key_for_pair(user_a_id, user_b_id):
+    """(key id, cipher) of the conversation between two users, creating the key on first use."""
+    low, high = sorted((user_a_id, user_b_id))
+    key_id = _pair_keys.get((low, high))
+    if key_id is not None and key_id in _ciphers:
+        return key_id, _ciphers[key_id]
+
+    from .models import ConversationKey
+    wrapped_key, version = generate_wrapped_key()
+    try:
+        key, _ = ConversationKey.objects.get_or_create(
+            user_low_id=low, user_high_id=high,
+            defaults={'wrapped_key': wrapped_key, 'key_version': version},
+        )
+    except IntegrityError:
+        key = ConversationKey.objects.get(user_low_id=low, user_high_id=high)  # Created concurrently
+    return key.id, _remember(key)
+
+
+def encrypt_message(message, plain_text):
+    """Set message.conversation_key and message.ciphertext for plain_text."""
+    key_id, cipher = key_for_pair(message.sender_id, message.receiver_id)
+    message.conversation_key_id = key_id
+    message.ciphertext = encrypt(cipher, plain_text, pair_aad(message.sender_id, message.receiver_id))
+
+
+def decrypt_message(message):
+    """Plain text of a message; raises DecryptionError (and logs it) if it does not decrypt."""
+    if message.ciphertext is None or message.conversation_key_id is None:
+        return ""
+    try:
+        if message.conversation_key_id not in _ciphers and message._meta.get_field('conversation_key').is_cached(message):
+            cipher = _remember(message.conversation_key)  # Loaded alongside the message
+        else:
+            cipher = cipher_for_key(message.conversation_key_id)
+        return decrypt(cipher, message.ciphertext, pair_aad(message.sender_id, message.receiver_id))
+    except (DecryptionError, InvalidTag, ValueError) as e:
+        logger.error("Chat message %s (key %s) could not be decrypted", message.pk, message.conversation_key_id)
+        if isinstance(e, DecryptionError):
+            raise
+        raise DecryptionError(f"Message {message.pk} could not be decrypted") from e
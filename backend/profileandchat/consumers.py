@@ -1,39 +1,102 @@
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
-from .models import Message
+from . import message_pipeline, read_receipts
 from asgiref.sync import sync_to_async
 
 User = get_user_model()
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Every frame sent to the client has a "type": "chat_message", "read_receipt"
+    or "error".
+    """
+
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
 
+        # Room names are "<user id>_<user id>" (see get_or_create_room); both users are loaded once here
+        self.participant_ids = await self.load_participants()
+        if self.participant_ids is None:
+            await self.close()
+            return
+        # Whose socket this is, so their own read receipts aren't echoed back to them
+        self.user_id = self.resolve_sender(self.query_params())
+
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
+    async def load_participants(self):
+        try:
+            ids = {int(part) for part in self.room_name.split('_')}
+        except ValueError:
+            return None
+        if len(ids) != 2:
+            return None
+
+        existing = await sync_to_async(
+            lambda: set(User.objects.filter(id__in=ids).values_list('id', flat=True))
+        )()
+        if existing != ids:
+            return None
+
+        # An authenticated socket always speaks as its own user
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated and user.id not in ids:
+            return None
+        return ids
+
+    def query_params(self):
+        """?user_id=N identifies an unauthenticated socket, as sender_id does in its frames."""
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        return {'sender_id': query['user_id'][0]} if 'user_id' in query else {}
+
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if getattr(self, 'participant_ids', None):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    def resolve_sender(self, data):
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            return user.id
+        try:
+            sender_id = int(data['sender_id'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return sender_id if sender_id in self.participant_ids else None
+
+    async def send_error(self, error):
+        await self.send(text_data=json.dumps({'type': 'error', 'error': error}))
 
     async def receive(self, text_data):
         data = json.loads(text_data)
-        message_text = data['message']
-        sender_id = data['sender_id']
-        receiver_id = data['receiver_id']
-
-        # Save encrypted message to DB
-        sender = await sync_to_async(User.objects.get)(id=sender_id)
-        receiver = await sync_to_async(User.objects.get)(id=receiver_id)
-        
-        # Create message instance
-        message = Message(sender=sender, receiver=receiver)
-        message.set_text(message_text)  # This will encrypt the text
-        await sync_to_async(message.save)()
-
-        # Mark previous messages as read by receiver
-        await self.mark_messages_as_read(sender_id, receiver_id)
+        sender_id = self.resolve_sender(data)
+        if sender_id is None:
+            await self.send_error('Sender is not part of this chat')
+            return
+        if self.user_id is None:
+            self.user_id = sender_id
+        receiver_id = next(user_id for user_id in self.participant_ids if user_id != sender_id)
+
+        # {"type": "read", "message_id": N}: the sender has read the chat up to message N
+        if data.get('type') == 'read':
+            try:
+                message_id = int(data['message_id'])
+            except (KeyError, TypeError, ValueError):
+                await self.send_error('message_id required')
+                return
+            read_receipts.report(sender_id, receiver_id, message_id)
+            return
+
+        message_text = data.get('message')
+        if not isinstance(message_text, str) or not message_text:
+            await self.send_error('message required')
+            return
+
+        # Save encrypted message and update the conversation summaries, in one transaction
+        message = await message_pipeline.save_message(sender_id, receiver_id, message_text)
 
         # Broadcast to room
         await self.channel_layer.group_send(
@@ -48,23 +111,22 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }
         )
 
-    async def mark_messages_as_read(self, sender_id, receiver_id):
-        """Mark messages from sender to receiver as read"""
-        def mark_read():
-            Message.objects.filter(
-                sender_id=sender_id,
-                receiver_id=receiver_id,
-                is_read=False
-            ).update(is_read=True)
-        
-        await sync_to_async(mark_read)()
-
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
+            'type': 'chat_message',
             'message': event['message'],
             'sender_id': event['sender_id'],
             'receiver_id': event['receiver_id'],
             'timestamp': event['timestamp'],
             'message_id': event.get('message_id'),
             'is_read': event.get('is_read', False)
-        }))
\ No newline at end of file
+        }))
+
+    async def read_receipt(self, event):
+        if event['reader_id'] == self.user_id:
+            return  # The reader knows what they have read
+        await self.send(text_data=json.dumps({
+            'type': 'read_receipt',
+            'reader_id': event['reader_id'],
+            'last_read_id': event['last_read_id'],
+        }))
@@ -0,0 +1,97 @@
+# services/conversation_service.py
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Max
+from .models import ConversationSummary, Message
+
+
+def visible_messages(owner_id, peer_id):
+    """Messages between the two users that `owner` has not deleted."""
+    return Message.objects.filter(
+        Q(sender_id=owner_id, receiver_id=peer_id, is_deleted_by_sender=False) |
+        Q(sender_id=peer_id, receiver_id=owner_id, is_deleted_by_receiver=False)
+    )
+
+
+def unread_messages(owner_id, peer_id, last_read_id):
+    return Message.objects.filter(
+        sender_id=peer_id,
+        receiver_id=owner_id,
+        id__gt=last_read_id,
+        is_deleted_by_receiver=False
+    )
+
+
+def rebuild(owner_id, peer_id):
+    """Recompute one side of a conversation from the message table."""
+    last_read_id = ConversationSummary.objects.filter(
+        owner_id=owner_id, peer_id=peer_id
+    ).values_list('last_read_id', flat=True).first() or 0
+    last_msg = visible_messages(owner_id, peer_id).order_by('-timestamp', '-id').first()
+
+    defaults = {
+        'last_message': last_msg,
+        'last_message_at': last_msg.timestamp if last_msg else None,
+        'unread_count': unread_messages(owner_id, peer_id, last_read_id).count(),
+    }
+    try:
+        ConversationSummary.objects.update_or_create(owner_id=owner_id, peer_id=peer_id, defaults=defaults)
+    except IntegrityError:
+        # Created concurrently by the other side's first message
+        ConversationSummary.objects.filter(owner_id=owner_id, peer_id=peer_id).update(**defaults)
+
+
+def record_message(message):
+    """
+    Point both sides at a newly sent message. The receiver gets one more unread;
+    the sender has evidently seen the chat, so their side is read up to here.
+    """
+    sender_side = ConversationSummary.objects.filter(owner_id=message.sender_id, peer_id=message.receiver_id).update(
+        last_message=message,
+        last_message_at=message.timestamp,
+        last_read_id=message.id,
+        unread_count=0,
+    )
+    if not sender_side:
+        rebuild(message.sender_id, message.receiver_id)  # First message of the pair
+
+    receiver_side = ConversationSummary.objects.filter(owner_id=message.receiver_id, peer_id=message.sender_id).update(
+        last_message=message,
+        last_message_at=message.timestamp,
+        unread_count=F('unread_count') + 1,
+    )
+    if not receiver_side:
+        rebuild(message.receiver_id, message.sender_id)
+
+
+def advance_watermark(reader_id, peer_id, message_id):
+    """
+    Record that `reader` has read everything `peer` sent up to message_id.
+    Returns the new watermark, or None when it did not move.
+    """
+    # Never past the peer's newest message, whatever the client claims
+    last_read_id = Message.objects.filter(
+        sender_id=peer_id, receiver_id=reader_id, id__lte=message_id
+    ).aggregate(last=Max('id'))['last']
+    if last_read_id is None:
+        return None
+
+    with transaction.atomic():
+        moved = ConversationSummary.objects.filter(
+            owner_id=reader_id, peer_id=peer_id, last_read_id__lt=last_read_id
+        ).update(last_read_id=last_read_id)
+        if not moved:
+            return None
+        ConversationSummary.objects.filter(owner_id=reader_id, peer_id=peer_id).update(
+            unread_count=unread_messages(reader_id, peer_id, last_read_id).count()
+        )
+    return last_read_id
+
+
+def watermarks(user_a_id, user_b_id):
+    """{reader id: last read message id} for both sides of a conversation."""
+    marks = dict.fromkeys((user_a_id, user_b_id), 0)
+    marks.update(ConversationSummary.objects.filter(
+        Q(owner_id=user_a_id, peer_id=user_b_id) | Q(owner_id=user_b_id, peer_id=user_a_id)
+    ).values_list('owner_id', 'last_read_id'))
+    return marks
@@ -1,36 +1,48 @@
 # services/leaderboard_service.py
 
-from django.db.models import Count, Q, F, ExpressionWrapper, FloatField
+from django.db import connection
+from django.db.models import Q, F, Sum, ExpressionWrapper, FloatField
 from django.db.models.functions import Coalesce, NullIf
 from django.utils import timezone
-from datetime import timedelta
-from analyze_responses.models import Task, Habit
+from datetime import date, timedelta
+from analyze_responses.models import DailyCompletion, Habit
 from django.contrib.auth import get_user_model
+from .models import LeaderboardEntry, Friendship
 
 User = get_user_model()
 
-def calculate_completion_rate(period):
-    today = timezone.now().date()
+PERIODS = ('weekly', 'monthly', 'all_time')
+ALL_TIME_START = date(1970, 1, 1)
+UPSERT_BATCH_SIZE = 1000
+TOP_COUNT = 100
+RANK_COUNT_LIMIT = 10000  # Entries counted at most when ranking a user outside the top 100
+
+
+def period_start(period, today=None):
+    today = today or timezone.now().date()
 
     if period == 'weekly':
-        start_date = today - timedelta(days=today.weekday())  # Monday
+        return today - timedelta(days=today.weekday())  # Monday
     elif period == 'monthly':
-        start_date = today.replace(day=1)
+        return today.replace(day=1)
+    return ALL_TIME_START  # all_time
+
+
+def calculate_completion_rate(period):
+    """Rank every user from the daily completion rollup (full recompute, used to rebuild the store)."""
+    today = timezone.now().date()
+
+    if period in ('weekly', 'monthly'):
+        start_date = period_start(period, today)
     else:  # all_time
         start_date = None
 
+    window = Q(daily_completions__date__lte=today) & (
+        Q(daily_completions__date__gte=start_date) if start_date else Q()
+    )
     users = User.objects.annotate(
-        total_tasks=Count(
-            'habits__tasks',
-            filter=Q(habits__tasks__date__lte=today) &
-                   (Q(habits__tasks__date__gte=start_date) if start_date else Q())
-        ),
-        completed_tasks=Count(
-            'habits__tasks',
-            filter=Q(habits__tasks__isCompleted=True) &
-                   Q(habits__tasks__date__lte=today) &
-                   (Q(habits__tasks__date__gte=start_date) if start_date else Q())
-        )
+        total_tasks=Coalesce(Sum('daily_completions__total', filter=window), 0),
+        completed_tasks=Coalesce(Sum('daily_completions__completed', filter=window), 0)
     ).annotate(
         completion_rate=Coalesce(
             ExpressionWrapper(
@@ -43,3 +55,218 @@ def calculate_completion_rate(period):
     ).order_by('-completion_rate', '-completed_tasks', 'date_joined')
 
     return users
+
+
+def _rate(completed, total):
+    return 100.0 * completed / total if total else 0.0
+
+
+def _upsert(entries, extra_fields=()):
+    """Insert or overwrite (user, period) rows in one statement per batch."""
+    options = {}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['user', 'period']
+    LeaderboardEntry.objects.bulk_create(
+        entries,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        update_fields=['period_start', 'total_tasks', 'completed_tasks',
+                       'completion_rate', 'user_joined', 'computed_on', *extra_fields],
+        **options
+    )
+
+
+def rebuild(period):
+    """Recompute the stored scores of every user for one period, and snapshot their ranks."""
+    today = timezone.now().date()
+    start = period_start(period, today)
+    rows = calculate_completion_rate(period).values_list(
+        'id', 'date_joined', 'total_tasks', 'completed_tasks', 'completion_rate'
+    )
+    _upsert([
+        LeaderboardEntry(
+            user_id=user_id,
+            period=period,
+            period_start=start,
+            total_tasks=total,
+            completed_tasks=completed,
+            completion_rate=rate,
+            user_joined=joined,
+            computed_on=today,
+            rebuilt_rank=rank,
+        )
+        for rank, (user_id, joined, total, completed, rate) in enumerate(rows.iterator(), start=1)
+    ], extra_fields=['rebuilt_rank'])
+
+
+def refresh_user(user):
+    """Recompute one user's scores for all periods with a single aggregate query."""
+    refresh_users([user])
+
+
+def refresh_users(users):
+    """Recompute the scores of several users: one aggregate query grouped by user, one upsert."""
+    if not users:
+        return
+    today = timezone.now().date()
+    starts = {period: period_start(period, today) for period in PERIODS}
+
+    counts = {}
+    for period in PERIODS:
+        window = Q(date__gte=starts[period])
+        counts[f'{period}_total'] = Coalesce(Sum('total', filter=window), 0)
+        counts[f'{period}_completed'] = Coalesce(Sum('completed', filter=window), 0)
+    rows = DailyCompletion.objects.filter(
+        user__in=[user.pk for user in users], date__lte=today,
+    ).values('user').annotate(**counts).order_by()
+    by_user = {row['user']: row for row in rows}
+    empty = dict.fromkeys(counts, 0)
+
+    entries = []
+    for user in users:
+        totals = by_user.get(user.pk, empty)
+        entries.extend(
+            LeaderboardEntry(
+                user_id=user.pk,
+                period=period,
+                period_start=starts[period],
+                total_tasks=totals[f'{period}_total'],
+                completed_tasks=totals[f'{period}_completed'],
+                completion_rate=_rate(totals[f'{period}_completed'], totals[f'{period}_total']),
+                user_joined=user.date_joined,
+                computed_on=today,
+            )
+            for period in PERIODS
+        )
+    _upsert(entries)
+
+
+def apply_deltas(user_id, deltas):
+    """
+    Add completed/total changes of single days, {day: (completed, total)}, to the
+    user's entries of the served windows, usually in one UPDATE. Returns False
+    when an entry isn't there to adjust (missing, or counted on an earlier day),
+    so the caller recomputes the user instead.
+    """
+    today = timezone.now().date()
+    changes = {}  # (completed, total) -> periods whose window sees that change
+    for period in PERIODS:
+        start = period_start(period, today)
+        completed = sum(change[0] for day, change in deltas.items() if start <= day <= today)
+        total = sum(change[1] for day, change in deltas.items() if start <= day <= today)
+        if completed or total:
+            changes.setdefault((completed, total), []).append((period, start))
+
+    for (completed, total), windows in changes.items():
+        window = Q()
+        for period, start in windows:
+            window |= Q(period=period, period_start=start)
+        updated = LeaderboardEntry.objects.filter(window, user_id=user_id, computed_on=today).update(
+            # Assigned first: MySQL evaluates SET left to right, so later ones see the new counts
+            completion_rate=Coalesce(
+                ExpressionWrapper(
+                    100.0 * (F('completed_tasks') + completed) / NullIf(F('total_tasks') + total, 0),
+                    output_field=FloatField()
+                ),
+                0.0,
+                output_field=FloatField()
+            ),
+            completed_tasks=F('completed_tasks') + completed,
+            total_tasks=F('total_tasks') + total,
+        )
+        if updated < len(windows):
+            return False
+    return True
+
+
+def served_start(period):
+    """
+    Window of the period that today falls in. Requests never rebuild the store:
+    `manage.py rebuild_leaderboard --watch` (started by start.sh) fills the new
+    week/month at midnight; until then it holds only the users refreshed since.
+    """
+    return period_start(period)
+
+
+def current_entries(period):
+    """Stored entries of the served window, in rank order."""
+    return LeaderboardEntry.objects.filter(
+        period=period,
+        period_start=served_start(period),
+    ).order_by('-completion_rate', '-completed_tasks', 'user_joined')
+
+
+def get_entry(user, period):
+    """The user's stored entry (refreshed alone if missing or stale), or None outside the served window."""
+    entry = current_entries(period).filter(user=user).first()
+    if entry is None or entry.computed_on != timezone.now().date():
+        refresh_user(user)
+        entry = current_entries(period).filter(user=user).first()
+    return entry
+
+
+def _ahead(entry):
+    return (
+        Q(completion_rate__gt=entry.completion_rate) |
+        Q(completion_rate=entry.completion_rate, completed_tasks__gt=entry.completed_tasks) |
+        Q(completion_rate=entry.completion_rate, completed_tasks=entry.completed_tasks,
+          user_joined__lt=entry.user_joined)
+    )
+
+
+def get_rank(entry, limit=None):
+    """
+    1-based rank of an entry. Up to `limit` it is exact: counting the entries ahead
+    walks the rank index, so the cost grows with the rank. Further down, the rank
+    is read from the nightly snapshot (`rebuilt_rank`) of the entry next to this
+    one in rank order, found with one index seek; it drifts from the exact rank by
+    the moves other users made since the rebuild, and is never reported above
+    `limit` + 1.
+    """
+    if limit is None:
+        limit = RANK_COUNT_LIMIT
+    others = current_entries(entry.period).exclude(pk=entry.pk)
+    ahead = others.filter(_ahead(entry)).order_by()[:limit + 1].count()
+    if ahead <= limit:
+        return ahead + 1
+
+    def counted(neighbour_rank):
+        # Whether the snapshot already had this entry ahead of the neighbour
+        return entry.rebuilt_rank is not None and entry.rebuilt_rank < neighbour_rank
+
+    ranked = others.filter(rebuilt_rank__isnull=False)
+    behind = ranked.exclude(_ahead(entry)).values_list('rebuilt_rank', flat=True).first()
+    if behind is not None:
+        rank = behind - 1 if counted(behind) else behind
+    else:
+        # Last in the table: just past the lowest snapshot rank ahead
+        last = ranked.filter(_ahead(entry)).reverse().values_list('rebuilt_rank', flat=True).first() or 0
+        rank = last if counted(last) else last + 1
+    return max(rank, limit + 1)
+
+
+def get_top(period, limit=None):
+    return list(current_entries(period).select_related('user__profile')[:limit or TOP_COUNT])
+
+
+def circle(user):
+    """The user and their friends."""
+    return Q(user=user) | Q(user_id__in=Friendship.objects.filter(user=user).values('friend_id'))
+
+
+def get_friends_ranking(user, period):
+    """
+    Stored entries of the user and their friends, in rank order. Members whose
+    entries are missing, from an earlier day or from an earlier window are
+    recomputed together, never the whole table.
+    """
+    today = timezone.now().date()
+    fresh = LeaderboardEntry.objects.filter(
+        period=period, period_start=served_start(period), computed_on=today,
+    ).values('user_id')
+    stale = User.objects.filter(
+        Q(pk=user.pk) | Q(pk__in=Friendship.objects.filter(user=user).values('friend_id'))
+    ).exclude(pk__in=fresh).only('pk', 'date_joined')
+    refresh_users(list(stale))
+
+    return list(current_entries(period).filter(circle(user)).select_related('user__profile'))
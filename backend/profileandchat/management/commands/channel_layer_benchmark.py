@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from profileandchat.channel_layer import SQLiteChannelLayer
+
+GROUP = "benchmark"
+
+
+def _receiver(path, receivers, messages, capacity, ready, results):
+    """One ASGI-worker stand-in: `receivers` sockets in the group, counting what reaches them."""
+    async def run():
+        layer = SQLiteChannelLayer(path=path, capacity=capacity)
+        channels = [await layer.new_channel() for _ in range(receivers)]
+        for channel in channels:
+            await layer.group_add(GROUP, channel)
+        ready.release()
+
+        async def drain(channel):
+            received, last = 0, time.time()
+            while received < messages:
+                try:
+                    await asyncio.wait_for(layer.receive(channel), timeout=5)
+                except asyncio.TimeoutError:
+                    break  # Nothing more is coming: the rest was dropped as over capacity
+                received, last = received + 1, time.time()
+            return received, last
+
+        counts = await asyncio.gather(*(drain(channel) for channel in channels))
+        await layer.close()
+        return sum(count for count, _ in counts), max(finished for _, finished in counts)
+
+    results.put(asyncio.run(run()))
+
+
+class Command(BaseCommand):
+    help = "Measure group_send fan-out throughput of the SQLite channel layer across worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Receiving processes")
+        parser.add_argument('--receivers', type=int, default=25, help="Channels (sockets) per process")
+        parser.add_argument('--messages', type=int, default=200, help="Messages sent to the group")
+        parser.add_argument('--capacity', type=int, default=100, help="Per-channel capacity")
+        parser.add_argument('--path', help="Database file (default: a fresh temporary file)")
+
+    def handle(self, *args, **options):
+        workers, receivers, messages = options['workers'], options['receivers'], options['messages']
+        path = options['path'] or os.path.join(tempfile.mkdtemp(), 'channels-benchmark.sqlite3')
+
+        context = multiprocessing.get_context('spawn')
+        ready = context.Semaphore(0)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_receiver,
+                args=(path, receivers, messages, options['capacity'], ready, results),
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.acquire()
+
+        async def publish():
+            layer = SQLiteChannelLayer(path=path, capacity=options['capacity'])
+            started = time.time()
+            for index in range(messages):
+                await layer.group_send(GROUP, {'type': 'chat.message', 'index': index})
+            sent = time.time()
+            await layer.close()
+            return started, sent
+
+        started, sent = asyncio.run(publish())
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        expected = workers * receivers * messages
+        delivered = sum(count for count, _ in outcomes)
+        elapsed = max(finished for _, finished in outcomes) - started
+
+        self.stdout.write(f"workers={workers} receivers/worker={receivers} messages={messages}")
+        self.stdout.write(f"group_send: {messages / (sent - started):.0f} msg/s")
+        self.stdout.write(
+            f"delivered {delivered}/{expected} in {elapsed:.2f}s "
+            f"({delivered / elapsed:.0f} deliveries/s)"
+        )
+        if delivered < expected:
+            self.stdout.write(self.style.WARNING(
+                f"{expected - delivered} deliveries dropped at channel capacity (backpressure)"
+            ))
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+from profileandchat.consumers import ChatConsumer
+from profileandchat.models import ConversationSummary, Message
+
+User = get_user_model()
+
+
+class PerFrameChatConsumer(ChatConsumer):
+    """The previous receive(): four thread hops per frame, used as the baseline."""
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        sender = await sync_to_async(User.objects.get)(id=data['sender_id'])
+        receiver = await sync_to_async(User.objects.get)(id=data['receiver_id'])
+
+        message = Message(sender=sender, receiver=receiver)
+
+        def save():
+            message.set_text(data['message'])  # Looks up the conversation key
+            message.save()
+
+        await sync_to_async(save)()
+        # Stands in for the blanket is_read UPDATE it used to run
+        await sync_to_async(
+            ConversationSummary.objects.filter(owner_id=receiver.id, peer_id=sender.id).update
+        )(unread_count=0)
+
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'chat_message',
+            'message': data['message'],
+            'sender_id': sender.id,
+            'receiver_id': receiver.id,
+            'timestamp': message.timestamp.isoformat(),
+            'message_id': message.id,
+        })
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the chat consumer in this process: concurrent sockets each send messages and wait "
+        "for the broadcast; reports messages/second for the old per-frame path and the pipeline. "
+        "Creates throwaway users in the configured database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=10, help="Concurrent chats (one socket each)")
+        parser.add_argument('--messages', type=int, default=50, help="Messages sent per socket")
+        parser.add_argument('--window', type=float, default=0.005, help="Group commit window for the last run")
+
+    def handle(self, *args, **options):
+        users = [
+            User.objects.create_user(email=f'chat-load-{i}@example.invalid', full_name=f'Load {i}', password=None)
+            for i in range(options['rooms'] + 1)
+        ]
+        try:
+            # Keep the channel layer out of the measurement
+            with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}):
+                runs = [
+                    ('per-frame (before)', PerFrameChatConsumer, 0.0),
+                    ('pipeline', ChatConsumer, 0.0),
+                    (f"pipeline + group commit {options['window'] * 1000:g}ms", ChatConsumer, options['window']),
+                ]
+                for label, consumer, window in runs:
+                    with override_settings(CHAT_GROUP_COMMIT_WINDOW=window):
+                        rate = asyncio.run(self.run(consumer, users, options['messages']))
+                    self.stdout.write(f"{label:<32} {rate:>8.0f} msg/s")
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    async def run(self, consumer, users, messages):
+        application = URLRouter([path("ws/chat/<str:room_name>/", consumer.as_asgi())])
+        hub, peers = users[0], users[1:]
+
+        async def chat(peer):
+            low, high = sorted([hub.id, peer.id])
+            socket = ApplicationCommunicator(application, {
+                'type': 'websocket',
+                'path': f"/ws/chat/{low}_{high}/",
+                'headers': [],
+                'subprotocols': [],
+            })
+            await socket.send_input({'type': 'websocket.connect'})
+            accepted = await socket.receive_output(timeout=30)
+            assert accepted['type'] == 'websocket.accept', "consumer rejected the load test socket"
+            for index in range(messages):
+                await socket.send_input({'type': 'websocket.receive', 'text': json.dumps({
+                    'message': f'load test {index}',
+                    'sender_id': peer.id,
+                    'receiver_id': hub.id,
+                })})
+                await socket.receive_output(timeout=30)  # The broadcast back to this socket
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(timeout=30)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(chat(peer) for peer in peers))
+        return len(peers) * messages / (time.perf_counter() - started)
@@ -0,0 +1,35 @@
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from profileandchat import leaderboard_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the materialized leaderboard scores and ranks. With --watch, run as a "
+        "long-lived process that rebuilds now and again just after every midnight (UTC), "
+        "when the weekly/monthly windows roll over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=leaderboard_service.PERIODS,
+            help="Only rebuild one period (default: all of them)",
+        )
+        parser.add_argument('--watch', action='store_true', help="Keep running and rebuild daily")
+
+    def handle(self, *args, **options):
+        periods = [options['period']] if options['period'] else leaderboard_service.PERIODS
+        self.rebuild(periods)
+        while options['watch']:
+            now = timezone.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+            time.sleep((midnight - now).total_seconds() + 1)
+            self.rebuild(periods)
+
+    def rebuild(self, periods):
+        for period in periods:
+            leaderboard_service.rebuild(period)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {period} leaderboard"))
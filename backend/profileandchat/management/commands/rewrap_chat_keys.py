@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from profileandchat import chat_crypto
+from profileandchat.models import ConversationKey
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-wrap every conversation key under the current chat master key "
+        "(after rotating CHAT_MASTER_KEY; see settings)."
+    )
+
+    def handle(self, *args, **options):
+        current = settings.CHAT_MASTER_KEY_VERSION
+        stale = ConversationKey.objects.exclude(key_version=current).order_by('id')
+        rewrapped = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(stale.select_for_update().filter(id__gt=last_id)[:BATCH_SIZE])
+                if not batch:
+                    break
+                for key in batch:
+                    chat_crypto.rewrap(key)
+                ConversationKey.objects.bulk_update(batch, ['wrapped_key', 'key_version'])
+            rewrapped += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-wrapped {rewrapped} conversation key(s) under master key version {current}"
+        ))
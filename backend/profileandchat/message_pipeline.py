@@ -0,0 +1,111 @@
+"""
+Persistence of inbound chat messages: one worker-thread hop and one
+transaction per message, or per burst when group commit is enabled. Each
+message still costs its own INSERT and conversation updates; group commit
+saves the thread hops and commits, not the queries.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from .models import Message
+
+
+def _store(sender_id, receiver_id, text):
+    message = Message(sender_id=sender_id, receiver_id=receiver_id)
+    message.set_text(text)  # This will encrypt the text
+    message.save()  # Also updates both conversation summaries (sending marks the chat read)
+    return message
+
+
+def store_messages(items):
+    """Save (sender_id, receiver_id, text) items in a single transaction."""
+    with transaction.atomic():
+        return [_store(*item) for item in items]
+
+
+def store_batch(items):
+    """
+    store_messages for a group commit. If the batch fails, each item is retried
+    in its own transaction so one bad frame doesn't fail the others; returns a
+    Message or the raised exception per item.
+    """
+    try:
+        return store_messages(items)
+    except Exception:
+        if len(items) == 1:
+            raise
+    results = []
+    for item in items:
+        try:
+            results.append(store_messages([item])[0])
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class MessageBatcher:
+    """
+    Group commit: messages submitted within `window` seconds of each other
+    (from any socket of this process) are written in one transaction.
+    """
+
+    def __init__(self, window, max_batch=100):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._flusher = None
+
+    async def submit(self, sender_id, receiver_id, text):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((sender_id, receiver_id, text), future))
+        if len(self._pending) >= self.max_batch:
+            await self._flush()
+        elif self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flusher = None
+        await self._flush()
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            results = await sync_to_async(store_batch)([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+_batchers = {}
+
+
+def _batcher():
+    # Futures belong to an event loop, so each loop gets its own batcher
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        _batchers.clear()
+        batcher = _batchers[loop] = MessageBatcher(
+            settings.CHAT_GROUP_COMMIT_WINDOW,
+            settings.CHAT_GROUP_COMMIT_MAX_BATCH,
+        )
+    return batcher
+
+
+async def save_message(sender_id, receiver_id, text):
+    """Persist one message; returns the Message."""
+    if settings.CHAT_GROUP_COMMIT_WINDOW > 0:
+        return await _batcher().submit(sender_id, receiver_id, text)
+    messages = await sync_to_async(store_messages)([(sender_id, receiver_id, text)])
+    return messages[0]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 14:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0005_alter_userprofile_profile_pic'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('all_time', 'All time')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('total_tasks', models.PositiveIntegerField(default=0)),
+                ('completed_tasks', models.PositiveIntegerField(default=0)),
+                ('completion_rate', models.FloatField(default=0.0)),
+                ('user_joined', models.DateTimeField()),
+                ('computed_on', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start', '-completion_rate', '-completed_tasks', 'user_joined'], name='leaderboard_rank_idx'), models.Index(fields=['period', 'computed_on'], name='leaderboard_fresh_idx')],
+                'unique_together': {('user', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 14:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def backfill_summaries(apps, schema_editor):
+    Message = apps.get_model('profileandchat', 'Message')
+    ConversationSummary = apps.get_model('profileandchat', 'ConversationSummary')
+
+    pairs = set()
+    for sender_id, receiver_id in Message.objects.values_list('sender_id', 'receiver_id').distinct():
+        pairs.add((sender_id, receiver_id))
+        pairs.add((receiver_id, sender_id))
+
+    summaries = []
+    for owner_id, peer_id in pairs:
+        last_msg = Message.objects.filter(
+            Q(sender_id=owner_id, receiver_id=peer_id, is_deleted_by_sender=False) |
+            Q(sender_id=peer_id, receiver_id=owner_id, is_deleted_by_receiver=False)
+        ).order_by('-timestamp', '-id').first()
+        unread_count = Message.objects.filter(
+            sender_id=peer_id, receiver_id=owner_id, is_read=False, is_deleted_by_receiver=False
+        ).count()
+        summaries.append(ConversationSummary(
+            owner_id=owner_id,
+            peer_id=peer_id,
+            last_message=last_msg,
+            last_message_at=last_msg.timestamp if last_msg else None,
+            unread_count=unread_count,
+        ))
+    ConversationSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0006_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profileandchat.message')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-last_message_at'], name='conversation_recent_idx')],
+                'unique_together': {('owner', 'peer')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
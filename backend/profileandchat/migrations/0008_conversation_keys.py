@@ -0,0 +1,133 @@
+# Generated by Django 5.2 on 2026-10-18 14:57
+
+import base64
+import hashlib
+import os
+import django.db.models.deletion
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+NONCE_SIZE = 12
+
+
+# chat_crypto as of this migration, frozen so later changes to it can't alter what it writes.
+# Keys written here are master key version 1 (the key_version default added in 0011).
+
+def master_cipher():
+    if settings.CHAT_MASTER_KEY_VERSION == 1:
+        secret = settings.CHAT_MASTER_KEY
+    else:
+        secret = dict(entry.partition('=')[::2] for entry in settings.CHAT_PREVIOUS_MASTER_KEYS).get('1')
+    if not secret:
+        raise ImproperlyConfigured("Re-encrypting chat history needs the version 1 chat master key")
+    return AESGCM(hashlib.sha256(secret.encode()).digest())
+
+
+def generate_wrapped_key(master):
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + master.encrypt(nonce, AESGCM.generate_key(bit_length=256), b"conversation-key")
+
+
+def unwrap_key(wrapped_key, master):
+    wrapped_key = bytes(wrapped_key)
+    return AESGCM(master.decrypt(wrapped_key[:NONCE_SIZE], wrapped_key[NONCE_SIZE:], b"conversation-key"))
+
+
+def pair_aad(user_a_id, user_b_id):
+    low, high = sorted((user_a_id, user_b_id))
+    return f"{low}:{high}".encode()
+
+
+def encrypt(cipher, plain_text, aad):
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + cipher.encrypt(nonce, plain_text.encode(), aad)
+
+
+def legacy_text(message):
+    # Per-message Fernet key and token, both stored base64 encoded a second time
+    try:
+        key = base64.urlsafe_b64decode(message.encryption_key.encode())
+        token = base64.urlsafe_b64decode(message.encrypted_text.encode())
+        return Fernet(key).decrypt(token).decode()
+    except Exception:
+        return message.encrypted_text  # Stored unencrypted, as the old model read it
+
+
+def reencrypt_messages(apps, schema_editor):
+    Message = apps.get_model('profileandchat', 'Message')
+    ConversationKey = apps.get_model('profileandchat', 'ConversationKey')
+    if not Message.objects.exists():
+        return  # Nothing to re-encrypt (e.g. a new database): don't require the key
+    master = master_cipher()
+    ciphers = {}
+
+    last_id = 0
+    while True:
+        batch = list(
+            Message.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', 'sender_id', 'receiver_id', 'encrypted_text', 'encryption_key')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for message in batch:
+            pair = tuple(sorted((message.sender_id, message.receiver_id)))
+            if pair not in ciphers:
+                key, _ = ConversationKey.objects.get_or_create(
+                    user_low_id=pair[0], user_high_id=pair[1],
+                    defaults={'wrapped_key': generate_wrapped_key(master)},
+                )
+                ciphers[pair] = (key.id, unwrap_key(key.wrapped_key, master))
+            key_id, cipher = ciphers[pair]
+            message.conversation_key_id = key_id
+            message.ciphertext = encrypt(cipher, legacy_text(message), pair_aad(*pair))
+
+        Message.objects.bulk_update(batch, ['conversation_key', 'ciphertext'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0007_conversationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wrapped_key', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user_low', 'user_high')},
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='ciphertext',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation_key',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profileandchat.conversationkey'),
+        ),
+        migrations.RunPython(reencrypt_messages, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='encrypted_text',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='encryption_key',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 15:01
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def watermarks_from_flags(apps, schema_editor):
+    # Each side is read up to the newest message its owner received with is_read set
+    Message = apps.get_model('profileandchat', 'Message')
+    ConversationSummary = apps.get_model('profileandchat', 'ConversationSummary')
+
+    newest_read = Message.objects.filter(
+        sender_id=OuterRef('peer_id'),
+        receiver_id=OuterRef('owner_id'),
+        is_read=True,
+    ).order_by('-id').values('id')[:1]
+    ConversationSummary.objects.update(last_read_id=Coalesce(Subquery(newest_read), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0009_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationsummary',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(watermarks_from_flags, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0010_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationkey',
+            name='key_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
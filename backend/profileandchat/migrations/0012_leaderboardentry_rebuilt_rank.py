@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profileandchat', '0011_conversationkey_key_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='rebuilt_rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,7 @@
 from django.db import models
 from django.conf import settings
-from cryptography.fernet import Fernet
-import base64
-import os
 from cloudinary_storage.storage import MediaCloudinaryStorage
+from . import chat_crypto
 
 
 class UserProfile(models.Model):
@@ -45,61 +43,72 @@ class Friendship(models.Model):
     class Meta:
         unique_together = ('user', 'friend')
 
-class ChatEncryption:
-    @staticmethod
-    def generate_key():
-        return Fernet.generate_key()
-    
-    @staticmethod
-    def encrypt_message(message, key):
-        f = Fernet(key)
-        encrypted_message = f.encrypt(message.encode())
-        return base64.urlsafe_b64encode(encrypted_message).decode()
-    
-    @staticmethod
-    def decrypt_message(encrypted_message, key):
-        try:
-            f = Fernet(key)
-            decoded_message = base64.urlsafe_b64decode(encrypted_message.encode())
-            decrypted_message = f.decrypt(decoded_message)
-            return decrypted_message.decode()
-        except:
-            return encrypted_message  # Return as is if decryption fails
+class LeaderboardEntry(models.Model):
+    """Materialized completion score of one user for one leaderboard period."""
+    PERIOD_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('all_time', 'All time'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='leaderboard_entries', on_delete=models.CASCADE)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()  # Window the scores belong to
+    total_tasks = models.PositiveIntegerField(default=0)
+    completed_tasks = models.PositiveIntegerField(default=0)
+    completion_rate = models.FloatField(default=0.0)
+    user_joined = models.DateTimeField()  # Copy of date_joined, used as the final tie-breaker
+    computed_on = models.DateField()  # Day the counts were taken (tasks are counted up to that day)
+    rebuilt_rank = models.PositiveIntegerField(null=True, blank=True)  # Rank at the last full rebuild
+
+    class Meta:
+        unique_together = ('user', 'period')
+        indexes = [
+            models.Index(
+                fields=['period', 'period_start', '-completion_rate', '-completed_tasks', 'user_joined'],
+                name='leaderboard_rank_idx',
+            ),
+            models.Index(fields=['period', 'computed_on'], name='leaderboard_fresh_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.period}: {self.completion_rate}"
+
+class ConversationKey(models.Model):
+    """Data key of the conversation between two users, wrapped under the master key (see chat_crypto)."""
+    user_low = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    wrapped_key = models.BinaryField()
+    key_version = models.PositiveSmallIntegerField(default=1)  # Master key version it is wrapped under
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
 
 class Message(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_messages')
-    encrypted_text = models.TextField()  # Store encrypted message
+    conversation_key = models.ForeignKey(ConversationKey, null=True, on_delete=models.CASCADE, related_name='+')
+    ciphertext = models.BinaryField(null=True)  # nonce | AES-GCM ciphertext | tag
     timestamp = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
     is_deleted_by_sender = models.BooleanField(default=False)
     is_deleted_by_receiver = models.BooleanField(default=False)
-    encryption_key = models.TextField()  # Store encryption key
 
     class Meta:
         ordering = ['timestamp']
-
-    def save(self, *args, **kwargs):
-        if not self.encryption_key:
-            self.encryption_key = base64.urlsafe_b64encode(ChatEncryption.generate_key()).decode()
-        super().save(*args, **kwargs)
+        indexes = [
+            # History pages are id ranges within one conversation
+            models.Index(fields=['conversation_key', 'id'], name='message_history_idx'),
+        ]
 
     @property
     def text(self):
         """Decrypt and return the message text"""
-        try:
-            key = base64.urlsafe_b64decode(self.encryption_key.encode())
-            return ChatEncryption.decrypt_message(self.encrypted_text, key)
-        except:
-            return self.encrypted_text
+        return chat_crypto.decrypt_message(self)
 
     def set_text(self, plain_text):
-        """Encrypt and set the message text"""
-        if not self.encryption_key:
-            self.encryption_key = base64.urlsafe_b64encode(ChatEncryption.generate_key()).decode()
-        
-        key = base64.urlsafe_b64decode(self.encryption_key.encode())
-        self.encrypted_text = ChatEncryption.encrypt_message(plain_text, key)
+        """Encrypt and set the message text (sender and receiver must be set first)"""
+        chat_crypto.encrypt_message(self, plain_text)
 
     def is_visible_to_user(self, user):
         """Check if message is visible to the user (not deleted by them)"""
@@ -107,4 +116,25 @@ class Message(models.Model):
             return not self.is_deleted_by_sender
         elif user == self.receiver:
             return not self.is_deleted_by_receiver
-        return False
\ No newline at end of file
+        return False
+
+class ConversationSummary(models.Model):
+    """
+    One side of a conversation: what `owner` sees of their chat with `peer`.
+    Kept up to date on every message so the friend list needs no per-friend queries.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
+    peer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='peer_conversations')
+    last_message = models.ForeignKey(Message, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_id = models.BigIntegerField(default=0)  # Owner has read the peer's messages up to this id
+
+    class Meta:
+        unique_together = ('owner', 'peer')
+        indexes = [
+            models.Index(fields=['owner', '-last_message_at'], name='conversation_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} -> {self.peer_id} ({self.unread_count} unread)"
@@ -0,0 +1,85 @@
+"""
+Read receipts: clients report "read up to message id"; reports for the same
+conversation side arriving within CHAT_READ_RECEIPT_WINDOW seconds are
+coalesced into one watermark write and one receipt event to the room.
+"""
+import asyncio
+import logging
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from . import conversation_service
+
+logger = logging.getLogger(__name__)
+
+
+def room_group_name(user_a_id, user_b_id):
+    low, high = sorted((user_a_id, user_b_id))
+    return f'chat_{low}_{high}'
+
+
+def receipt_event(reader_id, last_read_id):
+    return {
+        'type': 'read_receipt',
+        'reader_id': reader_id,
+        'last_read_id': last_read_id,
+    }
+
+
+def mark_read(reader_id, peer_id, message_id):
+    """Advance the watermark from sync code (views) and notify the room."""
+    last_read_id = conversation_service.advance_watermark(reader_id, peer_id, message_id)
+    if last_read_id is not None:
+        async_to_sync(get_channel_layer().group_send)(
+            room_group_name(reader_id, peer_id), receipt_event(reader_id, last_read_id)
+        )
+    return last_read_id
+
+
+def _advance_all(reports):
+    return {
+        side: conversation_service.advance_watermark(*side, message_id)
+        for side, message_id in reports.items()
+    }
+
+
+class ReceiptCoalescer:
+    def __init__(self, window):
+        self.window = window
+        self._pending = {}  # (reader_id, peer_id) -> highest reported message id
+        self._flusher = None
+
+    def report(self, reader_id, peer_id, message_id):
+        side = (reader_id, peer_id)
+        self._pending[side] = max(message_id, self._pending.get(side, 0))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flusher = None
+        reports, self._pending = self._pending, {}
+
+        try:
+            advanced = await sync_to_async(_advance_all)(reports)
+            channel_layer = get_channel_layer()
+            for (reader_id, peer_id), last_read_id in advanced.items():
+                if last_read_id is not None:
+                    await channel_layer.group_send(
+                        room_group_name(reader_id, peer_id), receipt_event(reader_id, last_read_id)
+                    )
+        except Exception:
+            logger.exception("Failed to record read receipts")
+
+
+_coalescers = {}
+
+
+def report(reader_id, peer_id, message_id):
+    """Queue a read report from a socket; written and pushed after the coalescing window."""
+    loop = asyncio.get_running_loop()
+    coalescer = _coalescers.get(loop)
+    if coalescer is None:
+        _coalescers.clear()
+        coalescer = _coalescers[loop] = ReceiptCoalescer(settings.CHAT_READ_RECEIPT_WINDOW)
+    coalescer.report(reader_id, peer_id, message_id)
@@ -4,8 +4,9 @@ from app_frontend.models import CustomUser  # adjust if needed
 
 class MessageSerializer(serializers.ModelSerializer):
     message = serializers.SerializerMethodField()
-    sender_id = serializers.IntegerField(source='sender.id')
-    receiver_id = serializers.IntegerField(source='receiver.id')
+    is_read = serializers.SerializerMethodField()
+    sender_id = serializers.IntegerField()
+    receiver_id = serializers.IntegerField()
     message_id = serializers.IntegerField(source='id')
 
     class Meta:
@@ -16,6 +17,10 @@ class MessageSerializer(serializers.ModelSerializer):
         """Return decrypted message text"""
         return obj.text
 
+    def get_is_read(self, obj):
+        """Read once the receiver's watermark (context['watermarks']) has reached it"""
+        return obj.id <= self.context.get('watermarks', {}).get(obj.receiver_id, 0)
+
 class FriendshipSerializer(serializers.ModelSerializer):
     class Meta:
         model = Friendship
@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import UserProfile
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from analyze_responses.models import DailyCompletion, Habit
+from analyze_responses.signals import completions_updated
+from .models import UserProfile, Message
+from . import leaderboard_service, conversation_service
+
+User = get_user_model()
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,3 +19,24 @@ def create_user_profile(sender, instance, created, **kwargs):
             email=instance.email,
             phone_number=instance.phone_number
         )
+
+@receiver(completions_updated, sender=DailyCompletion)
+def refresh_leaderboard_on_completions(sender, user_id, first_day, user=None, deltas=None, **kwargs):
+    # Days in the future don't count yet; the daily rebuild picks them up
+    if user_id is None or first_day > timezone.now().date():
+        return
+    if deltas is not None and leaderboard_service.apply_deltas(user_id, deltas):
+        return
+    leaderboard_service.refresh_users([user] if user is not None else list(User.objects.filter(pk=user_id)))
+
+@receiver(post_delete, sender=Habit)
+def refresh_leaderboard_on_habit_delete(sender, instance, **kwargs):
+    # Tasks are removed by the cascade, so the habit is the only delete we need to watch.
+    # Deletes cascading from the user themselves take their entries with them.
+    if instance.user_id is not None and isinstance(kwargs.get('origin'), Habit):
+        leaderboard_service.refresh_user(instance.user)
+
+@receiver(post_save, sender=Message)
+def update_conversations_on_message(sender, instance, created, **kwargs):
+    if created:
+        conversation_service.record_message(instance)
@@ -1,3 +1,582 @@
-from django.test import TestCase
+import asyncio
+import base64
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from asgiref.sync import sync_to_async
+from channels.exceptions import ChannelFull
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from cryptography.fernet import Fernet
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from analyze_responses.models import DailyCompletion, Habit
+from app_frontend.models import CustomUser
+from . import chat_crypto, leaderboard_service, message_pipeline, read_receipts
+from .channel_layer import SQLiteChannelLayer
+from .models import ConversationKey, ConversationSummary, Friendship, LeaderboardEntry, Message
+from .routing import websocket_urlpatterns
 
-# Create your tests here.
+
+class SQLiteChannelLayerCapacityTests(SimpleTestCase):
+    """A socket that stops reading must not buffer past its capacity."""
+
+    capacity = 5
+
+    def test_slow_reader_is_bounded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            layer = SQLiteChannelLayer(path=os.path.join(directory, 'layer.sqlite3'), capacity=self.capacity)
+            delivered = asyncio.run(self.flood(layer))
+        # capacity in the receiving process's buffer plus capacity left in SQLite
+        self.assertEqual(delivered, 2 * self.capacity)
+
+    async def flood(self, layer):
+        slow = await layer.new_channel()
+        other = await layer.new_channel()
+        await layer.group_add('chat', slow)
+        # Another socket in the same process keeps the poller running
+        listener = asyncio.create_task(layer.receive(other))
+        try:
+            await layer.send(slow, {'type': 'chat.message', 'n': -1})
+            await layer.receive(slow)
+
+            # Bursts with pauses for the poller: the first fills the in-memory buffer, later ones the table
+            for n in range(100):
+                await layer.group_send('chat', {'type': 'chat.message', 'n': n})
+                if n % 10 == 9:
+                    await asyncio.sleep(0.1)
+            with self.assertRaises(ChannelFull):
+                await layer.send(slow, {'type': 'chat.message', 'n': 100})
+
+            delivered = []
+            while True:
+                try:
+                    delivered.append((await asyncio.wait_for(layer.receive(slow), 0.5))['n'])
+                except asyncio.TimeoutError:
+                    break
+            self.assertEqual(delivered, sorted(delivered))
+            return len(delivered)
+        finally:
+            listener.cancel()
+            await layer.close()
+
+
+class SQLiteChannelLayerPollTests(SimpleTestCase):
+    """Idle polls read without taking SQLite's write lock."""
+
+    def test_idle_poll_takes_no_write_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            layer = SQLiteChannelLayer(path=os.path.join(directory, 'layer.sqlite3'))
+            statements, message = asyncio.run(self.idle_then_send(layer))
+        self.assertEqual(message, {'type': 'chat.message', 'n': 1})
+        idle, busy = statements
+        self.assertTrue(idle)
+        self.assertFalse([s for s in idle if s.startswith('BEGIN')])
+        self.assertIn('BEGIN IMMEDIATE', busy)
+
+    async def idle_then_send(self, layer):
+        channel = await layer.new_channel()
+        await layer.group_add('chat', channel)
+        idle, busy = [], []
+        trace = idle.append
+        layer._executor.submit(layer._connection().set_trace_callback, lambda s: trace(s)).result()
+        receiver = asyncio.create_task(layer.receive(channel))
+        try:
+            await asyncio.sleep(0.3)
+            trace = busy.append
+            await layer.send(channel, {'type': 'chat.message', 'n': 1})
+            message = await asyncio.wait_for(receiver, 2)
+        finally:
+            receiver.cancel()
+            await layer.close()
+        return (idle, busy), message
+
+
+class MessagePipelineTests(TestCase):
+    """One bad frame in a group commit must not fail the rest of the batch."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(email='alice@example.com', full_name='Alice', password='pw')
+        self.bob = CustomUser.objects.create_user(email='bob@example.com', full_name='Bob', password='pw')
+
+    def test_batch_falls_back_to_single_inserts(self):
+        results = message_pipeline.store_batch([
+            (self.alice.id, self.bob.id, 'hi'),
+            (self.alice.id, self.bob.id, None),  # Can't be encrypted
+            (self.bob.id, self.alice.id, 'hello'),
+        ])
+        self.assertIsInstance(results[0], Message)
+        self.assertIsInstance(results[1], Exception)
+        self.assertIsInstance(results[2], Message)
+        self.assertEqual(sorted(m.text for m in Message.objects.all()), ['hello', 'hi'])
+
+    def test_single_failure_raises(self):
+        with self.assertRaises(Exception):
+            message_pipeline.store_batch([(self.alice.id, self.bob.id, None)])
+
+    def test_batcher_resolves_each_future(self):
+        error = ValueError('bad frame')
+
+        async def submit_all():
+            batcher = message_pipeline.MessageBatcher(window=0.01)
+            return await asyncio.gather(
+                batcher.submit(1, 2, 'first'),
+                batcher.submit(1, 2, 'second'),
+                return_exceptions=True,
+            )
+
+        with mock.patch.object(message_pipeline, 'store_batch', return_value=['saved', error]) as store:
+            results = asyncio.run(submit_all())
+        store.assert_called_once_with([(1, 2, 'first'), (1, 2, 'second')])
+        self.assertEqual(results, ['saved', error])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MessageHistoryTests(TestCase):
+    """fetch-messages pages by id cursor, one extra row deciding has_more."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(email='alice@example.com', full_name='Alice', password='pw')
+        self.bob = CustomUser.objects.create_user(email='bob@example.com', full_name='Bob', password='pw')
+        self.ids = [
+            message.id for message in message_pipeline.store_messages([
+                (self.bob.id, self.alice.id, f'message {number}') if number % 2 else
+                (self.alice.id, self.bob.id, f'message {number}')
+                for number in range(7)
+            ])
+        ]
+        self.room_id = f'{self.bob.id}_{self.alice.id}'
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def fetch(self, **data):
+        response = self.client.post('/profile/fetch-messages/', {'room_id': self.room_id, 'page_size': 3, **data}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids_of(self, page):
+        return [message['id'] for message in page['messages']]
+
+    def test_scroll_back_with_before(self):
+        latest = self.fetch()
+        self.assertEqual(self.ids_of(latest), self.ids[4:])
+        self.assertEqual((latest['before'], latest['after'], latest['has_more']), (self.ids[4], self.ids[6], True))
+
+        older = self.fetch(before=latest['before'])
+        self.assertEqual(self.ids_of(older), self.ids[1:4])
+        self.assertTrue(older['has_more'])
+        oldest = self.fetch(before=older['before'])
+        self.assertEqual(self.ids_of(oldest), self.ids[:1])
+        self.assertFalse(oldest['has_more'])
+        self.assertEqual(self.fetch(before=self.ids[0])['messages'], [])
+
+    def test_newer_messages_with_after(self):
+        page = self.fetch(after=self.ids[1])
+        self.assertEqual(self.ids_of(page), self.ids[2:5])
+        self.assertTrue(page['has_more'])
+        page = self.fetch(after=page['after'])
+        self.assertEqual(self.ids_of(page), self.ids[5:])
+        self.assertFalse(page['has_more'])
+        # Nothing new: the cursor comes back unchanged
+        self.assertEqual(self.fetch(after=self.ids[6])['after'], self.ids[6])
+
+    def test_deleted_messages_skipped_and_page_refused(self):
+        Message.objects.filter(id=self.ids[5]).update(is_deleted_by_receiver=True)
+        self.assertEqual(self.ids_of(self.fetch()), [self.ids[3], self.ids[4], self.ids[6]])
+        response = self.client.post('/profile/fetch-messages/', {'room_id': self.room_id, 'page': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.fetch(page=1)['has_more'], True)
+
+    def test_only_the_latest_page_marks_read(self):
+        # Sending reads the conversation up to there: Bob's replies after it are unread
+        unread = [message.id for message in message_pipeline.store_messages([
+            (self.bob.id, self.alice.id, 'reply 1'), (self.bob.id, self.alice.id, 'reply 2'),
+        ])]
+        page = self.fetch(before=unread[1])
+        self.assertEqual([message['is_read'] for message in page['messages']], [True, True, False])
+
+        self.fetch()
+        page = self.fetch(before=unread[1])
+        self.assertEqual([message['is_read'] for message in page['messages']], [True, True, True])
+
+    def test_each_page_is_one_history_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.fetch(before=self.ids[4])
+        table = Message._meta.db_table
+        history = [q for q in queries.captured_queries if f'FROM "{table}"' in q['sql']]
+        self.assertEqual(len(history), 1)
+        self.assertNotIn('COUNT(', history[0]['sql'])
+        self.assertNotIn('OFFSET', history[0]['sql'])
+
+
+class FriendListTests(TestCase):
+    """list-friends reads the caller's side of every conversation in the same query as the friends."""
+
+    def setUp(self):
+        self.me, self.bob, self.carol, self.dave = [
+            CustomUser.objects.create_user(email=f'{name}@example.com', full_name=name.title(), password='pw')
+            for name in ('me', 'bob', 'carol', 'dave')
+        ]
+        Friendship.objects.bulk_create([
+            Friendship(user=self.me, friend=friend) for friend in (self.dave, self.carol, self.bob)
+        ] + [Friendship(user=self.carol, friend=self.bob)])
+        message_pipeline.store_messages([
+            (self.me.id, self.carol.id, 'hi carol'),
+            (self.bob.id, self.me.id, 'hi'),
+            (self.bob.id, self.me.id, 'still there?'),
+            # Another user's conversation with Bob must not show up as mine
+            (self.carol.id, self.bob.id, 'carol to bob'),
+        ])
+        ConversationSummary.objects.filter(owner=self.me, peer=self.carol).update(
+            last_message_at=F('last_message_at') - timedelta(minutes=1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def list_friends(self):
+        response = self.client.get('/profile/list-friends/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_latest_conversation_first_with_own_side(self):
+        self.assertEqual(
+            [(row['id'], row['last_message'], row['last_sender_id'], row['unread_count']) for row in self.list_friends()],
+            [
+                (self.bob.id, 'still there?', self.bob.id, 2),
+                (self.carol.id, 'hi carol', self.me.id, 0),
+                (self.dave.id, None, None, 0),  # Never chatted: last, and no summary row at all
+            ],
+        )
+
+    def test_one_query_regardless_of_friend_count(self):
+        def friend_list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.list_friends()
+            return [q['sql'] for q in queries.captured_queries]
+
+        few = friend_list_queries()
+        more = [
+            CustomUser.objects.create_user(email=f'friend{n}@example.com', full_name=f'Friend {n}', password='pw')
+            for n in range(4)
+        ]
+        Friendship.objects.bulk_create([Friendship(user=self.me, friend=friend) for friend in more])
+        message_pipeline.store_messages([(friend.id, self.me.id, 'hello') for friend in more])
+        queries = friend_list_queries()
+        self.assertEqual(len(queries), len(few))
+        self.assertEqual(len(self.list_friends()), 7)
+
+        friends = [sql for sql in queries if f'FROM "{Friendship._meta.db_table}"' in sql]
+        self.assertEqual(len(friends), 1)
+        self.assertIn(ConversationSummary._meta.db_table, friends[0])
+        self.assertIn('ORDER BY', friends[0])
+
+
+def forget_keys():
+    """Drop chat_crypto's process caches, as a restart with new settings would."""
+    chat_crypto._masters.clear()
+    chat_crypto._ciphers.clear()
+    chat_crypto._pair_keys.clear()
+
+
+@override_settings(CHAT_MASTER_KEY='first-master', CHAT_MASTER_KEY_VERSION=1, CHAT_PREVIOUS_MASTER_KEYS=[])
+class ChatCryptoTests(TestCase):
+    def setUp(self):
+        forget_keys()
+        self.addCleanup(forget_keys)
+        self.alice = CustomUser.objects.create_user(email='alice@example.com', full_name='Alice', password='pw')
+        self.bob = CustomUser.objects.create_user(email='bob@example.com', full_name='Bob', password='pw')
+
+    def send(self, text):
+        message = Message(sender=self.alice, receiver=self.bob)
+        message.set_text(text)
+        message.save()
+        return Message.objects.get(pk=message.pk)
+
+    def test_round_trip(self):
+        message = self.send('See you at 6 ✓')
+        self.assertEqual(message.text, 'See you at 6 ✓')
+        self.assertNotIn(b'See you', bytes(message.ciphertext))
+        self.assertEqual(ConversationKey.objects.get().key_version, 1)
+
+    def test_wrong_master_key_raises(self):
+        message = self.send('hello')
+        forget_keys()
+        with override_settings(CHAT_MASTER_KEY='another-master'), self.assertLogs('profileandchat.chat_crypto', 'ERROR'):
+            with self.assertRaises(chat_crypto.DecryptionError):
+                message.text
+
+    def test_message_moved_to_another_chat_raises(self):
+        carol = CustomUser.objects.create_user(email='carol@example.com', full_name='Carol', password='pw')
+        message = self.send('hello')
+        message.receiver = carol
+        with self.assertLogs('profileandchat.chat_crypto', 'ERROR'), self.assertRaises(chat_crypto.DecryptionError):
+            message.text
+
+    def test_master_key_required(self):
+        with override_settings(CHAT_MASTER_KEY=''), self.assertRaises(ImproperlyConfigured):
+            self.send('hello')
+
+    def test_rotation_and_rewrap(self):
+        message = self.send('before rotation')
+        forget_keys()
+        with override_settings(CHAT_MASTER_KEY='second-master', CHAT_MASTER_KEY_VERSION=2,
+                               CHAT_PREVIOUS_MASTER_KEYS=['1=first-master']):
+            self.assertEqual(message.text, 'before rotation')  # Old keys still open with version 1
+            call_command('rewrap_chat_keys', stdout=open(os.devnull, 'w'))
+            self.assertEqual(ConversationKey.objects.get().key_version, 2)
+
+        forget_keys()
+        with override_settings(CHAT_MASTER_KEY='second-master', CHAT_MASTER_KEY_VERSION=2):
+            self.assertEqual(Message.objects.get(pk=message.pk).text, 'before rotation')
+
+    def test_unknown_version_is_reported(self):
+        message = self.send('hello')
+        forget_keys()
+        with override_settings(CHAT_MASTER_KEY='second-master', CHAT_MASTER_KEY_VERSION=2):
+            with self.assertRaises(ImproperlyConfigured):
+                message.text
+
+
+@override_settings(CHAT_MASTER_KEY='first-master', CHAT_MASTER_KEY_VERSION=1, CHAT_PREVIOUS_MASTER_KEYS=[])
+class ChatReencryptMigrationTests(TransactionTestCase):
+    """0008 moves per-message Fernet text to conversation keys that chat_crypto can open."""
+
+    before = [('profileandchat', '0007_conversationsummary')]
+    after = [('profileandchat', '0008_conversation_keys')]
+
+    def setUp(self):
+        forget_keys()
+        self.addCleanup(forget_keys)
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+
+        User = old_apps.get_model('app_frontend', 'CustomUser')
+        OldMessage = old_apps.get_model('profileandchat', 'Message')
+        alice = User.objects.create(email='alice@example.com', full_name='Alice', password='pw')
+        bob = User.objects.create(email='bob@example.com', full_name='Bob', password='pw')
+        self.users = alice.id, bob.id
+
+        key = Fernet.generate_key()
+        token = Fernet(key).encrypt('encrypted before'.encode())
+        OldMessage.objects.create(
+            sender_id=alice.id, receiver_id=bob.id,
+            encrypted_text=base64.urlsafe_b64encode(token).decode(),
+            encryption_key=base64.urlsafe_b64encode(key).decode(),
+        )
+        OldMessage.objects.create(sender_id=bob.id, receiver_id=alice.id, encrypted_text='plain before', encryption_key='')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_history_readable_after_backfill(self):
+        self.assertEqual(ConversationKey.objects.count(), 1)
+        self.assertEqual(
+            [m.text for m in Message.objects.order_by('id')], ['encrypted before', 'plain before']
+        )
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_READ_RECEIPT_WINDOW=0.01,
+    CHAT_GROUP_COMMIT_WINDOW=0,
+    CHAT_MASTER_KEY='consumer-tests',
+)
+class ChatConsumerTests(TransactionTestCase):
+    """Frames are typed, and a reader never gets their own read receipt back."""
+
+    def setUp(self):
+        forget_keys()
+        self.addCleanup(forget_keys)
+        self.alice = CustomUser.objects.create_user(email='alice@example.com', full_name='Alice', password='pw')
+        self.bob = CustomUser.objects.create_user(email='bob@example.com', full_name='Bob', password='pw')
+        low, high = sorted((self.alice.id, self.bob.id))
+        self.room = f'{low}_{high}'
+
+    async def open(self, user):
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.room}/?user_id={user.id}')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    def run_chat(self, scenario):
+        async def run():
+            alice, bob = await self.open(self.alice), await self.open(self.bob)
+            try:
+                await scenario(alice, bob)
+            finally:
+                await alice.disconnect()
+                await bob.disconnect()
+        asyncio.run(run())
+
+    def test_message_frames_are_typed(self):
+        async def scenario(alice, bob):
+            await alice.send_json_to({'message': 'hi', 'sender_id': self.alice.id})
+            for socket in (alice, bob):
+                frame = await socket.receive_json_from()
+                self.assertEqual((frame['type'], frame['message'], frame['sender_id']), ('chat_message', 'hi', self.alice.id))
+        self.run_chat(scenario)
+
+    def test_read_receipt_goes_to_the_peer_only(self):
+        async def scenario(alice, bob):
+            await alice.send_json_to({'message': 'hi', 'sender_id': self.alice.id})
+            message_id = (await bob.receive_json_from())['message_id']
+            await alice.receive_json_from()
+
+            await bob.send_json_to({'type': 'read', 'message_id': message_id, 'sender_id': self.bob.id})
+            self.assertEqual(await alice.receive_json_from(timeout=2), {
+                'type': 'read_receipt', 'reader_id': self.bob.id, 'last_read_id': message_id,
+            })
+            self.assertTrue(await bob.receive_nothing(timeout=0.2))
+        self.run_chat(scenario)
+
+    def test_receipt_from_history_fetch_not_echoed(self):
+        async def scenario(alice, bob):
+            await alice.send_json_to({'message': 'hi', 'sender_id': self.alice.id})
+            message_id = (await bob.receive_json_from())['message_id']
+            await alice.receive_json_from()
+
+            # fetch_messages marks the page read from sync code
+            await sync_to_async(read_receipts.mark_read)(self.bob.id, self.alice.id, message_id)
+            self.assertEqual((await alice.receive_json_from())['type'], 'read_receipt')
+            self.assertTrue(await bob.receive_nothing(timeout=0.2))
+        self.run_chat(scenario)
+
+    def test_errors_are_typed(self):
+        async def scenario(alice, bob):
+            await alice.send_json_to({'type': 'read', 'sender_id': self.alice.id})
+            self.assertEqual(await alice.receive_json_from(), {'type': 'error', 'error': 'message_id required'})
+            await alice.send_json_to({'sender_id': self.alice.id})
+            self.assertEqual(await alice.receive_json_from(), {'type': 'error', 'error': 'message required'})
+            self.assertTrue(await bob.receive_nothing(timeout=0.1))
+        self.run_chat(scenario)
+
+
+SUNDAY = date(2026, 10, 18)
+MONDAY = date(2026, 10, 19)
+
+
+def on_day(day):
+    """Freeze the clock at noon UTC of a day."""
+    return mock.patch('django.utils.timezone.now', return_value=datetime(
+        day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc,
+    ))
+
+
+def make_scored_users(count):
+    """Users completing count-1, count-2, ... 0 of their count-1 tasks on Sunday, rebuilt on Sunday."""
+    users = []
+    for n in range(count):
+        user = CustomUser.objects.create_user(email=f'user{n}@example.com', full_name=f'User {n}', password='pw')
+        habit = Habit.objects.create(name='Reading', type='Good', user=user)
+        DailyCompletion.objects.create(user=user, habit=habit, date=SUNDAY, completed=count - 1 - n, total=count - 1)
+        users.append(user)
+    with on_day(SUNDAY):
+        call_command('rebuild_leaderboard', stdout=open(os.devnull, 'w'))
+    return users
+
+
+class LeaderboardTests(TestCase):
+    """The board serves the calendar window, and ranks are never null."""
+
+    def setUp(self):
+        self.users = make_scored_users(5)
+
+    def board(self, period):
+        return [entry.user for entry in leaderboard_service.get_top(period)]
+
+    def entry(self, user, period='all_time'):
+        return LeaderboardEntry.objects.get(user=user, period=period)
+
+    def test_rebuild_snapshots_ranks(self):
+        with on_day(SUNDAY):
+            self.assertEqual(self.board('weekly'), self.users)
+        self.assertEqual([self.entry(user).rebuilt_rank for user in self.users], [1, 2, 3, 4, 5])
+
+    def test_served_window_follows_calendar(self):
+        with on_day(MONDAY):
+            # One user's completion lands in the new week before the nightly rebuild
+            leaderboard_service.refresh_user(self.users[4])
+            self.assertEqual(leaderboard_service.served_start('weekly'), MONDAY)
+            self.assertEqual(self.board('weekly'), [self.users[4]])
+            self.assertEqual(self.board('monthly'), self.users)  # Same month, still served
+
+            call_command('rebuild_leaderboard', stdout=open(os.devnull, 'w'))
+            self.assertEqual(self.board('weekly'), self.users)  # Nobody has tasks this week yet
+            self.assertEqual(self.board('monthly'), self.users)
+
+    def test_rank_is_exact_within_limit(self):
+        with on_day(SUNDAY):
+            self.assertEqual([leaderboard_service.get_rank(self.entry(user)) for user in self.users], [1, 2, 3, 4, 5])
+
+    def test_rank_beyond_limit_reads_snapshot(self):
+        with on_day(SUNDAY):
+            self.assertEqual(leaderboard_service.get_rank(self.entry(self.users[3]), limit=1), 4)
+            self.assertEqual(leaderboard_service.get_rank(self.entry(self.users[4]), limit=1), 5)
+
+            newcomer = CustomUser.objects.create_user(email='new@example.com', full_name='New', password='pw')
+            leaderboard_service.refresh_user(newcomer)
+            self.assertEqual(leaderboard_service.get_rank(self.entry(newcomer), limit=1), 6)
+            # Never reported inside the exactly counted range
+            self.assertEqual(leaderboard_service.get_rank(self.entry(newcomer), limit=8), 6)
+            self.assertEqual(leaderboard_service.get_rank(self.entry(self.users[3]), limit=10), 4)
+
+    def test_view_sends_rank_outside_top(self):
+        client = APIClient()
+        client.force_authenticate(self.users[4])
+        with on_day(SUNDAY), mock.patch.object(leaderboard_service, 'TOP_COUNT', 2), \
+                mock.patch.object(leaderboard_service, 'RANK_COUNT_LIMIT', 2):
+            response = client.get('/profile/leaderboard/', {'period': 'all_time'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['rank'] for row in response.data['top_100']], [1, 2])
+        self.assertEqual(response.data['current_user']['rank'], 5)
+
+
+class FriendsLeaderboardTests(TestCase):
+    """The friends board ranks only the caller's circle and refreshes it in one batch."""
+
+    def setUp(self):
+        self.users = make_scored_users(6)
+        self.me = self.users[2]
+        self.befriend(self.users[0], self.users[4])
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def befriend(self, *friends):
+        Friendship.objects.bulk_create([Friendship(user=self.me, friend=friend) for friend in friends])
+
+    def test_ranks_the_circle(self):
+        with on_day(SUNDAY):
+            response = self.client.get('/profile/leaderboard/friends/', {'period': 'all_time'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['rank'], row['user_id']) for row in response.data['leaderboard']],
+            [(1, self.users[0].id), (2, self.me.id), (3, self.users[4].id)],
+        )
+        self.assertEqual(response.data['current_user_rank'], 2)
+
+    def refresh_queries(self):
+        LeaderboardEntry.objects.update(computed_on=SUNDAY)
+        with on_day(MONDAY), CaptureQueriesContext(connection) as queries:
+            ranking = leaderboard_service.get_friends_ranking(self.me, 'weekly')
+        return ranking, len(queries)
+
+    def test_stale_circle_refreshed_in_one_batch(self):
+        ranking, few = self.refresh_queries()
+        self.assertEqual(len(ranking), 3)
+        self.befriend(self.users[1], self.users[3], self.users[5])
+        ranking, more = self.refresh_queries()
+        self.assertEqual(len(ranking), 6)
+        self.assertEqual(few, more)
+        # Rebuilt on Sunday: Monday's board is the new week, refreshed for everyone in the circle
+        self.assertEqual({entry.period_start for entry in ranking}, {MONDAY})
@@ -10,5 +10,6 @@ urlpatterns = [
     path('get-profile/', views.get_profile, name='get_profile'),
     path('update-profile/', views.update_profile, name='update_profile'),
     path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('leaderboard/friends/', views.friends_leaderboard_view, name='friends_leaderboard'),
     path('delete-messages/', views.delete_message, name='delete_message'),
 ]
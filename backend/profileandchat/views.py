@@ -4,8 +4,11 @@ from rest_framework.response import Response
 from .models import Friendship, Message, UserProfile
 from app_frontend.models import CustomUser
 from .serializers import UserSearchResultSerializer, FriendshipSerializer, MessageSerializer
-from django.db.models import Q, Count, Max
+from django.db.models import Q, F, FilteredRelation
 from django.db import transaction
+from . import conversation_service, read_receipts
+
+MAX_PAGE_SIZE = 100
 
 
 @api_view(['POST'])
@@ -50,38 +53,35 @@ def add_friend(request):
 @permission_classes([IsAuthenticated])
 def list_friends(request):
     user = request.user
-    friends = Friendship.objects.filter(user=user).select_related('friend')
+
+    # One query: friend, profile and this user's side of each conversation
+    friends = Friendship.objects.filter(user=user).annotate(
+        summary=FilteredRelation(
+            'friend__peer_conversations',
+            condition=Q(friend__peer_conversations__owner=F('user')),
+        )
+    ).select_related(
+        'friend__profile', 'summary__last_message__conversation_key'
+    ).order_by(
+        F('summary__last_message_at').desc(nulls_last=True), 'id'  # Most recent first
+    )
     data = []
 
     for f in friends:
         friend = f.friend
-
-        # Get last message between user and friend (visible to current user)
-        last_msg = Message.objects.filter(
-            Q(sender=user, receiver=friend, is_deleted_by_sender=False) | 
-            Q(sender=friend, receiver=user, is_deleted_by_receiver=False)
-        ).order_by('-timestamp').first()
-
-        # Count unread messages from friend to user
-        unread_count = Message.objects.filter(
-            sender=friend,
-            receiver=user,
-            is_read=False,
-            is_deleted_by_receiver=False
-        ).count()
+        summary = getattr(f, 'summary', None)  # Not set at all when the pair never chatted
+        last_msg = summary.last_message if summary else None
 
         data.append({
             'id': friend.id,
             'name': friend.full_name,
             'profile_pic': friend.profile.profile_pic.url if friend.profile.profile_pic else None,
             'last_message': last_msg.text if last_msg else None,
-            'last_sender_id': last_msg.sender.id if last_msg else None,
+            'last_sender_id': last_msg.sender_id if last_msg else None,
             'timestamp': last_msg.timestamp.isoformat() if last_msg else None,
-            'unread_count': unread_count,
+            'unread_count': summary.unread_count if summary else 0,
         })
 
-    # Sort by timestamp (most recent first)
-    data.sort(key=lambda x: x['timestamp'] or '', reverse=True)
     return Response(data)
 
 
@@ -108,62 +108,74 @@ def get_or_create_room(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def fetch_messages(request):
+    """
+    One page of a conversation, oldest first. Without a cursor this is the latest page;
+    pass `before` (oldest id already shown) to scroll back or `after` (newest id shown) for newer messages.
+
+    This replaces the old `page` offsets and the `total_count` field (a COUNT of the whole
+    conversation on every page): scroll back with `before` and use `has_more` instead. A
+    `page` past the first is refused rather than silently answered with the latest page.
+    """
     user = request.user
     room_id = request.data.get('room_id')
-    page = int(request.data.get('page', 1))
-    page_size = int(request.data.get('page_size', 50))
 
     if not room_id:
         return Response({'error': 'room_id required'}, status=400)
 
     try:
-        id1, id2 = map(int, room_id.split('_'))
-    except:
+        id1, id2 = sorted(map(int, room_id.split('_')))
+    except (TypeError, ValueError):
         return Response({'error': 'Invalid room_id format'}, status=400)
 
-    # Get messages visible to current user
-    messages_query = Message.objects.filter(
-        Q(sender_id=id1, receiver_id=id2) |
-        Q(sender_id=id2, receiver_id=id1)
+    try:
+        page_size = max(1, min(int(request.data.get('page_size', 50)), MAX_PAGE_SIZE))
+        before = request.data.get('before')
+        after = request.data.get('after')
+        before = int(before) if before else None
+        after = int(after) if after else None
+    except (TypeError, ValueError):
+        return Response({'error': 'page_size, before and after must be integers'}, status=400)
+    if str(request.data.get('page', 1)) != '1':
+        return Response({'error': "'page' is no longer supported; pass the 'before' cursor"}, status=400)
+
+    if user.id not in (id1, id2):
+        return Response({'error': 'Unauthorized'}, status=403)
+
+    # Messages of this conversation visible to current user (range scan on message_history_idx)
+    messages = Message.objects.filter(
+        conversation_key__user_low_id=id1,
+        conversation_key__user_high_id=id2,
+    ).filter(
+        Q(sender=user, is_deleted_by_sender=False) |
+        Q(receiver=user, is_deleted_by_receiver=False)
     )
 
-    # Filter messages based on user's deletion status
-    if user.id == id1:
-        messages_query = messages_query.filter(
-            Q(sender_id=id1, is_deleted_by_sender=False) |
-            Q(receiver_id=id1, is_deleted_by_receiver=False)
-        )
+    # Fetch one extra row to know whether there is more beyond this page
+    if after is not None:
+        page = list(messages.filter(id__gt=after).order_by('id')[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
     else:
-        messages_query = messages_query.filter(
-            Q(sender_id=id2, is_deleted_by_sender=False) |
-            Q(receiver_id=id2, is_deleted_by_receiver=False)
-        )
-
-    # Order by timestamp descending for pagination (latest first)
-    messages = messages_query.order_by('-timestamp')
-    
-    # Pagination
-    start = (page - 1) * page_size
-    end = start + page_size
-    paginated_messages = messages[start:end]
-    
-    # Reverse to show oldest first in the response
-    paginated_messages = list(paginated_messages)[::-1]
+        if before is not None:
+            messages = messages.filter(id__lt=before)
+        page = list(messages.order_by('-id')[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size][::-1]  # Oldest first in the response
 
-    # Mark messages as read if user is receiver
+    # Opening the latest page reads the conversation: move this user's watermark, never the message rows
     other_user_id = id2 if user.id == id1 else id1
-    Message.objects.filter(
-        sender_id=other_user_id,
-        receiver=user,
-        is_read=False
-    ).update(is_read=True)
+    watermarks = conversation_service.watermarks(user.id, other_user_id)
+    if before is None:
+        newest_from_peer = max((m.id for m in page if m.sender_id == other_user_id), default=0)
+        if newest_from_peer > watermarks[user.id]:
+            last_read_id = read_receipts.mark_read(user.id, other_user_id, newest_from_peer)
+            watermarks[user.id] = last_read_id or watermarks[user.id]
 
-    serialized_messages = MessageSerializer(paginated_messages, many=True).data
-    
     return Response({
-        'messages': serialized_messages,
-        'has_more': messages.count() > end,
-        'total_count': messages.count()
+        'messages': MessageSerializer(page, many=True, context={'watermarks': watermarks}).data,
+        'has_more': has_more,
+        'before': page[0].id if page else before,
+        'after': page[-1].id if page else after,
     })
 
 
@@ -193,6 +205,10 @@ def delete_message(request):
         if message.is_deleted_by_sender and message.is_deleted_by_receiver:
             message.delete()
 
+        # The deleted message may have been the last one (or an unread one) on this side
+        other_user_id = message.receiver_id if message.sender_id == user.id else message.sender_id
+        conversation_service.rebuild(user.id, other_user_id)
+
         return Response({'message': 'Message deleted successfully'})
     except Message.DoesNotExist:
         return Response({'error': 'Message not found'}, status=404)
@@ -248,55 +264,72 @@ def update_profile(request):
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .leaderboard_service import calculate_completion_rate
+from . import leaderboard_service
 from .models import UserProfile
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+
+def _leaderboard_row(entry, rank):
+    user_profile_url = None
+    try:
+        if hasattr(entry.user, 'profile') and entry.user.profile.profile_pic:
+            user_profile_url = entry.user.profile.profile_pic.url
+    except UserProfile.DoesNotExist:
+        pass
+
+    return {
+        'rank': rank,
+        'user_id': entry.user_id,
+        'full_name': entry.user.full_name,
+        'completion_rate': entry.completion_rate,
+        'profile_pic_url': user_profile_url
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def leaderboard_view(request):
     period = request.GET.get('period', 'all_time')
+    if period not in leaderboard_service.PERIODS:
+        period = 'all_time'
     current_user = request.user
 
-    # Get ranked user list
-    users = calculate_completion_rate(period)
-    top_users = users[:100]
+    # Scores are read from the materialized store, rebuilt daily by `manage.py rebuild_leaderboard`
+    top_entries = leaderboard_service.get_top(period)
 
-    leaderboard_data = []
-    current_user_data = None
-    current_user_rank = None
-
-    # Loop to construct leaderboard and find current user's rank
-    for index, user in enumerate(users, start=1):
-        user_profile_url = None
-        try:
-            if hasattr(user, 'profile') and user.profile.profile_pic:
-                user_profile_url = user.profile.profile_pic.url
-        except UserProfile.DoesNotExist:
-            pass
-
-        user_data = {
-            'rank': index,
-            'user_id': user.id,
-            'full_name': user.full_name,
-            'completion_rate': user.completion_rate,
-            'profile_pic_url': user_profile_url
-        }
-
-        if index <= 100:
-            leaderboard_data.append(user_data)
-
-        if user.id == current_user.id:
-            current_user_rank = index
-            current_user_data = user_data
+    leaderboard_data = [
+        _leaderboard_row(entry, index)
+        for index, entry in enumerate(top_entries, start=1)
+    ]
 
     response = {
         'top_100': leaderboard_data
     }
 
-    if current_user_rank and current_user_rank > 100:
-        response['current_user'] = current_user_data
+    if not any(entry.user_id == current_user.id for entry in top_entries):
+        entry = leaderboard_service.get_entry(current_user, period)
+        if entry is not None:
+            current_user_rank = leaderboard_service.get_rank(entry)
+            if current_user_rank > leaderboard_service.TOP_COUNT:
+                response['current_user'] = _leaderboard_row(entry, current_user_rank)
+
+    return Response(response)
+
 
-    return Response(response)
\ No newline at end of file
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def friends_leaderboard_view(request):
+    period = request.GET.get('period', 'all_time')
+    if period not in leaderboard_service.PERIODS:
+        period = 'all_time'
+
+    # Ranked among friends only: reads tens of stored rows, no task aggregation
+    entries = leaderboard_service.get_friends_ranking(request.user, period)
+    rows = [_leaderboard_row(entry, index) for index, entry in enumerate(entries, start=1)]
+
+    return Response({
+        'period': period,
+        'leaderboard': rows,
+        'current_user_rank': next((row['rank'] for row in rows if row['user_id'] == request.user.id), None),
+    })
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Quiz, UserProgress
+from .models import Quiz, UserProgress, QuizRefillJob
 
 admin.site.register(Quiz)
 admin.site.register(UserProgress)
+admin.site.register(QuizRefillJob)
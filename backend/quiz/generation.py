@@ -0,0 +1,54 @@
+import json
+from deepapi.llm_client import get_client
+from .models import Quiz
+
+QUIZ_PROMPT = (
+    "Generate 10 multiple-choice quiz questions. "
+    "Each question should be 6 to 8 words long and have 4 answer options. "
+    "Indicate the correct answer clearly. "
+    "Respond ONLY in raw JSON format like this:\n\n"
+    "[\n"
+    "  {\n"
+    "    \"question\": \"What is the capital of France?\",\n"
+    "    \"options\": [\"Paris\", \"London\", \"Berlin\", \"Madrid\"],\n"
+    "    \"answer\": \"Paris\"\n"
+    "  },\n"
+    "  ...(10 total questions)\n"
+    "]"
+)
+
+
+def parse_quizzes(content):
+    """
+    Unsaved Quiz rows from the model's JSON answer.
+    Raises json.JSONDecodeError, KeyError or ValueError on malformed output.
+    """
+    # Clean JSON formatting
+    content = content.replace("```json", "").replace("```", "").strip()
+    quizzes = json.loads(content)
+
+    rows = []
+    for quiz in quizzes:
+        if not all(key in quiz for key in ('question', 'options', 'answer')):
+            raise ValueError("Invalid quiz format")
+
+        if len(quiz["options"]) != 4:
+            raise ValueError("Each question must have exactly 4 options")
+
+        rows.append(Quiz(
+            question=quiz["question"],
+            option_1=quiz["options"][0],
+            option_2=quiz["options"][1],
+            option_3=quiz["options"][2],
+            option_4=quiz["options"][3],
+            answer=quiz["answer"]
+        ))
+    return rows
+
+
+def generate_quizzes():
+    """Ask the model for a batch of questions and save them; returns how many were added."""
+    content = get_client().complete([{"role": "user", "content": QUIZ_PROMPT}])
+    rows = parse_quizzes(content)
+    Quiz.objects.bulk_create(rows)
+    return len(rows)
@@ -0,0 +1,123 @@
+"""
+Database-backed queue that keeps the shared quiz bank stocked. Requests only
+enqueue a refill; the quiz_worker management command generates the questions.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from deepapi.llm_client import use_pool
+from .generation import generate_quizzes
+from .models import Quiz, QuizRefillJob, UserProgress
+
+logger = logging.getLogger(__name__)
+
+
+def quizzes_needed():
+    """How many questions to add so the furthest user has QUIZ_STOCK_HIGH_WATER unseen ones."""
+    furthest = UserProgress.objects.aggregate(furthest=Max('last_quiz_id'))['furthest'] or 0
+    return max(0, settings.QUIZ_STOCK_HIGH_WATER - Quiz.objects.filter(id__gt=furthest).count())
+
+
+def cooling_down():
+    """Whether the latest refill fell short (failed or left stock low) and its retry_after has not passed yet."""
+    latest = QuizRefillJob.objects.filter(finished_at__isnull=False).order_by('-created_at').first()
+    return latest is not None and latest.retry_after is not None and latest.retry_after > timezone.now()
+
+
+def retry_delay(misses):
+    """Seconds to wait after `misses` consecutive refills that fell short: doubles each time, capped."""
+    return min(settings.QUIZ_RETRY_MAX_DELAY, settings.QUIZ_RETRY_BASE_DELAY * 2 ** (misses - 1))
+
+
+def enqueue_refill():
+    """
+    Queue a refill unless one is already pending or running, or the last one
+    fell short recently; returns whether one was created.
+    """
+    if cooling_down():
+        return False
+    try:
+        with transaction.atomic():
+            QuizRefillJob.objects.create()
+        return True
+    except IntegrityError:
+        return False
+
+
+def _release_stuck_jobs():
+    """Fail jobs whose worker died mid-run so a new refill can be queued."""
+    cutoff = timezone.now() - timedelta(seconds=settings.QUIZ_JOB_TIMEOUT)
+    QuizRefillJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='failed',
+        active_key=None,
+        error='Timed out',
+        finished_at=timezone.now(),
+        retry_after=timezone.now() + timedelta(seconds=settings.QUIZ_RETRY_BASE_DELAY),
+    )
+
+
+def claim_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    _release_stuck_jobs()
+    with transaction.atomic():
+        job = (
+            QuizRefillJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_job(job):
+    """Generate batches until the stock target is met (bounded by QUIZ_JOB_MAX_BATCHES)."""
+    try:
+        with use_pool('background'):
+            for _ in range(settings.QUIZ_JOB_MAX_BATCHES):
+                if quizzes_needed() <= 0:
+                    break
+                job.quizzes_added += generate_quizzes()
+        job.status = 'done'
+    except Exception as e:
+        logger.exception("Quiz refill #%s failed", job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.active_key = None
+    job.finished_at = timezone.now()
+    # A done job that still left stock short (e.g. batches hit QUIZ_JOB_MAX_BATCHES) backs off
+    # like a failure; otherwise the worker would queue the next one straight away
+    if job.status == 'failed' or quizzes_needed() > 0:
+        # Consecutive refills that fell short since the last one that reached the target, this one included
+        last_full = (
+            QuizRefillJob.objects.filter(finished_at__isnull=False, retry_after__isnull=True)
+            .order_by('-created_at').values_list('created_at', flat=True).first()
+        )
+        misses = QuizRefillJob.objects.filter(retry_after__isnull=False).exclude(pk=job.pk)
+        if last_full is not None:
+            misses = misses.filter(created_at__gt=last_full)
+        job.retry_after = job.finished_at + timedelta(seconds=retry_delay(misses.count() + 1))
+    job.save(update_fields=['status', 'active_key', 'quizzes_added', 'error', 'finished_at', 'retry_after'])
+    return job
+
+
+def run_pending():
+    """Run every queued job; returns how many ran."""
+    ran = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            return ran
+        run_job(job)
+        ran += 1
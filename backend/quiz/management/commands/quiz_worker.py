@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from quiz import jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued quiz bank refills (run as a long-lived process next to the web workers)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the pending jobs and exit")
+        parser.add_argument('--poll', type=float, default=5.0, help="Seconds between queue polls")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            ran = jobs.run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} refill job(s)"))
+            return
+
+        self.stdout.write("Quiz worker started")
+        while True:
+            close_old_connections()
+            if jobs.quizzes_needed() > 0:
+                jobs.enqueue_refill()  # Keep stock up even when no request asked for it
+            jobs.run_pending()
+            time.sleep(options['poll'])
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+def index_to_cursor(apps, schema_editor):
+    # The old batches were OFFSET slices in primary-key order
+    Quiz = apps.get_model('quiz', 'Quiz')
+    UserProgress = apps.get_model('quiz', 'UserProgress')
+    last_id = Quiz.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for progress in UserProgress.objects.filter(current_question_index__gt=0).iterator():
+        passed = (
+            Quiz.objects.order_by('id')
+            .values_list('id', flat=True)[progress.current_question_index - 1:progress.current_question_index]
+        )
+        progress.last_quiz_id = passed[0] if passed else last_id  # Past the end of the bank
+        progress.save(update_fields=['last_quiz_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_quizrefilljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='last_quiz_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(index_to_cursor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_userprogress_last_quiz_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizrefilljob',
+            name='retry_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
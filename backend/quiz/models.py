@@ -20,6 +20,57 @@ class UserProgress(models.Model):
         null=True
     )
     current_question_index = models.IntegerField(default=0)
+    last_quiz_id = models.BigIntegerField(default=0)  # Keyset cursor: id of the last quiz the user moved past
 
     def __str__(self):
         return f"User {self.user_id} - Current Question: {self.current_question_index}"
+
+    def next_quizzes(self, limit=10):
+        """The next quizzes after the cursor, read as a primary-key range."""
+        return Quiz.objects.filter(id__gt=self.last_quiz_id).order_by('id')[:limit]
+
+    def has_unseen(self, count):
+        """Whether at least `count` quizzes remain after the cursor, without counting them all."""
+        if count <= 0:
+            return True
+        return Quiz.objects.filter(id__gt=self.last_quiz_id).order_by('id')[count - 1:count].exists()
+
+    def advance_to(self, index):
+        """Move the cursor forward to match a new current_question_index."""
+        steps = index - self.current_question_index
+        if steps > 0:
+            passed = list(
+                Quiz.objects.filter(id__gt=self.last_quiz_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:steps]
+            )
+            if passed:
+                self.last_quiz_id = passed[-1]
+        self.current_question_index = index
+
+
+class QuizRefillJob(models.Model):
+    """Queued request to top up the shared quiz bank, run by the quiz_worker command."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # 'refill' while pending or running, NULL afterwards: the unique index allows one open job at a time
+    active_key = models.CharField(max_length=20, null=True, blank=True, unique=True, default='refill')
+    quizzes_added = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Set when the job failed or left stock short: no new refill is queued before then (backs off on repeats)
+    retry_after = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='quiz_job_status_idx')]
+
+    def __str__(self):
+        return f"Quiz refill #{self.pk} ({self.status})"
@@ -9,7 +9,13 @@ class QuizSerializer(serializers.ModelSerializer):
 class UserProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProgress
-        fields = ['current_question_index']
+        fields = ['current_question_index', 'last_quiz_id']
         extra_kwargs = {
             'user': {'read_only': True}
-        }
\ No newline at end of file
+        }
+
+    def update(self, instance, validated_data):
+        # Clients still report an index; translate it into the keyset cursor
+        if 'current_question_index' in validated_data and 'last_quiz_id' not in validated_data:
+            instance.advance_to(validated_data.pop('current_question_index'))
+        return super().update(instance, validated_data)
\ No newline at end of file
@@ -1,3 +1,158 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from app_frontend.models import CustomUser
+from . import jobs
+from .models import Quiz, QuizRefillJob, UserProgress
 
-# Create your tests here.
+
+def make_quizzes(count):
+    Quiz.objects.bulk_create(
+        Quiz(question=f'Question {n}', option_1='a', option_2='b', option_3='c', option_4='d', answer='a')
+        for n in range(count)
+    )
+    return list(Quiz.objects.order_by('id').values_list('id', flat=True))
+
+
+class UserProgressCursorTests(TestCase):
+    """The keyset cursor must stay in step with the index clients still send."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='quiz@example.com', full_name='Quiz', password='pw')
+        self.ids = make_quizzes(12)
+        self.progress = UserProgress.objects.create(user=self.user)
+
+    def test_next_quizzes_follow_cursor(self):
+        self.assertEqual([q.id for q in self.progress.next_quizzes(5)], self.ids[:5])
+        self.progress.advance_to(4)
+        self.assertEqual(self.progress.last_quiz_id, self.ids[3])
+        self.assertEqual([q.id for q in self.progress.next_quizzes(5)], self.ids[4:9])
+
+    def test_advance_never_moves_back(self):
+        self.progress.advance_to(6)
+        self.progress.advance_to(2)
+        self.assertEqual(self.progress.last_quiz_id, self.ids[5])
+        self.assertEqual(self.progress.current_question_index, 2)
+
+    def test_advance_past_the_bank(self):
+        self.progress.advance_to(50)
+        self.assertEqual(self.progress.last_quiz_id, self.ids[-1])
+        self.assertEqual(list(self.progress.next_quizzes(5)), [])
+
+    def test_has_unseen(self):
+        self.assertTrue(self.progress.has_unseen(12))
+        self.assertFalse(self.progress.has_unseen(13))
+        self.assertTrue(self.progress.has_unseen(0))
+        self.progress.advance_to(12)
+        self.assertFalse(self.progress.has_unseen(1))
+        self.assertTrue(self.progress.has_unseen(0))
+
+
+class UpdateProgressApiTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='quizapi@example.com', full_name='Quiz', password='pw')
+        self.ids = make_quizzes(12)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_index_patch_moves_cursor(self):
+        response = self.client.patch('/quiz/update-progress/', {'current_question_index': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'current_question_index': 3, 'last_quiz_id': self.ids[2]})
+
+        response = self.client.get('/quiz/get-quiz/')
+        self.assertEqual([q['id'] for q in response.data['quizzes']], self.ids[3:12])
+
+    def test_explicit_cursor_wins(self):
+        response = self.client.patch(
+            '/quiz/update-progress/', {'current_question_index': 3, 'last_quiz_id': self.ids[7]}, format='json'
+        )
+        self.assertEqual(response.data, {'current_question_index': 3, 'last_quiz_id': self.ids[7]})
+
+    def test_invalid_index(self):
+        response = self.client.patch('/quiz/update-progress/', {'current_question_index': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(QUIZ_STOCK_HIGH_WATER=20, QUIZ_JOB_MAX_BATCHES=3, QUIZ_RETRY_BASE_DELAY=30, QUIZ_RETRY_MAX_DELAY=100)
+class QuizRefillJobTests(TestCase):
+    """The queue must never run two refills at once, nor re-run one that keeps falling short."""
+
+    def generate(self, count):
+        """Stand in for the model: each batch adds `count` questions."""
+        def batch():
+            make_quizzes(count)
+            return count
+        return mock.patch.object(jobs, 'generate_quizzes', side_effect=batch)
+
+    def finish_latest(self):
+        job = jobs.claim_job()
+        self.assertIsNotNone(job)
+        return jobs.run_job(job)
+
+    def expire_retry(self):
+        QuizRefillJob.objects.update(retry_after=timezone.now() - timedelta(seconds=1))
+
+    def test_one_open_job(self):
+        self.assertTrue(jobs.enqueue_refill())
+        self.assertFalse(jobs.enqueue_refill())
+        jobs.claim_job()
+        self.assertFalse(jobs.enqueue_refill())  # Running counts as open too
+        self.assertEqual(QuizRefillJob.objects.count(), 1)
+
+    def test_full_refill_does_not_back_off(self):
+        jobs.enqueue_refill()
+        with self.generate(10):
+            job = self.finish_latest()
+        self.assertEqual((job.status, job.quizzes_added, job.retry_after), ('done', 20, None))
+        self.assertTrue(jobs.enqueue_refill())
+
+    def test_failures_back_off_exponentially(self):
+        delays = []
+        for _ in range(4):
+            self.assertTrue(jobs.enqueue_refill())
+            with mock.patch.object(jobs, 'generate_quizzes', side_effect=ValueError('bad json')), \
+                    self.assertLogs('quiz.jobs', 'ERROR'):
+                job = self.finish_latest()
+            self.assertEqual(job.status, 'failed')
+            self.assertFalse(jobs.enqueue_refill())
+            delays.append(round((job.retry_after - job.finished_at).total_seconds()))
+            self.expire_retry()
+        self.assertEqual(delays, [30, 60, 100, 100])
+
+    def test_short_refill_backs_off(self):
+        # Every batch comes back empty (say, all duplicates): done, but stock is still low
+        jobs.enqueue_refill()
+        with self.generate(0):
+            job = self.finish_latest()
+        self.assertEqual(job.status, 'done')
+        self.assertIsNotNone(job.retry_after)
+        self.assertFalse(jobs.enqueue_refill())
+
+        self.expire_retry()
+        jobs.enqueue_refill()
+        with self.generate(0):
+            job = self.finish_latest()
+        self.assertEqual(round((job.retry_after - job.finished_at).total_seconds()), 60)
+
+        # A refill that reaches the target resets the back-off
+        self.expire_retry()
+        jobs.enqueue_refill()
+        with self.generate(10):
+            self.finish_latest()
+        self.assertTrue(jobs.enqueue_refill())
+
+    @override_settings(QUIZ_JOB_TIMEOUT=60)
+    def test_stuck_job_released(self):
+        jobs.enqueue_refill()
+        stuck = jobs.claim_job()
+        QuizRefillJob.objects.filter(pk=stuck.pk).update(started_at=timezone.now() - timedelta(seconds=61))
+
+        self.assertIsNone(jobs.claim_job())
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.active_key, stuck.error), ('failed', None, 'Timed out'))
+        self.assertFalse(jobs.enqueue_refill())  # Backs off like any failure
+        self.expire_retry()
+        self.assertTrue(jobs.enqueue_refill())
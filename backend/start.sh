@@ -1,4 +1,13 @@
 #!/usr/bin/env bash
 
+# Background worker that keeps the quiz bank stocked
+python manage.py quiz_worker &
+
+# Sends habit reminders as they come due
+python manage.py dispatch_reminders &
+
+# Rebuilds the leaderboard now and after every midnight, when weeks and months roll over
+python manage.py rebuild_leaderboard --watch &
+
 # Start the Django app using Gunicorn on Render
 gunicorn config.wsgi:application --bind 0.0.0.0:$PORT
@@ -64,7 +64,8 @@ class _ChatScreenState extends State<ChatScreen> with TickerProviderStateMixin {
   Future<void> _initializeChat() async {
     final baseUrl = dotenv.get('BASE_URL').replaceFirst('http', 'ws');
     channel = WebSocketChannel.connect(
-      Uri.parse('$baseUrl/ws/chat/${widget.chatRoomId}/'),
+      Uri.parse(
+          '$baseUrl/ws/chat/${widget.chatRoomId}/?user_id=${widget.currentUserId}'),
     );
 
     try {
@@ -86,6 +87,15 @@ class _ChatScreenState extends State<ChatScreen> with TickerProviderStateMixin {
 
     channel.stream.listen((data) {
       final decoded = jsonDecode(data);
+      switch (decoded['type']) {
+        case 'read_receipt':
+          _applyReadReceipt(decoded);
+          return;
+        case 'error':
+          debugPrint('Chat error: ${decoded['error']}');
+          return;
+      }
+
       setState(() {
         messages.add({
           'message': decoded['message'],
@@ -97,6 +107,32 @@ class _ChatScreenState extends State<ChatScreen> with TickerProviderStateMixin {
         });
       });
       _scrollToBottom();
+
+      // The chat is open, so a message from the friend is read as it arrives
+      if (decoded['sender_id'] != widget.currentUserId &&
+          decoded['message_id'] != null) {
+        channel.sink.add(jsonEncode({
+          'type': 'read',
+          'message_id': decoded['message_id'],
+          'sender_id': widget.currentUserId,
+        }));
+      }
+    });
+  }
+
+  // The friend has read everything up to last_read_id
+  void _applyReadReceipt(Map<String, dynamic> receipt) {
+    if (receipt['reader_id'] == widget.currentUserId) return;
+    final lastReadId = receipt['last_read_id'] as int;
+    setState(() {
+      for (final msg in messages) {
+        final id = msg['message_id'];
+        if (msg['sender_id'] == widget.currentUserId &&
+            id is int &&
+            id <= lastReadId) {
+          msg['is_read'] = true;
+        }
+      }
     });
   }
 
@@ -4,6 +4,7 @@ import 'dart:convert';
 import 'package:flutter_dotenv/flutter_dotenv.dart';
 import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
+import 'package:timezone/timezone.dart' as tz;
 import '../models/habit.dart';
 import 'package:flutter_secure_storage/flutter_secure_storage.dart';
 
@@ -503,6 +504,8 @@ class AIService {
           'habit_id': habitId,
           'wants_reminder': wantsReminder,
           'reminder_time': reminderTime,
+          // Same zone the local notifications are scheduled in (NotificationService.init)
+          'timezone': tz.local.name,
         }),
       );
 